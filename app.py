@@ -1,33 +1,328 @@
-﻿import os
+﻿import time
+_IMPORT_STARTED = time.perf_counter()  # module imports are the first startup phase
+import os
 import re
 import sqlite3
 import secrets
+import hashlib
+import gc
+import json
+import queue
+import random
+import threading
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Tuple
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
+from typing import Callable, Optional, Tuple
+import click
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from flask import Flask, render_template, request, redirect, url_for, flash, session, abort, jsonify, g, has_request_context, send_from_directory
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
-import mysql.connector
-from mysql.connector import Error as MySQLError
+from assets import StaticAssets, brotli
+from compression import gzip_body, gzip_stream, should_compress
+from dbtrace import QueryBudgetExceeded, SlowQueryLog, TracedConnection, open_connection_count, query_budget, summarize
+from events import EventBroker
+from fragcache import FragmentCache, freeze
+from hashing import HashingBusyError, PasswordHasher, calibrate_hash_method
+from jobs import JobQueue
+from mailer import ConsoleTransport, OutboxSender, SMTPTransport
+from memdiag import MemoryDiagnostics
+from metrics import MetricsRegistry
+from profiling import MODES as PROFILE_MODES, RequestProfiler
+from ratelimit import SQLiteTokenBucketLimiter, TokenBucketLimiter
+from startup import StartupTimer
+from webhooks import WebhookDispatcher
+
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+class MySQLError(Exception):
+    """Stand-in for mysql.connector.Error until the driver is imported.
+
+    Nothing raises it, so ``except MySQLError`` clauses are inert on SQLite;
+    mysql_connector() rebinds the name to the real class on first use.
+    """
+
+_mysql_connector = None
+
+def mysql_connector():
+    """Import mysql.connector on first use; SQLite deployments never load it."""
+    global _mysql_connector, MySQLError
+    if _mysql_connector is None:
+        import mysql.connector
+
+        MySQLError = mysql.connector.Error
+        _mysql_connector = mysql.connector
+    return _mysql_connector
 
 def create_app() -> Flask:
+    startup = StartupTimer()
+    startup.add("imports", _IMPORT_SECONDS)
     load_dotenv()
+    startup.mark("dotenv")
     app = Flask(__name__)
     app.secret_key = os.getenv("SECRET_KEY") or os.urandom(24)
     app.config.update(
         DB_BACKEND=os.getenv("DB_BACKEND", "sqlite").lower(),
+        SQLITE_PATH=os.getenv("SQLITE_PATH", ""),
         MYSQL_HOST=os.getenv("MYSQL_HOST", "127.0.0.1"),
         MYSQL_PORT=int(os.getenv("MYSQL_PORT", "3306")),
         MYSQL_USER=os.getenv("MYSQL_USER", "root"),
         MYSQL_PASSWORD=os.getenv("MYSQL_PASSWORD", ""),
         MYSQL_DATABASE=os.getenv("MYSQL_DATABASE", "test_login"),
+        HASH_POOL_WORKERS=int(os.getenv("HASH_POOL_WORKERS", "2")),
+        HASH_POOL_QUEUE_LIMIT=int(os.getenv("HASH_POOL_QUEUE_LIMIT", "32")),
+        HASH_POOL_TIMEOUT=float(os.getenv("HASH_POOL_TIMEOUT", "5")),
+        HASH_METHOD=os.getenv("HASH_METHOD", ""),
+        HASH_TARGET_MS=float(os.getenv("HASH_TARGET_MS", "0")),
+        DIAGNOSTICS_TOKEN=os.getenv("DIAGNOSTICS_TOKEN", ""),
+        RATE_LIMIT_BACKEND=os.getenv("RATE_LIMIT_BACKEND", "memory").lower(),
+        RATE_LIMIT_PATH=os.getenv("RATE_LIMIT_PATH", ""),
+        RATE_LIMIT_PER_IP=int(os.getenv("RATE_LIMIT_PER_IP", "30")),
+        RATE_LIMIT_PER_EMAIL=int(os.getenv("RATE_LIMIT_PER_EMAIL", "10")),
+        TRUSTED_PROXY_HOPS=int(os.getenv("TRUSTED_PROXY_HOPS", "0")),  # koyeb.yaml sets 1
+        REMEMBER_COOKIE_NAME=os.getenv("REMEMBER_COOKIE_NAME", "remember_token"),
+        REMEMBER_ME_DAYS=int(os.getenv("REMEMBER_ME_DAYS", "30")),
+        REMEMBER_ROTATION_GRACE_SECONDS=float(os.getenv("REMEMBER_ROTATION_GRACE_SECONDS", "60")),
+        RESET_TOKEN_MODE=os.getenv("RESET_TOKEN_MODE", "db").lower(),
+        MAINTENANCE_INTERVAL_MINUTES=float(os.getenv("MAINTENANCE_INTERVAL_MINUTES", "0")),
+        MAINTENANCE_UNDO_WINDOW_HOURS=float(os.getenv("MAINTENANCE_UNDO_WINDOW_HOURS", "72")),
+        MAINTENANCE_BATCH_SIZE=int(os.getenv("MAINTENANCE_BATCH_SIZE", "500")),
+        MAINTENANCE_FAILED_RETENTION_DAYS=float(os.getenv("MAINTENANCE_FAILED_RETENTION_DAYS", "14")),
+        JOB_QUEUE_PATH=os.getenv("JOB_QUEUE_PATH", ""),
+        JOB_WORKERS=int(os.getenv("JOB_WORKERS", "2")),
+        JOB_MAX_ATTEMPTS=int(os.getenv("JOB_MAX_ATTEMPTS", "5")),
+        SMTP_HOST=os.getenv("SMTP_HOST", ""),
+        SMTP_PORT=int(os.getenv("SMTP_PORT", "587")),
+        SMTP_USERNAME=os.getenv("SMTP_USERNAME", ""),
+        SMTP_PASSWORD=os.getenv("SMTP_PASSWORD", ""),
+        SMTP_USE_TLS=os.getenv("SMTP_USE_TLS", "1").lower() in ("1", "true", "yes"),
+        MAIL_FROM=os.getenv("MAIL_FROM", "no-reply@localhost"),
+        PUBLIC_BASE_URL=os.getenv("PUBLIC_BASE_URL", "").rstrip("/"),
+        OUTBOX_BATCH_SIZE=int(os.getenv("OUTBOX_BATCH_SIZE", "50")),
+        OUTBOX_POLL_SECONDS=float(os.getenv("OUTBOX_POLL_SECONDS", "2")),
+        OUTBOX_MAX_POLL_SECONDS=float(os.getenv("OUTBOX_MAX_POLL_SECONDS", "60")),
+        OUTBOX_MAX_ATTEMPTS=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")),
+        WEBHOOK_URLS=[u.strip() for u in os.getenv("WEBHOOK_URLS", "").split(",") if u.strip()],
+        WEBHOOK_SECRET=os.getenv("WEBHOOK_SECRET", ""),
+        WEBHOOK_BATCH_SIZE=int(os.getenv("WEBHOOK_BATCH_SIZE", "100")),
+        WEBHOOK_TIMEOUT=float(os.getenv("WEBHOOK_TIMEOUT", "5")),
+        WEBHOOK_MAX_ATTEMPTS=int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "12")),
+        EVENT_BUS=os.getenv("EVENT_BUS", "memory").lower(),
+        EVENT_BUS_PATH=os.getenv("EVENT_BUS_PATH", ""),
+        SSE_MAX_SECONDS=float(os.getenv("SSE_MAX_SECONDS", "300")),
+        SSE_KEEPALIVE_SECONDS=float(os.getenv("SSE_KEEPALIVE_SECONDS", "15")),
+        SSE_MAX_STREAMS=int(os.getenv("SSE_MAX_STREAMS", "4")),
+        BATCH_MAX_OPERATIONS=int(os.getenv("BATCH_MAX_OPERATIONS", "500")),
+        METRICS_DIR=os.getenv("METRICS_DIR", ""),
+        SLOW_QUERY_MS=float(os.getenv("SLOW_QUERY_MS", "100")),
+        SLOW_QUERY_LOG=os.getenv("SLOW_QUERY_LOG", ""),
+        SLOW_QUERY_LOG_MAX_MB=float(os.getenv("SLOW_QUERY_LOG_MAX_MB", "10")),
+        QUERY_BUDGET_ENFORCE=os.getenv("QUERY_BUDGET_ENFORCE", "false").lower() in ("1", "true", "yes"),
+        PROFILE_DIR=os.getenv("PROFILE_DIR", ""),
+        PROFILE_SAMPLE_RATE=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        PROFILE_SAMPLE_INTERVAL_MS=float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")),
+        PROFILE_KEEP=int(os.getenv("PROFILE_KEEP", "200")),
+        TRACEMALLOC_FRAMES=int(os.getenv("TRACEMALLOC_FRAMES", "10")),
+        TEMPLATE_CACHE_DIR=os.getenv("TEMPLATE_CACHE_DIR", ""),
+        TEMPLATE_BYTECODE_CACHE=os.getenv("TEMPLATE_BYTECODE_CACHE", "true").lower() in ("1", "true", "yes"),
+        TEMPLATE_PRECOMPILE=os.getenv("TEMPLATE_PRECOMPILE", "true").lower() in ("1", "true", "yes"),
+        FRAGMENT_CACHE_SIZE=int(os.getenv("FRAGMENT_CACHE_SIZE", "10000")),
+        STATIC_FINGERPRINT=os.getenv("STATIC_FINGERPRINT", "true").lower() in ("1", "true", "yes"),
+        STATIC_BUILD_DIR=os.getenv("STATIC_BUILD_DIR", ""),
+        COMPRESS_RESPONSES=os.getenv("COMPRESS_RESPONSES", "true").lower() in ("1", "true", "yes"),
+        COMPRESS_MIN_SIZE=int(os.getenv("COMPRESS_MIN_SIZE", "1024")),
+        COMPRESS_LEVEL=int(os.getenv("COMPRESS_LEVEL", "6")),
 )
+    if app.config["TRUSTED_PROXY_HOPS"] > 0:
+        # Behind Koyeb's (or any) reverse proxy every request comes from the proxy's address;
+        # take the client IP and scheme from the X-Forwarded-* headers the trusted hops append.
+        # Off by default: without a proxy those headers come straight from the client.
+        hops = app.config["TRUSTED_PROXY_HOPS"]
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
     # Ensure instance folder exists for SQLite file storage
     try:
         os.makedirs(app.instance_path, exist_ok=True)
     except Exception:
         pass
+    app.extensions["metrics"] = create_metrics_registry(app)
+    app.extensions["slow_query_log"] = SlowQueryLog(
+        app.config["SLOW_QUERY_LOG"] or os.path.join(app.instance_path, "slow_queries.log"),
+        app.config["SLOW_QUERY_MS"],
+    )
+    app.extensions["profiler"] = RequestProfiler(
+        app.config["PROFILE_DIR"] or os.path.join(app.instance_path, "profiles"),
+        sample_interval=app.config["PROFILE_SAMPLE_INTERVAL_MS"] / 1000,
+        keep=app.config["PROFILE_KEEP"],
+    )
+    app.extensions["memory"] = MemoryDiagnostics(frames=app.config["TRACEMALLOC_FRAMES"])
+    app.extensions["startup"] = startup
+    if app.config["TEMPLATE_BYTECODE_CACHE"]:
+        configure_template_cache(app)
+    startup.mark("config")
     initialize_database(app)
+    startup.mark("database")
+    hash_method = app.config["HASH_METHOD"]
+    if app.config["HASH_TARGET_MS"] > 0:
+        hash_method = calibrate_hash_method(app.config["HASH_TARGET_MS"], hash_method or "pbkdf2:sha256")
+        print(f"[HASH] Calibrated {hash_method} for ~{app.config['HASH_TARGET_MS']:.0f} ms per hash")
+    try:
+        app.extensions["password_hasher"] = PasswordHasher(
+            workers=app.config["HASH_POOL_WORKERS"],
+            queue_limit=app.config["HASH_POOL_QUEUE_LIMIT"],
+            timeout=app.config["HASH_POOL_TIMEOUT"],
+            method=hash_method,
+        )
+    except ValueError as exc:
+        # Fail at startup rather than with a 500 on the first login.
+        raise ValueError(f"HASH_METHOD {hash_method!r} is not a valid werkzeug hash method: {exc}") from None
+    startup.mark("hashing")
+    if app.config["RATE_LIMIT_BACKEND"] == "sqlite":
+        rate_limit_path = app.config["RATE_LIMIT_PATH"] or os.path.join(app.instance_path, "ratelimit.db")
+        app.extensions["rate_limiter"] = SQLiteTokenBucketLimiter(rate_limit_path)
+    elif app.config["RATE_LIMIT_BACKEND"] == "memory":
+        app.extensions["rate_limiter"] = TokenBucketLimiter()
+    elif app.config["RATE_LIMIT_BACKEND"] != "off":
+        # A typo must not silently turn throttling off.
+        raise ValueError(f"RATE_LIMIT_BACKEND must be memory, sqlite or off, not {app.config['RATE_LIMIT_BACKEND']!r}")
+    job_queue = JobQueue(
+        app.config["JOB_QUEUE_PATH"] or os.path.join(app.instance_path, "jobs.db"),
+        workers=app.config["JOB_WORKERS"],
+        max_attempts=app.config["JOB_MAX_ATTEMPTS"],
+    )
+    job_queue.register("seed_demo_deliveries", lambda payload: ensure_demo_deliveries_for_user(app, payload["user_id"]))
+    job_queue.register("send_password_reset", lambda payload: send_password_reset(app, payload["email"]))
+    app.extensions["job_queue"] = job_queue
+    if app.config["SMTP_HOST"]:
+        transport = SMTPTransport(
+            app.config["SMTP_HOST"],
+            app.config["SMTP_PORT"],
+            username=app.config["SMTP_USERNAME"],
+            password=app.config["SMTP_PASSWORD"],
+            use_tls=app.config["SMTP_USE_TLS"],
+            sender=app.config["MAIL_FROM"],
+        )
+    else:
+        transport = ConsoleTransport()
+    if not public_base_url(app):
+        print(f"[MAIL] PUBLIC_BASE_URL is not set; emailed links will point at {DEFAULT_PUBLIC_BASE_URL}")
+    app.extensions["outbox_sender"] = OutboxSender(
+        transport,
+        claim=lambda batch_size: claim_outbox_batch(app, batch_size),
+        mark_sent=lambda ids: mark_outbox_sent(app, ids),
+        mark_failed=lambda row, error: mark_outbox_failed(app, row, error),
+        batch_size=app.config["OUTBOX_BATCH_SIZE"],
+        poll_interval=app.config["OUTBOX_POLL_SECONDS"],
+        max_poll_interval=app.config["OUTBOX_MAX_POLL_SECONDS"],
+    )
+
+    app.extensions["webhook_dispatcher"] = WebhookDispatcher(
+        app.config["WEBHOOK_URLS"],
+        app.config["WEBHOOK_SECRET"],
+        claim=lambda endpoint, batch_size: claim_webhook_batch(app, endpoint, batch_size),
+        mark_delivered=lambda ids: mark_webhooks_delivered(app, ids),
+        mark_failed=lambda rows, error: mark_webhooks_failed(app, rows, error),
+        batch_size=app.config["WEBHOOK_BATCH_SIZE"],
+        timeout=app.config["WEBHOOK_TIMEOUT"],
+    )
+
+    event_bus_path = None
+    if app.config["EVENT_BUS"] == "sqlite":
+        event_bus_path = app.config["EVENT_BUS_PATH"] or os.path.join(app.instance_path, "events.db")
+    app.extensions["event_broker"] = EventBroker(event_bus_path, max_subscribers=app.config["SSE_MAX_STREAMS"])
+    app.extensions["fragment_cache"] = FragmentCache(app.config["FRAGMENT_CACHE_SIZE"])
+    startup.mark("services")
+
+    @app.template_global()
+    def cached_fragment(name: str, *parts, caller):
+        return render_cached_fragment(app, name, *parts, caller=caller)
+
+    if app.config["STATIC_FINGERPRINT"]:
+        configure_static_assets(app)
+        startup.mark("assets")
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_seconds = 0.0
+        g.db_records = []
+        g.query_budget = getattr(app.view_functions.get(request.endpoint), "query_budget", None)
+
+    @app.before_request
+    def start_profiling():
+        mode = requested_profile_mode(app)
+        if mode:
+            g.active_profile = get_profiler(app).start(mode)
+
+    @app.before_request
+    def start_background_workers():
+        start_background_services(app)
+
+    @app.before_request
+    def restore_remembered_session():
+        # Endpoint first: touching the session adds Vary: Cookie, which would spoil caching of static files.
+        if request.endpoint in (None, "static", "logout") or session.get("user_id"):
+            return
+        token = request.cookies.get(app.config["REMEMBER_COOKIE_NAME"])
+        if not token:
+            return
+        record = fetch_device_token(app, token)
+        if not record or record.get("revoked_at") or record["expires_at"] < datetime.now(timezone.utc):
+            g.clear_remember_cookie = True
+            return
+        session["user_id"] = record["user_id"]
+        session["user_email"] = record["email"]
+        session["user_name"] = record.get("full_name")
+        # Rotate on use so a stolen cookie stops working once the owner returns. Requests racing
+        # this one with the same cookie still get in during the grace window, but do not rotate again.
+        rotated = rotate_device_token(app, record["id"], record["user_id"], request.user_agent.string)
+        if rotated:
+            g.remember_token = rotated
+
+    # after_request hooks run in reverse order: profiling and metrics are registered
+    # first so they run last and include the time spent in the other hooks.
+    @app.after_request
+    def finish_profiling(response):
+        active = g.pop("active_profile", None)
+        if active is not None:
+            profiler = get_profiler(app)
+            elapsed = profiler.stop(active)
+            name = profiler.save(active, request.endpoint or "unmatched", elapsed)
+            if name and request.headers.get("X-Profile"):
+                response.headers["X-Profile-Name"] = name
+        return response
+
+    @app.teardown_request
+    def discard_unfinished_profile(exc):
+        active = g.pop("active_profile", None)
+        if active is not None:
+            get_profiler(app).stop(active)
+
+    @app.after_request
+    def record_request_metrics(response):
+        if "request_started" in g:
+            record_request(app, response.status_code, time.perf_counter() - g.request_started)
+        return response
+
+    @app.after_request
+    def update_remember_cookie(response):
+        if "remember_token" in g:
+            set_remember_cookie(app, response, *g.remember_token)
+        elif g.get("clear_remember_cookie"):
+            response.delete_cookie(app.config["REMEMBER_COOKIE_NAME"])
+        return response
+
+    # Registered last so it runs first: the hooks after it only touch headers.
+    @app.after_request
+    def compress_dynamic_response(response):
+        if app.config["COMPRESS_RESPONSES"]:
+            compress_response(app, response)
+        return response
 
     @app.get("/")
     def index():
@@ -36,32 +331,51 @@ def create_app() -> Flask:
         return redirect(url_for("login"))
 
     @app.route("/login", methods=["GET", "POST"])
+    @query_budget(8)
     def login():
         if request.method == "POST":
             email = (request.form.get("email") or "").strip().lower()
             password = request.form.get("password") or ""
+            if is_rate_limited(app, "login", email):
+                flash(RATE_LIMITED_MESSAGE, "error")
+                return render_template("login.html"), 429
             if not email or not password:
                 flash("Please enter both email and password.", "error")
                 return render_template("login.html")
             user = fetch_user_by_email(app, email)
-            if not user or not check_password_hash(user["password_hash"], password):
+            try:
+                valid = bool(user) and get_password_hasher(app).verify(user["password_hash"], password)
+            except HashingBusyError:
+                flash("The server is busy. Please try again in a moment.", "error")
+                return render_template("login.html"), 503
+            if not valid:
                 flash("Invalid email or password.", "error")
                 return render_template("login.html")
+            rehash_password_if_needed(app, user, password)
             session["user_id"] = user["id"]
             session["user_email"] = user["email"]
             session["user_name"] = user.get("full_name")
+            if request.form.get("remember"):
+                try:
+                    g.remember_token = create_device_token(app, user["id"], request.user_agent.string)
+                except (MySQLError, sqlite3.Error) as exc:
+                    print(f"[DB] Error creating device token: {exc}")
             flash("Logged in successfully.", "success")
-            ensure_demo_deliveries_for_user(app, user["id"])  # seed when empty (dev/demo)
+            enqueue_job(app, "seed_demo_deliveries", {"user_id": user["id"]})  # seed when empty (dev/demo)
             return redirect(url_for("dashboard"))
         return render_template("login.html")
 
     @app.route("/register", methods=["GET", "POST"])
+    @query_budget(5)
     def register():
         if request.method == "POST":
             full_name = (request.form.get("full_name") or "").strip()
             email = (request.form.get("email") or "").strip().lower()
             password = request.form.get("password") or ""
             confirm_password = request.form.get("confirm_password") or ""
+            if is_rate_limited(app, "register", email):
+                flash(RATE_LIMITED_MESSAGE, "error")
+                return render_template("register.html", full_name=full_name, email=email), 429
             error_messages = validate_registration_input(full_name, email, password, confirm_password)
             if error_messages:
                 for message in error_messages:
@@ -85,6 +399,7 @@ def create_app() -> Flask:
         return redirect(url_for("dashboard"))
 
     @app.get("/dashboard")
+    @query_budget(6)
     def dashboard():
         if not session.get("user_id"):
             flash("Please log in to continue.", "error")
@@ -102,6 +417,7 @@ def create_app() -> Flask:
         )
 
     @app.get("/deliveries")
+    @query_budget(4)
     def deliveries_page():
         if not session.get("user_id"):
             flash("Please log in to continue.", "error")
@@ -110,6 +426,46 @@ def create_app() -> Flask:
         deliveries = fetch_deliveries_list(app, user_id)
         return render_template("deliveries.html", deliveries=deliveries)
 
+    @app.get("/deliveries/stream")
+    def deliveries_stream():
+        if not session.get("user_id"):
+            abort(401)
+        user_id = session["user_id"]
+        broker = get_event_broker(app)
+        subscription = broker.subscribe(user_id)
+        if subscription is None:
+            # Every stream pins a worker thread; past the cap, leave the rest for page requests.
+            # The page's script reopens the stream after Retry-After.
+            get_metrics(app).inc("app_sse_rejected_total")
+            return app.response_class(
+                "Too many live-update streams on this worker.\n",
+                status=503,
+                mimetype="text/plain",
+                headers={"Retry-After": str(SSE_RETRY_AFTER_SECONDS), "Cache-Control": "no-cache"},
+            )
+        deadline = time.monotonic() + app.config["SSE_MAX_SECONDS"]
+        keepalive = app.config["SSE_KEEPALIVE_SECONDS"]
+
+        def stream():
+            try:
+                # Close periodically so no thread is held forever; EventSource reconnects.
+                yield "retry: 3000\n\n"
+                while time.monotonic() < deadline:
+                    try:
+                        event = subscription.get(timeout=keepalive)
+                    except queue.Empty:
+                        yield ": keepalive\n\n"
+                        continue
+                    yield f"event: delivery\ndata: {json.dumps(event)}\n\n"
+            finally:
+                broker.unsubscribe(user_id, subscription)
+
+        return app.response_class(
+            stream(),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     @app.get("/routes")
     def routes_page():
         if not session.get("user_id"):
@@ -127,6 +483,7 @@ def create_app() -> Flask:
         return redirect(url_for("dashboard"))
 
     @app.route("/deliveries/add", methods=["POST"])
+    @query_budget(4)
     def deliveries_add():
         if not session.get("user_id"):
             flash("Please log in to continue.", "error")
@@ -149,24 +506,30 @@ def create_app() -> Flask:
         return redirect(url_for("deliveries_page"))
 
     @app.post("/deliveries/status")
+    @query_budget(6)
     def deliveries_status():
         if not session.get("user_id"):
-            return redirect(url_for("login"))
+            return json_unauthorized() if wants_json() else redirect(url_for("login"))
         user_id = session["user_id"]
         delivery_id = int(request.form.get("delivery_id") or 0)
         status = (request.form.get("status") or "").strip()
         ok, msg = update_delivery_status(app, user_id, delivery_id, status)
+        if wants_json():
+            return delivery_mutation_json(app, user_id, ok, msg or "Could not update status.", delivery_id)
         if not ok:
             flash(msg or "Could not update status.", "error")
         return redirect(url_for("deliveries_page"))
 
     @app.post("/deliveries/delete")
+    @query_budget(6)
     def deliveries_delete():
         if not session.get("user_id"):
-            return redirect(url_for("login"))
+            return json_unauthorized() if wants_json() else redirect(url_for("login"))
         user_id = session["user_id"]
         delivery_id = int(request.form.get("delivery_id") or 0)
         ok, msg = soft_delete_delivery(app, user_id, delivery_id)
+        if wants_json():
+            return delivery_mutation_json(app, user_id, ok, msg or "Could not delete delivery.", delivery_id)
         if not ok:
             flash(msg or "Could not delete delivery.", "error")
         else:
@@ -174,42 +537,76 @@ def create_app() -> Flask:
         return redirect(url_for("deliveries_page"))
 
     @app.post("/deliveries/undo-delete")
+    @query_budget(6)
     def deliveries_undo_delete():
         if not session.get("user_id"):
-            return redirect(url_for("login"))
+            return json_unauthorized() if wants_json() else redirect(url_for("login"))
         user_id = session["user_id"]
         delivery_id = int(request.form.get("delivery_id") or 0)
         ok, msg = undo_delete_delivery(app, user_id, delivery_id)
+        if wants_json():
+            return delivery_mutation_json(app, user_id, ok, msg or "Could not undo delete.", delivery_id)
         if not ok:
             flash(msg or "Could not undo delete.", "error")
         else:
             flash("Deletion reverted.", "success")
         return redirect(url_for("deliveries_page"))
 
+    @app.post("/deliveries/batch")
+    def deliveries_batch():
+        if not session.get("user_id"):
+            return json_unauthorized()
+        user_id = session["user_id"]
+        body = request.get_json(silent=True)
+        operations = body.get("operations") if isinstance(body, dict) else None
+        if not isinstance(operations, list):
+            return jsonify({"ok": False, "error": "Expected a JSON object with an \"operations\" list."}), 400
+        if len(operations) > app.config["BATCH_MAX_OPERATIONS"]:
+            return jsonify({"ok": False, "error": f"At most {app.config['BATCH_MAX_OPERATIONS']} operations per batch."}), 413
+        ok, results = apply_delivery_batch(app, user_id, operations)
+        if not ok and results:
+            return jsonify({"ok": False, "results": results}), 400
+        if not ok:
+            return jsonify({"ok": False, "error": "The batch could not be saved; nothing was applied."}), 500
+        return jsonify({"ok": True, "results": results, "counts": fetch_delivery_counts(app, user_id)})
+
     @app.get("/logout")
+    @query_budget(4)
     def logout():
+        token = request.cookies.get(app.config["REMEMBER_COOKIE_NAME"])
+        if token:
+            revoke_device_token(app, token)
+            g.clear_remember_cookie = True
         session.clear()
         flash("You have been logged out.", "success")
         return redirect(url_for("login"))
 
     @app.route("/forgot", methods=["GET", "POST"])
+    @query_budget(6)
     def forgot_password():
         if request.method == "POST":
             email = (request.form.get("email") or "").strip().lower()
-            # Always show generic response to avoid user enumeration
-            user = fetch_user_by_email(app, email) if email else None
-            if user:
-                token, expires_at = create_password_reset_token(app, user["id"])
-                reset_url = url_for("reset_password", token=token, _external=True)
-                print(f"[RESET] Password reset link for {email}: {reset_url} (expires {expires_at.isoformat()})")
+            if is_rate_limited(app, "forgot", email):
+                flash(RATE_LIMITED_MESSAGE, "error")
+                return render_template("forgot.html"), 429
+            # Always show generic response to avoid user enumeration; the lookup
+            # happens in the background job so timing does not reveal it either
+            if email:
+                enqueue_job(app, "send_password_reset", {"email": email})
             flash("If that email exists, you'll receive reset instructions.", "success")
             return redirect(url_for("login"))
         return render_template("forgot.html")
 
     @app.route("/reset/<token>", methods=["GET", "POST"])
     def reset_password(token: str):
-        record = fetch_password_reset_by_token(app, token)
-        if not record or record.get("used_at") or record["expires_at"] < datetime.now(timezone.utc):
+        if is_signed_reset_token(token):
+            user = verify_signed_reset_token(app, token)
+            user_id = user["id"] if user else None
+        else:
+            record = fetch_password_reset_by_token(app, token)
+            valid = record and not record.get("used_at") and record["expires_at"] >= datetime.now(timezone.utc)
+            user_id = record["user_id"] if valid else None
+        if user_id is None:
             flash("Invalid or expired reset link.", "error")
             return redirect(url_for("forgot_password"))
         if request.method == "POST":
@@ -222,15 +619,187 @@ def create_app() -> Flask:
                 for msg in errors:
                     flash(msg, "error")
                 return render_template("reset_password.html", token=token)
-            ok, msg = update_user_password(app, record["user_id"], password)
+            ok, msg = update_user_password(app, user_id, password)
             if not ok:
                 flash(msg or "Could not update password.", "error")
                 return render_template("reset_password.html", token=token)
-            mark_password_reset_used(app, token)
+            if not is_signed_reset_token(token):
+                # Signed tokens need no bookkeeping: the new password hash invalidates them.
+                mark_password_reset_used(app, token)
+            revoke_all_device_tokens(app, user_id)
             flash("Your password has been reset. You can log in now.", "success")
             return redirect(url_for("login"))
         return render_template("reset_password.html", token=token)
 
+    @app.get("/internal/hashing")
+    def hashing_stats():
+        if not is_diagnostics_request(app):
+            abort(404)
+        return jsonify(get_password_hasher(app).stats())
+
+    @app.get("/internal/startup")
+    def startup_stats():
+        if not is_diagnostics_request(app):
+            abort(404)
+        timer = app.extensions["startup"]
+        # With preload_app the factory ran in the gunicorn master, so its pid differs from ours.
+        return jsonify({**timer.as_dict(), "worker_pid": os.getpid(), "preloaded": timer.pid != os.getpid()})
+
+    @app.get("/internal/fragments")
+    def fragment_stats():
+        if not is_diagnostics_request(app):
+            abort(404)
+        return jsonify(app.extensions["fragment_cache"].stats())
+
+    @app.get("/internal/jobs")
+    def job_stats():
+        if not is_diagnostics_request(app):
+            abort(404)
+        return jsonify(get_job_queue(app).stats())
+
+    @app.get("/metrics")
+    def metrics():
+        if not is_diagnostics_request(app):
+            abort(404)
+        return get_metrics(app).render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+    @app.get("/internal/profiles")
+    def profile_list():
+        if not is_diagnostics_request(app):
+            abort(404)
+        return jsonify(get_profiler(app).list_profiles())
+
+    @app.get("/internal/profiles/<name>")
+    def profile_download(name: str):
+        if not is_diagnostics_request(app):
+            abort(404)
+        return send_from_directory(get_profiler(app).directory, name, as_attachment=True)
+
+    @app.get("/internal/memory")
+    def memory_report():
+        if not is_diagnostics_request(app):
+            abort(404)
+        diagnostics = app.extensions["memory"]
+        group = request.args.get("group", "lineno")
+        if group not in ("lineno", "filename", "traceback"):
+            return jsonify({"error": "group must be lineno, filename or traceback"}), 400
+        top = diagnostics.report(
+            limit=min(request.args.get("top", 20, type=int), 200),
+            key_type=group,
+            diff=request.args.get("diff") == "1",
+        )
+        return jsonify({**diagnostics.status(), "db_connections_open": open_connection_count(), "top": top})
+
+    @app.post("/internal/memory")
+    def memory_control():
+        """Per-worker tracemalloc control: action=start|snapshot|collect|stop."""
+        if not is_diagnostics_request(app):
+            abort(404)
+        diagnostics = app.extensions["memory"]
+        action = request.form.get("action") or request.args.get("action") or ""
+        if action == "start":
+            diagnostics.start()
+        elif action == "snapshot":
+            if not diagnostics.snapshot():
+                return jsonify({"error": "tracemalloc is not running in this worker"}), 409
+        elif action == "collect":
+            gc.collect()
+        elif action == "stop":
+            diagnostics.stop()
+        else:
+            return jsonify({"error": "action must be start, snapshot, collect or stop"}), 400
+        return jsonify({**diagnostics.status(), "db_connections_open": open_connection_count()})
+
+    @app.cli.command("calibrate-hash")
+    @click.option("--target-ms", type=float, default=250.0, show_default=True)
+    @click.option("--algorithm", default="pbkdf2:sha256", show_default=True)
+    def calibrate_hash_command(target_ms: float, algorithm: str):
+        """Print a HASH_METHOD value that takes about --target-ms per hash here."""
+        method = calibrate_hash_method(target_ms, algorithm)
+        click.echo(f"HASH_METHOD={method}")
+
+    @app.cli.command("maintenance")
+    @click.option("--undo-window-hours", type=float, default=None, help="Archive deliveries deleted longer ago than this.")
+    @click.option("--batch-size", type=int, default=None)
+    @click.option("--skip-optimize", is_flag=True, help="Only purge and archive; skip VACUUM/ANALYZE/OPTIMIZE.")
+    @click.option("--full-vacuum", is_flag=True, help="SQLite: switch to incremental auto-vacuum with one full VACUUM.")
+    def maintenance_command(undo_window_hours, batch_size, skip_optimize: bool, full_vacuum: bool):
+        """Purge spent tokens and long-failed jobs/emails/webhooks, archive old soft-deleted deliveries and optimize tables."""
+        result = run_maintenance(
+            app,
+            undo_window_hours=undo_window_hours,
+            batch_size=batch_size,
+            optimize=not skip_optimize,
+            full_vacuum=full_vacuum,
+        )
+        for key, value in result.items():
+            click.echo(f"{key}: {value}")
+
+    @app.cli.command("seed-synthetic")
+    @click.option("--users", type=int, default=100, show_default=True)
+    @click.option("--deliveries-per-user", type=int, default=1000, show_default=True)
+    @click.option("--password", default="synthetic-password", show_default=True, help="Password shared by every generated user.")
+    @click.option("--email-domain", default="synthetic.test", show_default=True)
+    @click.option("--deleted-fraction", type=float, default=0.05, show_default=True)
+    @click.option("--days", type=int, default=90, show_default=True, help="Spread creation times over this many days.")
+    @click.option("--batch-size", type=int, default=10000, show_default=True)
+    @click.option("--keep-indexes", is_flag=True, help="Maintain indexes during the load instead of rebuilding them after.")
+    @click.option("--seed", type=int, default=None, help="Random seed for reproducible data.")
+    def seed_synthetic_command(users, deliveries_per_user, password, email_domain, deleted_fraction, days, batch_size, keep_indexes, seed):
+        """Bulk-load synthetic users and deliveries for scale testing."""
+        started = time.perf_counter()
+        total = users * deliveries_per_user
+
+        def progress(done: int) -> None:
+            elapsed = time.perf_counter() - started
+            click.echo(f"\r{done}/{total} deliveries ({done / elapsed:,.0f} rows/s)", nl=False)
+
+        user_ids, inserted = seed_synthetic_data(
+            app,
+            users,
+            deliveries_per_user,
+            password=password,
+            email_domain=email_domain,
+            deleted_fraction=deleted_fraction,
+            days=days,
+            batch_size=batch_size,
+            defer_indexes=not keep_indexes,
+            seed=seed,
+            progress=progress,
+        )
+        elapsed = time.perf_counter() - started
+        click.echo(f"\nCreated {len(user_ids)} users and {inserted} deliveries in {elapsed:.1f}s ({inserted / elapsed:,.0f} rows/s, including index builds)")
+
+    @app.cli.command("build-assets")
+    def build_assets_command():
+        """Fingerprint and precompress static files (create_app also does this at startup)."""
+        assets = app.extensions.get("static_assets")
+        if assets is None:
+            raise click.ClickException("Static fingerprinting is off (STATIC_FINGERPRINT) or its build failed")
+        count = assets.build()
+        variants = "brotli and gzip" if brotli is not None else "gzip (install brotli for .br files)"
+        click.echo(f"Built {count} asset(s) with {variants} in {assets.build_dir}")
+
+    @app.cli.command("run-jobs")
+    @click.option("--limit", type=int, default=None, help="Stop after this many jobs.")
+    def run_jobs_command(limit):
+        """Run due background jobs in the foreground, then exit."""
+        count = get_job_queue(app).run_pending(limit)
+        click.echo(f"Ran {count} job(s)")
+
+    @app.cli.command("send-outbox")
+    def send_outbox_command():
+        """Deliver all due outbox emails in the foreground, then exit."""
+        sender = get_outbox_sender(app)
+        count = sender.drain()
+        sender.transport.close()
+        click.echo(f"Sent {count} email(s)")
+
+    startup.mark("routes")
+    if app.config["TEMPLATE_PRECOMPILE"]:
+        precompile_templates(app)
+        startup.mark("templates")
+    print(f"[STARTUP] create_app in pid {startup.pid}: {startup.summary()}")
     return app
 
 def validate_registration_input(full_name: str, email: str, password: str, confirm_password: str) -> list[str]:
@@ -253,15 +822,319 @@ def is_valid_email(email: str) -> bool:
     pattern = r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$"
     return re.match(pattern, email) is not None
 
+def wants_json() -> bool:
+    """True for fetch() callers that asked for JSON rather than the redirect/flash flow."""
+    return request.accept_mimetypes.best_match(["text/html", "application/json"]) == "application/json"
+
+def json_unauthorized():
+    return jsonify({"ok": False, "error": "Please log in to continue."}), 401
+
+def delivery_mutation_json(app: Flask, user_id: int, ok: bool, error: str, delivery_id: int):
+    """JSON result of a one-row mutation: the row as read back after it, plus fresh counters.
+
+    A delivery that does not exist or belongs to another user is a 404.
+    Clients that send ``Prefer: return=minimal`` get a bare 204 and skip the
+    read-back and counter queries entirely.
+    """
+    if not ok:
+        return jsonify({"ok": False, "error": error}), 404 if error == DELIVERY_NOT_FOUND else 400
+    if "return=minimal" in request.headers.get("Prefer", ""):
+        return "", 204
+    delivery = fetch_delivery(app, user_id, delivery_id)
+    if delivery is None:
+        return jsonify({"ok": False, "error": DELIVERY_NOT_FOUND}), 404
+    return jsonify({"ok": True, "delivery": delivery, "counts": fetch_delivery_counts(app, user_id)})
+
+def is_diagnostics_request(app: Flask) -> bool:
+    """True when the request carries the configured X-Diagnostics-Token (or it as a bearer token)."""
+    token = app.config.get("DIAGNOSTICS_TOKEN") or ""
+    supplied = request.headers.get("X-Diagnostics-Token") or ""
+    authorization = request.headers.get("Authorization") or ""
+    if not supplied and authorization.startswith("Bearer "):
+        supplied = authorization[len("Bearer "):]
+    return bool(token) and secrets.compare_digest(token, supplied)
+
+def get_profiler(app: Flask) -> RequestProfiler:
+    return app.extensions["profiler"]
+
+def requested_profile_mode(app: Flask) -> Optional[str]:
+    """Profile mode for this request: an authorized X-Profile header, else random sampling."""
+    mode = (request.headers.get("X-Profile") or "").lower()
+    if mode in PROFILE_MODES and is_diagnostics_request(app):
+        return mode
+    rate = app.config["PROFILE_SAMPLE_RATE"]
+    if rate > 0 and request.endpoint not in (None, "static") and random.random() < rate:
+        return "sample"
+    return None
+
+PASSWORD_RESET_TTL = timedelta(hours=1)
+
+SSE_RETRY_AFTER_SECONDS = 30
+
+DELIVERY_NOT_FOUND = "Delivery not found."
+
+RATE_LIMITED_MESSAGE = "Too many attempts. Please wait a minute and try again."
+
+def is_rate_limited(app: Flask, scope: str, email: str = "") -> bool:
+    """Consume a token for the client IP (and email, when given); True when either bucket is empty.
+
+    ``remote_addr`` is the real client address once ProxyFix has applied
+    TRUSTED_PROXY_HOPS; without it every client behind the proxy would share one bucket.
+    """
+    limiter = app.extensions.get("rate_limiter")
+    if limiter is None:
+        return False
+    if not limiter.allow(f"{scope}:ip:{request.remote_addr or 'unknown'}", app.config["RATE_LIMIT_PER_IP"]):
+        return True
+    if email and not limiter.allow(f"{scope}:email:{email}", app.config["RATE_LIMIT_PER_EMAIL"]):
+        return True
+    return False
+
+def get_job_queue(app: Flask) -> JobQueue:
+    return app.extensions["job_queue"]
+
+def enqueue_job(app: Flask, name: str, payload: dict) -> None:
+    """Queue side work for the background workers, running it inline if the queue is unavailable."""
+    queue = get_job_queue(app)
+    try:
+        queue.enqueue(name, payload)
+    except sqlite3.Error as exc:
+        print(f"[JOBS] Could not enqueue {name}, running inline: {exc}")
+        queue.run_inline(name, payload)
+
+def get_password_hasher(app: Flask) -> PasswordHasher:
+    return app.extensions["password_hasher"]
+
+def configure_template_cache(app: Flask) -> None:
+    """Keep compiled templates on disk so new processes skip Jinja's parse and compile step.
+
+    Entries are keyed by template name and source checksum, so an edited
+    template is recompiled rather than served stale. Must run before
+    ``app.jinja_env`` is first touched.
+    """
+    cache_dir = app.config["TEMPLATE_CACHE_DIR"] or os.path.join(app.instance_path, "jinja_cache")
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as exc:
+        print(f"[TEMPLATES] Bytecode cache disabled, cannot create {cache_dir}: {exc}")
+        return
+    app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(cache_dir)}
+
+def precompile_templates(app: Flask) -> int:
+    """Load every template into the environment's cache; returns how many were compiled.
+
+    Run at startup (in the gunicorn master when preloading), so no worker
+    compiles a template while a request waits for it.
+    """
+    count = 0
+    for name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+            count += 1
+        except Exception as exc:  # a broken template should fail its own requests, not startup
+            print(f"[TEMPLATES] Could not precompile {name}: {exc}")
+    return count
+
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def configure_static_assets(app: Flask) -> None:
+    """Serve /static from fingerprinted, precompressed copies with far-future caching.
+
+    url_for('static', filename='styles.css') yields the content-hashed name,
+    and the static view answers it with the brotli, gzip or plain variant
+    the client accepts, marked immutable. Names not in the build (e.g. a
+    file added after startup) fall through to Flask's plain static view.
+    """
+    assets = StaticAssets(app.static_folder, app.config["STATIC_BUILD_DIR"] or os.path.join(app.instance_path, "static_build"))
+    try:
+        assets.build()
+    except OSError as exc:
+        print(f"[ASSETS] Build failed, serving plain static files: {exc}")
+        return
+    app.extensions["static_assets"] = assets
+    plain_static = app.view_functions["static"]
+
+    @app.url_defaults
+    def fingerprint_static_url(endpoint: str, values: dict) -> None:
+        if endpoint == "static" and "filename" in values:
+            values["filename"] = assets.url_name(values["filename"]) or values["filename"]
+
+    def static(filename: str):
+        found = assets.variant(filename, lambda encoding: request.accept_encodings[encoding])
+        if found is None:
+            return plain_static(filename=filename)
+        path, encoding = found
+        response = send_from_directory(assets.build_dir, path, mimetype=assets.mimetypes[filename], max_age=STATIC_IMMUTABLE_MAX_AGE)
+        response.cache_control.immutable = True
+        response.vary.add("Accept-Encoding")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        return response
+
+    app.view_functions["static"] = static
+
+def start_background_services(app: Flask) -> None:
+    """Start this process's job workers, outbox sender, webhook dispatcher, metrics flusher and maintenance thread (idempotent)."""
+    get_job_queue(app).start()
+    get_outbox_sender(app).start()
+    get_webhook_dispatcher(app).start()
+    get_metrics(app).start()
+    if app.config["MAINTENANCE_INTERVAL_MINUTES"] > 0:
+        start_maintenance_scheduler(app)
+
+def after_fork(app: Flask, forked_at: Optional[float] = None) -> None:
+    """Per-worker setup, called from gunicorn.conf.py once a worker has loaded the app.
+
+    With preload_app the master ran create_app once and the worker inherited
+    the result. Threads, the hashing pool and SQLite handles do not survive a
+    fork; each is keyed by pid and would be rebuilt lazily. Doing it here moves
+    that cost off the worker's first requests.
+    """
+    started = forked_at if forked_at is not None else time.perf_counter()
+    get_password_hasher(app).warm()
+    start_background_services(app)
+    startup = app.extensions["startup"]
+    startup.add("worker_boot", time.perf_counter() - started)
+    print(f"[STARTUP] worker {os.getpid()} ready in {startup.phases['worker_boot'] * 1000:.0f}ms")
+
+QUERIES_PER_REQUEST_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+COMPRESSION_RATIO_BUCKETS = (0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1.0)
+
+def create_metrics_registry(app: Flask) -> MetricsRegistry:
+    registry = MetricsRegistry(app.config["METRICS_DIR"] or os.path.join(app.instance_path, "metrics"))
+    registry.describe("app_http_requests_total", "counter", "Requests by endpoint, method and status code.")
+    registry.describe("app_http_request_duration_seconds", "histogram", "Request latency by endpoint.")
+    registry.describe("app_db_queries_total", "counter", "SQL statements executed, by endpoint.")
+    registry.describe("app_db_query_seconds_total", "counter", "Time spent in SQL statements, by endpoint.")
+    registry.describe("app_db_queries_per_request", "histogram", "SQL statements per request.", QUERIES_PER_REQUEST_BUCKETS)
+    registry.describe("app_query_budget_exceeded_total", "counter", "Requests that ran more queries than their view's budget.")
+    registry.describe("app_cache_requests_total", "counter", "Cache lookups by cache and result (hit/miss).")
+    registry.describe("app_compressed_responses_total", "counter", "Responses gzip-compressed on the fly, by endpoint.")
+    registry.describe("app_compression_bytes_in_total", "counter", "Response bytes before compression, by endpoint.")
+    registry.describe("app_compression_bytes_out_total", "counter", "Response bytes after compression, by endpoint.")
+    registry.describe("app_compression_seconds_total", "counter", "Time spent compressing responses, by endpoint.")
+    registry.describe("app_compression_ratio", "histogram", "Compressed size / original size per response.", COMPRESSION_RATIO_BUCKETS)
+    registry.describe("app_db_connections_open", "gauge", "DB connections opened and not yet closed.")
+    registry.describe("app_hash_pool_workers", "gauge", "Password hashing worker processes.")
+    registry.describe("app_hash_pool_queue_depth", "gauge", "Password hashes queued or running.")
+    registry.describe("app_hash_pool_rejected_total", "counter", "Hash requests rejected because the pool was full.")
+    registry.describe("app_sse_subscribers", "gauge", "Open live-update streams.")
+    registry.describe("app_sse_rejected_total", "counter", "Live-update streams refused because the worker was at SSE_MAX_STREAMS.")
+
+    def collect_pools(metrics: MetricsRegistry) -> None:
+        metrics.set_gauge("app_db_connections_open", open_connection_count())
+        hasher = app.extensions.get("password_hasher")
+        if hasher is not None:
+            stats = hasher.stats()
+            metrics.set_gauge("app_hash_pool_workers", stats["workers"])
+            metrics.set_gauge("app_hash_pool_queue_depth", stats["queue_depth"])
+            metrics.set_counter("app_hash_pool_rejected_total", stats["rejected"])
+        broker = app.extensions.get("event_broker")
+        if broker is not None:
+            metrics.set_gauge("app_sse_subscribers", broker.subscriber_count())
+
+    registry.add_collector(collect_pools)
+    return registry
+
+def get_metrics(app: Flask) -> MetricsRegistry:
+    return app.extensions["metrics"]
+
+def record_request(app: Flask, status_code: int, seconds: float) -> None:
+    metrics = get_metrics(app)
+    endpoint = request.endpoint or "(unmatched)"  # raw paths would explode label cardinality
+    metrics.inc("app_http_requests_total", endpoint=endpoint, method=request.method, status=status_code)
+    metrics.observe("app_http_request_duration_seconds", seconds, endpoint=endpoint)
+    metrics.observe("app_db_queries_per_request", g.db_queries, endpoint=endpoint)
+    if g.db_queries:
+        metrics.inc("app_db_queries_total", g.db_queries, endpoint=endpoint)
+        metrics.inc("app_db_query_seconds_total", g.db_seconds, endpoint=endpoint)
+    slow_log = app.extensions["slow_query_log"]
+    for record in g.db_records:
+        if slow_log.is_slow(record):
+            slow_log.write(record, endpoint=endpoint, method=request.method)
+    budget = g.query_budget
+    if budget is not None and g.db_queries > budget:
+        metrics.inc("app_query_budget_exceeded_total", endpoint=endpoint)
+        print(f"[DB] {endpoint} ran {g.db_queries} queries (budget {budget}):\n{summarize(g.db_records)}")
+
+def record_query(app: Flask, record) -> None:
+    """TracedConnection hook: charge the statement to the current request, or to background work."""
+    if has_request_context() and "db_records" in g:
+        g.db_queries += 1
+        g.db_seconds += record.seconds
+        g.db_records.append(record)
+        budget = g.query_budget
+        if budget is not None and g.db_queries > budget and app.config["QUERY_BUDGET_ENFORCE"]:
+            # Raised from the offending execute() so the traceback points at the extra query.
+            raise QueryBudgetExceeded(
+                f"{request.endpoint} exceeded its budget of {budget} queries:\n{summarize(g.db_records)}"
+            )
+        return
+    metrics = app.extensions.get("metrics")
+    if metrics is not None:
+        metrics.inc("app_db_queries_total", endpoint="(background)")
+        metrics.inc("app_db_query_seconds_total", record.seconds, endpoint="(background)")
+    slow_log = app.extensions.get("slow_query_log")
+    if slow_log is not None and slow_log.is_slow(record):
+        slow_log.write(record, endpoint="(background)")
+
+def record_cache_lookup(app: Flask, cache: str, hit: bool) -> None:
+    get_metrics(app).inc("app_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+def compress_response(app: Flask, response) -> None:
+    """Gzip ``response`` in place when the client accepts it and it is worth it (see compression.py)."""
+    vary_on_encoding = response.mimetype != "text/event-stream" and not response.direct_passthrough
+    if vary_on_encoding:
+        response.vary.add("Accept-Encoding")  # also on uncompressed replies, so caches keep the variants apart
+    if not request.accept_encodings["gzip"] or not should_compress(response, app.config["COMPRESS_MIN_SIZE"]):
+        return
+    endpoint = request.endpoint or "(unmatched)"
+    level = app.config["COMPRESS_LEVEL"]
+
+    def record(bytes_in: int, bytes_out: int, seconds: float) -> None:
+        # Streams finish after the request context is gone, hence the captured endpoint.
+        metrics = get_metrics(app)
+        metrics.inc("app_compressed_responses_total", endpoint=endpoint)
+        metrics.inc("app_compression_bytes_in_total", bytes_in, endpoint=endpoint)
+        metrics.inc("app_compression_bytes_out_total", bytes_out, endpoint=endpoint)
+        metrics.inc("app_compression_seconds_total", seconds, endpoint=endpoint)
+        if bytes_in:
+            metrics.observe("app_compression_ratio", bytes_out / bytes_in, endpoint=endpoint)
+
+    if response.is_streamed:
+        response.response = gzip_stream(response.response, level, record)
+        response.headers.pop("Content-Length", None)
+    else:
+        response.set_data(gzip_body(response.get_data(), level, record))
+    response.headers["Content-Encoding"] = "gzip"
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-gzip", weak)
+
+def render_cached_fragment(app: Flask, name: str, *parts, caller: Callable[[], str]) -> Markup:
+    """Body of a ``{% call cached_fragment(name, ...) %}`` block, from cache when possible.
+
+    The key is the name, the logged-in user and ``parts``, which must cover
+    everything the block renders from (pass the row dict itself for rows).
+    """
+    cache: FragmentCache = app.extensions["fragment_cache"]
+    if cache.max_entries <= 0:
+        return Markup(caller())
+    key = (name, session.get("user_id"), request.script_root, freeze(parts))
+    markup, hit = cache.render(key, caller)
+    record_cache_lookup(app, "fragments", hit)
+    return Markup(markup)
+
 def get_db_connection(app: Flask, include_database: bool = True):
     """Return a DB connection for the configured backend."""
     backend = app.config.get("DB_BACKEND", "mysql")
     if backend == "sqlite":
         # Allow overriding SQLite storage path (useful on hosts like Koyeb)
-        db_path = os.getenv("SQLITE_PATH") or os.path.join(app.instance_path, "app.db")
+        db_path = app.config["SQLITE_PATH"] or os.path.join(app.instance_path, "app.db")
         conn = sqlite3.connect(db_path, check_same_thread=False)
         conn.row_factory = sqlite3.Row
-        return conn
+        return TracedConnection(conn, lambda record: record_query(app, record))
     # default: mysql
     connection_kwargs = {
         "host": app.config["MYSQL_HOST"],
@@ -272,7 +1145,7 @@ def get_db_connection(app: Flask, include_database: bool = True):
     }
     if include_database:
         connection_kwargs["database"] = app.config["MYSQL_DATABASE"]
-    return mysql.connector.connect(**connection_kwargs)
+    return TracedConnection(mysql_connector().connect(**connection_kwargs), lambda record: record_query(app, record))
 
 def initialize_database(app: Flask) -> None:
     backend = app.config.get("DB_BACKEND", "mysql")
@@ -280,6 +1153,8 @@ def initialize_database(app: Flask) -> None:
         try:
             with get_db_connection(app) as conn:
                 cur = conn.cursor()
+                # Takes effect only on a new database; existing ones need `flask maintenance --full-vacuum`
+                cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
                 cur.execute(
                     """
                     CREATE TABLE IF NOT EXISTS users (
@@ -335,6 +1210,79 @@ def initialize_database(app: Flask) -> None:
                     )
                     """
                 )
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS device_tokens (
+                      id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      user_id INTEGER NOT NULL,
+                      token_hash TEXT NOT NULL UNIQUE,
+                      user_agent TEXT NULL,
+                      created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                      last_used_at TIMESTAMP NULL,
+                      expires_at TIMESTAMP NOT NULL,
+                      revoked_at TIMESTAMP NULL,
+                      FOREIGN KEY(user_id) REFERENCES users(id)
+                    )
+                    """
+                )
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_device_tokens_user ON device_tokens (user_id)")
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS deliveries_archive (
+                      id INTEGER PRIMARY KEY,
+                      user_id INTEGER NOT NULL,
+                      address TEXT NULL,
+                      latitude REAL NULL,
+                      longitude REAL NULL,
+                      status TEXT NOT NULL,
+                      tracking_number TEXT NULL,
+                      amount_due INT NOT NULL DEFAULT 0,
+                      created_at TIMESTAMP NOT NULL,
+                      delivered_at TIMESTAMP NULL,
+                      deleted_at TIMESTAMP NULL,
+                      archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )
+                    """
+                )
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS email_outbox (
+                      id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      recipient TEXT NOT NULL,
+                      subject TEXT NOT NULL,
+                      body TEXT NOT NULL,
+                      status TEXT NOT NULL DEFAULT 'pending',
+                      attempts INT NOT NULL DEFAULT 0,
+                      next_attempt_at REAL NOT NULL DEFAULT 0,
+                      claim_token TEXT NULL,
+                      locked_until REAL NULL,
+                      last_error TEXT NULL,
+                      created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )
+                    """
+                )
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox (status, next_attempt_at)")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_email_outbox_claim ON email_outbox (claim_token)")
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS webhook_outbox (
+                      id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      endpoint TEXT NOT NULL,
+                      event_type TEXT NOT NULL,
+                      payload TEXT NOT NULL,
+                      status TEXT NOT NULL DEFAULT 'pending',
+                      attempts INT NOT NULL DEFAULT 0,
+                      next_attempt_at REAL NOT NULL DEFAULT 0,
+                      claim_token TEXT NULL,
+                      locked_until REAL NULL,
+                      last_error TEXT NULL,
+                      created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )
+                    """
+                )
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_webhook_outbox_due ON webhook_outbox (endpoint, status, next_attempt_at)")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_webhook_outbox_claim ON webhook_outbox (claim_token)")
+                create_delivery_indexes(cur, "sqlite")
                 conn.commit()
         except sqlite3.Error as exc:
             print(f"[INIT] Error initializing SQLite DB: {exc}")
@@ -412,9 +1360,107 @@ def initialize_database(app: Flask) -> None:
                     )
                     """
                 )
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS device_tokens (
+                      id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                      user_id INT NOT NULL,
+                      token_hash CHAR(64) NOT NULL UNIQUE,
+                      user_agent VARCHAR(255) NULL,
+                      created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                      last_used_at TIMESTAMP NULL,
+                      expires_at TIMESTAMP NOT NULL,
+                      revoked_at TIMESTAMP NULL,
+                      KEY idx_device_tokens_user (user_id),
+                      CONSTRAINT fk_device_tokens_user FOREIGN KEY (user_id) REFERENCES users(id)
+                    )
+                    """
+                )
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS deliveries_archive (
+                      id INT NOT NULL PRIMARY KEY,
+                      user_id INT NOT NULL,
+                      address VARCHAR(512) NULL,
+                      latitude DOUBLE NULL,
+                      longitude DOUBLE NULL,
+                      status VARCHAR(32) NOT NULL,
+                      tracking_number VARCHAR(64) NULL,
+                      amount_due INT NOT NULL DEFAULT 0,
+                      created_at TIMESTAMP NOT NULL,
+                      delivered_at TIMESTAMP NULL,
+                      deleted_at TIMESTAMP NULL,
+                      archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )
+                    """
+                )
+                create_delivery_indexes(cur, "mysql")
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS email_outbox (
+                      id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                      recipient VARCHAR(255) NOT NULL,
+                      subject VARCHAR(255) NOT NULL,
+                      body TEXT NOT NULL,
+                      status VARCHAR(16) NOT NULL DEFAULT 'pending',
+                      attempts INT NOT NULL DEFAULT 0,
+                      next_attempt_at DOUBLE NOT NULL DEFAULT 0,
+                      claim_token CHAR(32) NULL,
+                      locked_until DOUBLE NULL,
+                      last_error VARCHAR(1000) NULL,
+                      created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                      KEY idx_email_outbox_due (status, next_attempt_at),
+                      KEY idx_email_outbox_claim (claim_token)
+                    )
+                    """
+                )
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS webhook_outbox (
+                      id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                      endpoint VARCHAR(512) NOT NULL,
+                      event_type VARCHAR(64) NOT NULL,
+                      payload TEXT NOT NULL,
+                      status VARCHAR(16) NOT NULL DEFAULT 'pending',
+                      attempts INT NOT NULL DEFAULT 0,
+                      next_attempt_at DOUBLE NOT NULL DEFAULT 0,
+                      claim_token CHAR(32) NULL,
+                      locked_until DOUBLE NULL,
+                      last_error VARCHAR(1000) NULL,
+                      created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                      KEY idx_webhook_outbox_due (endpoint(191), status, next_attempt_at),
+                      KEY idx_webhook_outbox_claim (claim_token)
+                    )
+                    """
+                )
     except MySQLError as exc:
         print(f"[INIT] Error ensuring users table exists: {exc}")
 
+def fetch_user_by_id(app: Flask, user_id: int) -> Optional[dict]:
+    backend = app.config.get("DB_BACKEND", "mysql")
+    try:
+        if backend == "sqlite":
+            with get_db_connection(app) as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "SELECT id, email, full_name, password_hash FROM users WHERE id = ?",
+                    (user_id,),
+                )
+                row = cur.fetchone()
+                if not row:
+                    return None
+                return {k: row[k] for k in ["id", "email", "full_name", "password_hash"]}
+        with get_db_connection(app) as conn:
+            with conn.cursor(dictionary=True) as cur:
+                cur.execute(
+                    "SELECT id, email, full_name, password_hash FROM users WHERE id = %s",
+                    (user_id,),
+                )
+                return cur.fetchone()
+    except (MySQLError, sqlite3.Error) as exc:
+        print(f"[DB] Error fetching user by id: {exc}")
+        return None
+
 def fetch_user_by_email(app: Flask, email: str) -> Optional[dict]:
     backend = app.config.get("DB_BACKEND", "mysql")
     try:
@@ -445,7 +1491,7 @@ def fetch_user_by_email(app: Flask, email: str) -> Optional[dict]:
 def create_user(app: Flask, full_name: str, email: str, password: str) -> Tuple[bool, Optional[str]]:
     backend = app.config.get("DB_BACKEND", "mysql")
     try:
-        password_hash = generate_password_hash(password)
+        password_hash = get_password_hasher(app).hash(password)
         if backend == "sqlite":
             with get_db_connection(app) as conn:
                 cur = conn.cursor()
@@ -463,6 +1509,8 @@ def create_user(app: Flask, full_name: str, email: str, password: str) -> Tuple[
                     (email, full_name or None, password_hash),
                 )
         return True, None
+    except HashingBusyError:
+        return False, "The server is busy. Please try again in a moment."
     except (MySQLError, sqlite3.Error) as exc:
         return False, str(exc)
 
@@ -472,22 +1520,49 @@ def fetch_delivery_counts(app: Flask, user_id: int) -> dict:
         if backend == "sqlite":
             with get_db_connection(app) as conn:
                 cur = conn.cursor()
-                cur.execute("SELECT COUNT(*) FROM deliveries WHERE user_id = ? AND status = 'pending'", (user_id,))
+                cur.execute("SELECT COUNT(*) FROM deliveries WHERE user_id = ? AND status = 'pending' AND deleted_at IS NULL", (user_id,))
                 pending = cur.fetchone()[0]
-                cur.execute("SELECT COUNT(*) FROM deliveries WHERE user_id = ? AND status = 'delivered'", (user_id,))
+                cur.execute("SELECT COUNT(*) FROM deliveries WHERE user_id = ? AND status = 'delivered' AND deleted_at IS NULL", (user_id,))
                 delivered = cur.fetchone()[0]
                 return {"pending": pending, "delivered": delivered}
         with get_db_connection(app) as conn:
             with conn.cursor() as cur:
-                cur.execute("SELECT COUNT(*) FROM deliveries WHERE user_id = %s AND status = 'pending'", (user_id,))
+                cur.execute("SELECT COUNT(*) FROM deliveries WHERE user_id = %s AND status = 'pending' AND deleted_at IS NULL", (user_id,))
                 pending = cur.fetchone()[0]
-                cur.execute("SELECT COUNT(*) FROM deliveries WHERE user_id = %s AND status = 'delivered'", (user_id,))
+                cur.execute("SELECT COUNT(*) FROM deliveries WHERE user_id = %s AND status = 'delivered' AND deleted_at IS NULL", (user_id,))
                 delivered = cur.fetchone()[0]
                 return {"pending": pending, "delivered": delivered}
     except (MySQLError, sqlite3.Error) as exc:
         print(f"[DB] Error fetching delivery counts: {exc}")
         return {"pending": 0, "delivered": 0}
 
+def fetch_delivery(app: Flask, user_id: int, delivery_id: int) -> Optional[dict]:
+    """One of the user's deliveries as the row scripts patch: id, status and whether it is deleted."""
+    backend = app.config.get("DB_BACKEND", "mysql")
+    try:
+        if backend == "sqlite":
+            with get_db_connection(app) as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "SELECT id, status, deleted_at FROM deliveries WHERE id = ? AND user_id = ?",
+                    (delivery_id, user_id),
+                )
+                row = cur.fetchone()
+        else:
+            with get_db_connection(app) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT id, status, deleted_at FROM deliveries WHERE id = %s AND user_id = %s",
+                        (delivery_id, user_id),
+                    )
+                    row = cur.fetchone()
+    except (MySQLError, sqlite3.Error) as exc:
+        print(f"[DB] Error fetching delivery: {exc}")
+        return None
+    if not row:
+        return None
+    return {"id": row[0], "status": row[1], "deleted": row[2] is not None}
+
 def fetch_deliveries_for_map(app: Flask, user_id: int) -> list[dict]:
     backend = app.config.get("DB_BACKEND", "mysql")
     try:
@@ -589,6 +1664,13 @@ def fetch_deliveries_list(app: Flask, user_id: int) -> list[dict]:
         print(f"[DB] Error fetching deliveries list: {exc}")
         return []
 
+def get_event_broker(app: Flask) -> EventBroker:
+    return app.extensions["event_broker"]
+
+def publish_delivery_event(app: Flask, user_id: int, kind: str, delivery_id: int, **data) -> None:
+    """Tell the user's open /deliveries/stream connections that one delivery changed."""
+    get_event_broker(app).publish(user_id, {"type": kind, "delivery_id": delivery_id, **data})
+
 def add_delivery(app: Flask, user_id: int, tracking_number: str, amount_due: int) -> tuple[bool, str | None]:
     backend = app.config.get("DB_BACKEND", "mysql")
     try:
@@ -599,38 +1681,84 @@ def add_delivery(app: Flask, user_id: int, tracking_number: str, amount_due: int
                     "INSERT INTO deliveries (user_id, tracking_number, amount_due, status) VALUES (?, ?, ?, 'pending')",
                     (user_id, tracking_number, amount_due),
                 )
+                delivery_id = cur.lastrowid
                 conn.commit()
-            return True, None
-        with get_db_connection(app) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "INSERT INTO deliveries (user_id, tracking_number, amount_due, status) VALUES (%s, %s, %s, 'pending')",
-                    (user_id, tracking_number, amount_due),
-                )
+        else:
+            with get_db_connection(app) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "INSERT INTO deliveries (user_id, tracking_number, amount_due, status) VALUES (%s, %s, %s, 'pending')",
+                        (user_id, tracking_number, amount_due),
+                    )
+                    delivery_id = cur.lastrowid
+        publish_delivery_event(app, user_id, "added", delivery_id)
         return True, None
     except (MySQLError, sqlite3.Error) as exc:
         return False, str(exc)
 
+WEBHOOK_STATUS_EVENTS = {"delivered": "delivery.delivered", "not_located": "delivery.not_located"}
+
+def _webhook_rows(app: Flask, event_type: str, data: dict) -> list[tuple]:
+    """Outbox rows (endpoint, event_type, payload) fanning one event out to every configured endpoint."""
+    payload = json.dumps({
+        "id": secrets.token_hex(12),
+        "type": event_type,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "data": data,
+    })
+    return [(endpoint, event_type, payload) for endpoint in app.config.get("WEBHOOK_URLS", [])]
+
 def update_delivery_status(app: Flask, user_id: int, delivery_id: int, status: str) -> tuple[bool, str | None]:
     if status not in ("pending", "delivered", "not_located"):
         return False, "Invalid status"
     backend = app.config.get("DB_BACKEND", "mysql")
+    event_type = WEBHOOK_STATUS_EVENTS.get(status)
+    webhook_rows = []
+    if event_type:
+        webhook_rows = _webhook_rows(app, event_type, {"delivery_id": delivery_id, "user_id": user_id, "status": status})
     try:
         if backend == "sqlite":
             with get_db_connection(app) as conn:
                 cur = conn.cursor()
+                # Skip no-op updates so re-selecting the same status emits no event
                 cur.execute(
-                    "UPDATE deliveries SET status = ? WHERE id = ? AND user_id = ?",
-                    (status, delivery_id, user_id),
+                    "UPDATE deliveries SET status = ? WHERE id = ? AND user_id = ? AND status <> ?",
+                    (status, delivery_id, user_id, status),
                 )
+                changed = cur.rowcount == 1
+                if changed and webhook_rows:
+                    cur.executemany(
+                        "INSERT INTO webhook_outbox (endpoint, event_type, payload) VALUES (?, ?, ?)",
+                        webhook_rows,
+                    )
+                if not changed:
+                    cur.execute("SELECT 1 FROM deliveries WHERE id = ? AND user_id = ?", (delivery_id, user_id))
+                    found = cur.fetchone() is not None
                 conn.commit()
-            return True, None
-        with get_db_connection(app) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "UPDATE deliveries SET status = %s WHERE id = %s AND user_id = %s",
-                    (status, delivery_id, user_id),
-                )
+        else:
+            with get_db_connection(app) as conn:
+                conn.start_transaction()
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE deliveries SET status = %s WHERE id = %s AND user_id = %s AND status <> %s",
+                        (status, delivery_id, user_id, status),
+                    )
+                    changed = cur.rowcount == 1
+                    if changed and webhook_rows:
+                        cur.executemany(
+                            "INSERT INTO webhook_outbox (endpoint, event_type, payload) VALUES (%s, %s, %s)",
+                            webhook_rows,
+                        )
+                    if not changed:
+                        cur.execute("SELECT 1 FROM deliveries WHERE id = %s AND user_id = %s", (delivery_id, user_id))
+                        found = cur.fetchone() is not None
+                conn.commit()
+        if not changed:
+            # rowcount 0 is either a no-op (same status) or not this user's delivery
+            return (True, None) if found else (False, DELIVERY_NOT_FOUND)
+        publish_delivery_event(app, user_id, "status", delivery_id, status=status)
+        if webhook_rows:
+            get_webhook_dispatcher(app).wake()
         return True, None
     except (MySQLError, sqlite3.Error) as exc:
         return False, str(exc)
@@ -646,16 +1774,21 @@ def soft_delete_delivery(app: Flask, user_id: int, delivery_id: int) -> tuple[bo
                     "UPDATE deliveries SET deleted_at = ? WHERE id = ? AND user_id = ?",
                     (now, delivery_id, user_id),
                 )
+                changed = cur.rowcount == 1
                 conn.commit()
-            return True, None
-        with get_db_connection(app) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "UPDATE deliveries SET deleted_at = %s WHERE id = %s AND user_id = %s",
-                    (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), delivery_id, user_id),
-                )
-        return True, None
-    except (MySQLError, sqlite3.Error) as exc:
+        else:
+            with get_db_connection(app) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE deliveries SET deleted_at = %s WHERE id = %s AND user_id = %s",
+                        (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), delivery_id, user_id),
+                    )
+                    changed = cur.rowcount == 1
+        if not changed:
+            return False, DELIVERY_NOT_FOUND
+        publish_delivery_event(app, user_id, "deleted", delivery_id)
+        return True, None
+    except (MySQLError, sqlite3.Error) as exc:
         return False, str(exc)
 
 def undo_delete_delivery(app: Flask, user_id: int, delivery_id: int) -> tuple[bool, str | None]:
@@ -665,25 +1798,177 @@ def undo_delete_delivery(app: Flask, user_id: int, delivery_id: int) -> tuple[bo
             with get_db_connection(app) as conn:
                 cur = conn.cursor()
                 cur.execute(
-                    "UPDATE deliveries SET deleted_at = NULL WHERE id = ? AND user_id = ?",
+                    "UPDATE deliveries SET deleted_at = NULL WHERE id = ? AND user_id = ? AND deleted_at IS NOT NULL",
                     (delivery_id, user_id),
                 )
+                changed = cur.rowcount == 1
+                if not changed:
+                    cur.execute("SELECT 1 FROM deliveries WHERE id = ? AND user_id = ?", (delivery_id, user_id))
+                    found = cur.fetchone() is not None
                 conn.commit()
-            return True, None
-        with get_db_connection(app) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "UPDATE deliveries SET deleted_at = NULL WHERE id = %s AND user_id = %s",
-                    (delivery_id, user_id),
-                )
+        else:
+            with get_db_connection(app) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE deliveries SET deleted_at = NULL WHERE id = %s AND user_id = %s AND deleted_at IS NOT NULL",
+                        (delivery_id, user_id),
+                    )
+                    changed = cur.rowcount == 1
+                    if not changed:
+                        cur.execute("SELECT 1 FROM deliveries WHERE id = %s AND user_id = %s", (delivery_id, user_id))
+                        found = cur.fetchone() is not None
+        if not changed:
+            # rowcount 0 is either a row that was not deleted or not this user's delivery
+            return (True, None) if found else (False, DELIVERY_NOT_FOUND)
+        publish_delivery_event(app, user_id, "restored", delivery_id)
         return True, None
     except (MySQLError, sqlite3.Error) as exc:
         return False, str(exc)
 
+DELIVERY_BATCH_OPS = ("add", "status", "delete", "undo")
+
+def validate_delivery_operation(op: object, refs: set[str]) -> Tuple[Optional[dict], Optional[str]]:
+    """Normalise one batch operation; returns (operation, None) or (None, error).
+
+    Rows added earlier in the same batch can be targeted through their
+    client-chosen ``ref`` instead of an ``id``; ``refs`` collects those.
+    """
+    if not isinstance(op, dict) or op.get("op") not in DELIVERY_BATCH_OPS:
+        return None, f"op must be one of: {', '.join(DELIVERY_BATCH_OPS)}"
+    kind = op["op"]
+    ref = op.get("ref")
+    if ref is not None and not isinstance(ref, str):
+        return None, "ref must be a string"
+    if kind == "add":
+        tracking_number = str(op.get("tracking_number") or "").strip()
+        amount_due = op.get("amount_due")
+        if not tracking_number or isinstance(amount_due, bool) or not isinstance(amount_due, int) or amount_due < 0:
+            return None, "add needs a tracking_number and a non-negative integer amount_due"
+        if ref is not None:
+            if ref in refs:
+                return None, f"ref {ref!r} is used twice"
+            refs.add(ref)
+        return {"op": kind, "ref": ref, "tracking_number": tracking_number, "amount_due": amount_due}, None
+    delivery_id = op.get("id")
+    if ref is not None:
+        if ref not in refs:
+            return None, f"ref {ref!r} does not match an earlier add"
+    elif isinstance(delivery_id, bool) or not isinstance(delivery_id, int) or delivery_id <= 0:
+        return None, "id must be a positive integer (or ref an earlier add)"
+    normalized = {"op": kind, "ref": ref, "id": delivery_id}
+    if kind == "status":
+        if op.get("status") not in ("pending", "delivered", "not_located"):
+            return None, "Invalid status"
+        normalized["status"] = op["status"]
+    return normalized, None
+
+def apply_delivery_batch(app: Flask, user_id: int, operations: list) -> Tuple[bool, list[dict]]:
+    """Validate and apply delivery operations in order inside one transaction.
+
+    Nothing is written unless every operation validates and every targeted
+    delivery exists for ``user_id``; the per-operation errors come back
+    instead. On success each result carries the delivery id and whether the
+    row actually changed; a database error rolls everything back and returns
+    (False, []). Events and webhooks go out once the transaction has
+    committed, so a rolled-back batch never announces anything.
+    """
+    refs: set[str] = set()
+    validated = []
+    errors = []
+    for index, op in enumerate(operations):
+        normalized, error = validate_delivery_operation(op, refs)
+        if error:
+            errors.append({"index": index, "ok": False, "error": error})
+        validated.append(normalized)
+    if errors:
+        return False, errors
+
+    backend = app.config.get("DB_BACKEND", "mysql")
+    p = "?" if backend == "sqlite" else "%s"
+    if backend == "sqlite":
+        deleted_at = datetime.now(timezone.utc).isoformat()
+    else:
+        deleted_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # matches soft_delete_delivery
+    statements = {
+        "add": f"INSERT INTO deliveries (user_id, tracking_number, amount_due, status) VALUES ({p}, {p}, {p}, 'pending')",
+        "status": f"UPDATE deliveries SET status = {p} WHERE id = {p} AND user_id = {p} AND status <> {p}",
+        "delete": f"UPDATE deliveries SET deleted_at = {p} WHERE id = {p} AND user_id = {p} AND deleted_at IS NULL",
+        "undo": f"UPDATE deliveries SET deleted_at = NULL WHERE id = {p} AND user_id = {p} AND deleted_at IS NOT NULL",
+        "exists": f"SELECT 1 FROM deliveries WHERE id = {p} AND user_id = {p}",
+    }
+    event_kinds = {"add": "added", "status": "status", "delete": "deleted", "undo": "restored"}
+    results = []
+    events = []
+    webhook_rows = []
+    ref_ids: dict[str, int] = {}
+    missing = []
+    try:
+        with get_db_connection(app) as conn:
+            if backend != "sqlite":
+                conn.start_transaction()
+            cur = conn.cursor()
+            try:
+                for index, op in enumerate(validated):
+                    kind = op["op"]
+                    if kind == "add":
+                        cur.execute(statements["add"], (user_id, op["tracking_number"], op["amount_due"]))
+                        delivery_id = cur.lastrowid
+                        if op["ref"] is not None:
+                            ref_ids[op["ref"]] = delivery_id
+                    else:
+                        delivery_id = ref_ids[op["ref"]] if op["ref"] is not None else op["id"]
+                        if kind == "status":
+                            cur.execute(statements["status"], (op["status"], delivery_id, user_id, op["status"]))
+                        elif kind == "delete":
+                            cur.execute(statements["delete"], (deleted_at, delivery_id, user_id))
+                        else:
+                            cur.execute(statements["undo"], (delivery_id, user_id))
+                    changed = cur.rowcount == 1
+                    if not changed and kind != "add":
+                        # rowcount 0 is either a no-op or not this user's delivery
+                        cur.execute(statements["exists"], (delivery_id, user_id))
+                        if cur.fetchone() is None:
+                            missing.append({"index": index, "ok": False, "error": DELIVERY_NOT_FOUND})
+                            continue
+                    result = {"index": index, "ok": True, "id": delivery_id, "changed": changed}
+                    if op["ref"] is not None:
+                        result["ref"] = op["ref"]
+                    results.append(result)
+                    if not changed:
+                        continue
+                    data = {"status": op["status"]} if kind == "status" else {}
+                    events.append((user_id, {"type": event_kinds[kind], "delivery_id": delivery_id, **data}))
+                    event_type = WEBHOOK_STATUS_EVENTS.get(op.get("status"))
+                    if kind == "status" and event_type:
+                        webhook_rows.extend(
+                            _webhook_rows(app, event_type, {"delivery_id": delivery_id, "user_id": user_id, "status": op["status"]})
+                        )
+                if missing:
+                    conn.rollback()
+                    return False, missing
+                if webhook_rows:
+                    cur.executemany(
+                        f"INSERT INTO webhook_outbox (endpoint, event_type, payload) VALUES ({p}, {p}, {p})",
+                        webhook_rows,
+                    )
+                conn.commit()
+            except (MySQLError, sqlite3.Error):
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+    except (MySQLError, sqlite3.Error) as exc:
+        print(f"[DB] Delivery batch rolled back: {exc}")
+        return False, []
+    get_event_broker(app).publish_many(events)
+    if webhook_rows:
+        get_webhook_dispatcher(app).wake()
+    return True, results
+
 def update_user_password(app: Flask, user_id: int, new_password: str) -> Tuple[bool, Optional[str]]:
     backend = app.config.get("DB_BACKEND", "mysql")
     try:
-        password_hash = generate_password_hash(new_password)
+        password_hash = get_password_hasher(app).hash(new_password)
         if backend == "sqlite":
             with get_db_connection(app) as conn:
                 cur = conn.cursor()
@@ -700,12 +1985,74 @@ def update_user_password(app: Flask, user_id: int, new_password: str) -> Tuple[b
                     (password_hash, user_id),
                 )
         return True, None
+    except HashingBusyError:
+        return False, "The server is busy. Please try again in a moment."
     except (MySQLError, sqlite3.Error) as exc:
         return False, str(exc)
 
-def create_password_reset_token(app: Flask, user_id: int) -> Tuple[str, datetime]:
+def rehash_password_if_needed(app: Flask, user: dict, password: str) -> None:
+    """After a successful login, re-store the hash if it predates the current hash policy."""
+    if not get_password_hasher(app).needs_rehash(user["password_hash"]):
+        return
+    ok, msg = update_user_password(app, user["id"], password)
+    if not ok:
+        print(f"[HASH] Could not rehash password for user {user['id']}: {msg}")
+
+DEFAULT_PUBLIC_BASE_URL = "http://localhost:5000"
+
+def public_base_url(app: Flask) -> str:
+    """The site's configured origin: PUBLIC_BASE_URL, else SERVER_NAME with PREFERRED_URL_SCHEME; "" if neither is set."""
+    if app.config.get("PUBLIC_BASE_URL"):
+        return app.config["PUBLIC_BASE_URL"]
+    if app.config.get("SERVER_NAME"):
+        root = (app.config.get("APPLICATION_ROOT") or "/").rstrip("/")
+        return f"{app.config['PREFERRED_URL_SCHEME']}://{app.config['SERVER_NAME']}{root}"
+    return ""
+
+def external_url(app: Flask, endpoint: str, **values) -> str:
+    """Absolute URL for links sent out of band, such as emails.
+
+    Built from configuration only, never from the Host header of the request
+    that triggered it: otherwise anyone could have a genuine reset email
+    link to a host of their choosing and collect the token.
+    """
+    with app.test_request_context(base_url=public_base_url(app) or DEFAULT_PUBLIC_BASE_URL):
+        return url_for(endpoint, _external=True, **values)
+
+def send_password_reset(app: Flask, email: str) -> None:
+    """Background job: issue a reset token for ``email`` (if it exists) and queue the email."""
+    user = fetch_user_by_email(app, email)
+    if not user:
+        return
+
+    def reset_email(token: str, expires_at: datetime) -> dict:
+        reset_url = external_url(app, "reset_password", token=token)
+        body = (
+            "Someone asked to reset the password for your account.\n\n"
+            f"Open this link to choose a new password: {reset_url}\n\n"
+            f"The link expires at {expires_at.strftime('%Y-%m-%d %H:%M UTC')}. "
+            "If you did not ask for this, you can ignore this email."
+        )
+        return {"recipient": email, "subject": "Reset your password", "body": body}
+
+    if app.config["RESET_TOKEN_MODE"] == "signed":
+        token, expires_at = create_signed_reset_token(app, user)
+        queue_email(app, **reset_email(token, expires_at))
+    else:
+        create_password_reset_token(app, user["id"], outbox_email=reset_email)
+    get_outbox_sender(app).wake()
+
+def create_password_reset_token(
+    app: Flask, user_id: int, outbox_email: Optional[Callable[[str, datetime], dict]] = None
+) -> Tuple[str, datetime]:
+    """Store a new reset token.
+
+    ``outbox_email``, when given, is called with the token and expiry and the
+    message it returns is queued in the same transaction as the token row.
+    """
     token = secrets.token_urlsafe(32)
-    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    expires_at = datetime.now(timezone.utc) + PASSWORD_RESET_TTL
+    message = outbox_email(token, expires_at) if outbox_email else None
     backend = app.config.get("DB_BACKEND", "mysql")
     if backend == "sqlite":
         with get_db_connection(app) as conn:
@@ -714,16 +2061,236 @@ def create_password_reset_token(app: Flask, user_id: int) -> Tuple[str, datetime
                 "INSERT INTO password_resets (user_id, token, expires_at) VALUES (?, ?, ?)",
                 (user_id, token, expires_at.isoformat()),
             )
+            if message:
+                cur.execute(
+                    "INSERT INTO email_outbox (recipient, subject, body) VALUES (?, ?, ?)",
+                    (message["recipient"], message["subject"], message["body"]),
+                )
             conn.commit()
         return token, expires_at
     with get_db_connection(app) as conn:
+        conn.start_transaction()
         with conn.cursor() as cur:
             cur.execute(
                 "INSERT INTO password_resets (user_id, token, expires_at) VALUES (%s, %s, %s)",
                 (user_id, token, expires_at.strftime("%Y-%m-%d %H:%M:%S")),
             )
+            if message:
+                cur.execute(
+                    "INSERT INTO email_outbox (recipient, subject, body) VALUES (%s, %s, %s)",
+                    (message["recipient"], message["subject"], message["body"]),
+                )
+        conn.commit()
     return token, expires_at
 
+def get_webhook_dispatcher(app: Flask) -> WebhookDispatcher:
+    return app.extensions["webhook_dispatcher"]
+
+def claim_webhook_batch(app: Flask, endpoint: str, batch_size: int, lease_seconds: float = 120.0) -> list[dict]:
+    """Lease up to ``batch_size`` due events for one endpoint, oldest first (see claim_outbox_batch).
+
+    The endpoint is repeated in both branches so each can search
+    idx_webhook_outbox_due instead of walking every row for the endpoint.
+    """
+    backend = app.config.get("DB_BACKEND", "mysql")
+    claim_token = secrets.token_hex(16)
+    now = time.time()
+    if backend == "sqlite":
+        with get_db_connection(app) as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "UPDATE webhook_outbox SET status = 'sending', claim_token = ?, locked_until = ? WHERE id IN ("
+                "SELECT id FROM webhook_outbox WHERE (endpoint = ? AND status = 'pending' AND next_attempt_at <= ?) OR (endpoint = ? AND status = 'sending' AND locked_until < ?) ORDER BY id LIMIT ?)",
+                (claim_token, now + lease_seconds, endpoint, now, endpoint, now, batch_size),
+            )
+            conn.commit()
+            cur.execute(
+                "SELECT id, payload, attempts FROM webhook_outbox WHERE claim_token = ? ORDER BY id",
+                (claim_token,),
+            )
+            return [{k: r[k] for k in ["id", "payload", "attempts"]} for r in cur.fetchall()]
+    with get_db_connection(app) as conn:
+        with conn.cursor(dictionary=True) as cur:
+            cur.execute(
+                "UPDATE webhook_outbox SET status = 'sending', claim_token = %s, locked_until = %s "
+                "WHERE (endpoint = %s AND status = 'pending' AND next_attempt_at <= %s) OR (endpoint = %s AND status = 'sending' AND locked_until < %s) ORDER BY id LIMIT %s",
+                (claim_token, now + lease_seconds, endpoint, now, endpoint, now, batch_size),
+            )
+            cur.execute(
+                "SELECT id, payload, attempts FROM webhook_outbox WHERE claim_token = %s ORDER BY id",
+                (claim_token,),
+            )
+            return cur.fetchall()
+
+def mark_webhooks_delivered(app: Flask, ids: list[int]) -> None:
+    backend = app.config.get("DB_BACKEND", "mysql")
+    if backend == "sqlite":
+        placeholders = ", ".join("?" for _ in ids)
+        with get_db_connection(app) as conn:
+            cur = conn.cursor()
+            cur.execute(f"DELETE FROM webhook_outbox WHERE id IN ({placeholders})", ids)
+            conn.commit()
+        return
+    placeholders = ", ".join("%s" for _ in ids)
+    with get_db_connection(app) as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DELETE FROM webhook_outbox WHERE id IN ({placeholders})", ids)
+
+def mark_webhooks_failed(app: Flask, rows: list[dict], error: str) -> None:
+    """Reschedule a failed batch with exponential backoff (5s doubling, capped at one hour)."""
+    attempts = max(row["attempts"] for row in rows) + 1
+    give_up = attempts >= app.config.get("WEBHOOK_MAX_ATTEMPTS", 12)
+    status = "failed" if give_up else "pending"
+    next_attempt_at = time.time() + min(3600, 5 * 2 ** (attempts - 1))
+    ids = [row["id"] for row in rows]
+    if give_up:
+        print(f"[WEBHOOK] Giving up on {len(ids)} event(s): {error}")
+    backend = app.config.get("DB_BACKEND", "mysql")
+    if backend == "sqlite":
+        placeholders = ", ".join("?" for _ in ids)
+        with get_db_connection(app) as conn:
+            cur = conn.cursor()
+            cur.execute(
+                f"UPDATE webhook_outbox SET status = ?, attempts = ?, next_attempt_at = ?, claim_token = NULL, locked_until = NULL, last_error = ? WHERE id IN ({placeholders})",
+                (status, attempts, next_attempt_at, error[:1000], *ids),
+            )
+            conn.commit()
+        return
+    placeholders = ", ".join("%s" for _ in ids)
+    with get_db_connection(app) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"UPDATE webhook_outbox SET status = %s, attempts = %s, next_attempt_at = %s, claim_token = NULL, locked_until = NULL, last_error = %s WHERE id IN ({placeholders})",
+                (status, attempts, next_attempt_at, error[:1000], *ids),
+            )
+
+def get_outbox_sender(app: Flask) -> OutboxSender:
+    return app.extensions["outbox_sender"]
+
+def queue_email(app: Flask, recipient: str, subject: str, body: str) -> None:
+    backend = app.config.get("DB_BACKEND", "mysql")
+    if backend == "sqlite":
+        with get_db_connection(app) as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO email_outbox (recipient, subject, body) VALUES (?, ?, ?)",
+                (recipient, subject, body),
+            )
+            conn.commit()
+        return
+    with get_db_connection(app) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO email_outbox (recipient, subject, body) VALUES (%s, %s, %s)",
+                (recipient, subject, body),
+            )
+
+def claim_outbox_batch(app: Flask, batch_size: int, lease_seconds: float = 120.0) -> list[dict]:
+    """Lease up to ``batch_size`` due emails to this sender.
+
+    Rows are tagged with a random claim token so concurrent senders in other
+    workers never pick the same message; a sender that dies mid-batch loses
+    its lease and the rows become due again.
+    """
+    backend = app.config.get("DB_BACKEND", "mysql")
+    claim_token = secrets.token_hex(16)
+    now = time.time()
+    if backend == "sqlite":
+        with get_db_connection(app) as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "UPDATE email_outbox SET status = 'sending', claim_token = ?, locked_until = ? WHERE id IN ("
+                "SELECT id FROM email_outbox WHERE (status = 'pending' AND next_attempt_at <= ?) OR (status = 'sending' AND locked_until < ?) ORDER BY id LIMIT ?)",
+                (claim_token, now + lease_seconds, now, now, batch_size),
+            )
+            conn.commit()
+            cur.execute(
+                "SELECT id, recipient, subject, body, attempts FROM email_outbox WHERE claim_token = ? ORDER BY id",
+                (claim_token,),
+            )
+            return [{k: r[k] for k in ["id", "recipient", "subject", "body", "attempts"]} for r in cur.fetchall()]
+    with get_db_connection(app) as conn:
+        with conn.cursor(dictionary=True) as cur:
+            cur.execute(
+                "UPDATE email_outbox SET status = 'sending', claim_token = %s, locked_until = %s "
+                "WHERE (status = 'pending' AND next_attempt_at <= %s) OR (status = 'sending' AND locked_until < %s) ORDER BY id LIMIT %s",
+                (claim_token, now + lease_seconds, now, now, batch_size),
+            )
+            cur.execute(
+                "SELECT id, recipient, subject, body, attempts FROM email_outbox WHERE claim_token = %s ORDER BY id",
+                (claim_token,),
+            )
+            return cur.fetchall()
+
+def mark_outbox_sent(app: Flask, ids: list[int]) -> None:
+    """Delivered messages are deleted so the outbox only ever holds pending work."""
+    backend = app.config.get("DB_BACKEND", "mysql")
+    if backend == "sqlite":
+        placeholders = ", ".join("?" for _ in ids)
+        with get_db_connection(app) as conn:
+            cur = conn.cursor()
+            cur.execute(f"DELETE FROM email_outbox WHERE id IN ({placeholders})", ids)
+            conn.commit()
+        return
+    placeholders = ", ".join("%s" for _ in ids)
+    with get_db_connection(app) as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DELETE FROM email_outbox WHERE id IN ({placeholders})", ids)
+
+def mark_outbox_failed(app: Flask, row: dict, error: str) -> None:
+    attempts = row["attempts"] + 1
+    give_up = attempts >= app.config.get("OUTBOX_MAX_ATTEMPTS", 8)
+    status = "failed" if give_up else "pending"
+    next_attempt_at = time.time() + min(3600, 30 * 2 ** (attempts - 1))
+    backend = app.config.get("DB_BACKEND", "mysql")
+    if give_up:
+        print(f"[MAIL] Giving up on email {row['id']} to {row['recipient']}: {error}")
+    if backend == "sqlite":
+        with get_db_connection(app) as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "UPDATE email_outbox SET status = ?, attempts = ?, next_attempt_at = ?, claim_token = NULL, locked_until = NULL, last_error = ? WHERE id = ?",
+                (status, attempts, next_attempt_at, error[:1000], row["id"]),
+            )
+            conn.commit()
+        return
+    with get_db_connection(app) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE email_outbox SET status = %s, attempts = %s, next_attempt_at = %s, claim_token = NULL, locked_until = NULL, last_error = %s WHERE id = %s",
+                (status, attempts, next_attempt_at, error[:1000], row["id"]),
+            )
+
+def _reset_token_serializer(app: Flask) -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(app.secret_key, salt="password-reset")
+
+def _password_fingerprint(password_hash: str) -> str:
+    return hashlib.sha256(password_hash.encode("utf-8")).hexdigest()[:16]
+
+def is_signed_reset_token(token: str) -> bool:
+    # Database tokens come from token_urlsafe() and never contain the "." separator.
+    return "." in token
+
+def create_signed_reset_token(app: Flask, user: dict) -> Tuple[str, datetime]:
+    """Issue a stateless reset token bound to the user's current password hash.
+
+    Nothing is written to the database; changing the password changes the
+    fingerprint and so invalidates every outstanding token for that user.
+    """
+    token = _reset_token_serializer(app).dumps({"uid": user["id"], "ph": _password_fingerprint(user["password_hash"])})
+    return token, datetime.now(timezone.utc) + PASSWORD_RESET_TTL
+
+def verify_signed_reset_token(app: Flask, token: str) -> Optional[dict]:
+    """Return the user a signed reset token belongs to, or None if it is invalid, expired or spent."""
+    try:
+        data = _reset_token_serializer(app).loads(token, max_age=int(PASSWORD_RESET_TTL.total_seconds()))
+    except BadSignature:
+        return None
+    user = fetch_user_by_id(app, data.get("uid"))
+    if not user or not secrets.compare_digest(_password_fingerprint(user["password_hash"]), str(data.get("ph", ""))):
+        return None
+    return user
+
 def fetch_password_reset_by_token(app: Flask, token: str) -> Optional[dict]:
     backend = app.config.get("DB_BACKEND", "mysql")
     try:
@@ -778,6 +2345,580 @@ def mark_password_reset_used(app: Flask, token: str) -> None:
                 (used_at_str.strftime("%Y-%m-%d %H:%M:%S"), token),
             )
 
+def _device_token_digest(token: str) -> str:
+    # Tokens carry 256 bits of randomness, so a fast digest is enough; no slow hash needed.
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def set_remember_cookie(app: Flask, response, token: str, expires_at: datetime) -> None:
+    response.set_cookie(
+        app.config["REMEMBER_COOKIE_NAME"],
+        token,
+        expires=expires_at,
+        httponly=True,
+        secure=request.is_secure,
+        samesite="Lax",
+    )
+
+def create_device_token(app: Flask, user_id: int, user_agent: str = "") -> Tuple[str, datetime]:
+    token = secrets.token_urlsafe(32)
+    expires_at = datetime.now(timezone.utc) + timedelta(days=app.config.get("REMEMBER_ME_DAYS", 30))
+    backend = app.config.get("DB_BACKEND", "mysql")
+    if backend == "sqlite":
+        with get_db_connection(app) as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO device_tokens (user_id, token_hash, user_agent, expires_at) VALUES (?, ?, ?, ?)",
+                (user_id, _device_token_digest(token), (user_agent or "")[:255], expires_at.isoformat()),
+            )
+            conn.commit()
+        return token, expires_at
+    with get_db_connection(app) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO device_tokens (user_id, token_hash, user_agent, expires_at) VALUES (%s, %s, %s, %s)",
+                (user_id, _device_token_digest(token), (user_agent or "")[:255], expires_at.strftime("%Y-%m-%d %H:%M:%S")),
+            )
+    return token, expires_at
+
+def fetch_device_token(app: Flask, token: str) -> Optional[dict]:
+    """Look up a remember-me token (and its user) by digest in a single indexed query."""
+    backend = app.config.get("DB_BACKEND", "mysql")
+    try:
+        if backend == "sqlite":
+            with get_db_connection(app) as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "SELECT t.id, t.user_id, t.expires_at, t.revoked_at, u.email, u.full_name FROM device_tokens t JOIN users u ON u.id = t.user_id WHERE t.token_hash = ?",
+                    (_device_token_digest(token),),
+                )
+                row = cur.fetchone()
+                if not row:
+                    return None
+                result = {k: row[k] for k in ["id", "user_id", "expires_at", "revoked_at", "email", "full_name"]}
+                result["expires_at"] = _parse_sqlite_timestamp(result["expires_at"])  # type: ignore
+                return result
+        with get_db_connection(app) as conn:
+            with conn.cursor(dictionary=True) as cur:
+                cur.execute(
+                    "SELECT t.id, t.user_id, t.expires_at, t.revoked_at, u.email, u.full_name FROM device_tokens t JOIN users u ON u.id = t.user_id WHERE t.token_hash = %s",
+                    (_device_token_digest(token),),
+                )
+                row = cur.fetchone()
+                if not row:
+                    return None
+                row["expires_at"] = row["expires_at"].replace(tzinfo=timezone.utc)
+                return row
+    except (MySQLError, sqlite3.Error) as exc:
+        print(f"[DB] Error fetching device token: {exc}")
+        return None
+
+def rotate_device_token(app: Flask, token_id: int, user_id: int, user_agent: str = "") -> Optional[Tuple[str, datetime]]:
+    """Retire a used device token and issue its replacement in one transaction.
+
+    The old token is not revoked outright: it expires after
+    REMEMBER_ROTATION_GRACE_SECONDS, so parallel tabs or the SSE stream that
+    were sent with it are not logged out. Only the first use rotates
+    (``last_used_at`` marks a retired token); later ones return None.
+    """
+    token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(days=app.config.get("REMEMBER_ME_DAYS", 30))
+    retired_at = now + timedelta(seconds=app.config.get("REMEMBER_ROTATION_GRACE_SECONDS", 60))
+    backend = app.config.get("DB_BACKEND", "mysql")
+    try:
+        if backend == "sqlite":
+            with get_db_connection(app) as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "UPDATE device_tokens SET expires_at = ?, last_used_at = ? WHERE id = ? AND revoked_at IS NULL AND last_used_at IS NULL",
+                    (retired_at.isoformat(), now.isoformat(), token_id),
+                )
+                if cur.rowcount != 1:
+                    conn.rollback()
+                    return None
+                cur.execute(
+                    "INSERT INTO device_tokens (user_id, token_hash, user_agent, expires_at) VALUES (?, ?, ?, ?)",
+                    (user_id, _device_token_digest(token), (user_agent or "")[:255], expires_at.isoformat()),
+                )
+                conn.commit()
+            return token, expires_at
+        with get_db_connection(app) as conn:
+            conn.start_transaction()
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE device_tokens SET expires_at = %s, last_used_at = %s WHERE id = %s AND revoked_at IS NULL AND last_used_at IS NULL",
+                    (retired_at.strftime("%Y-%m-%d %H:%M:%S"), now.strftime("%Y-%m-%d %H:%M:%S"), token_id),
+                )
+                if cur.rowcount != 1:
+                    conn.rollback()
+                    return None
+                cur.execute(
+                    "INSERT INTO device_tokens (user_id, token_hash, user_agent, expires_at) VALUES (%s, %s, %s, %s)",
+                    (user_id, _device_token_digest(token), (user_agent or "")[:255], expires_at.strftime("%Y-%m-%d %H:%M:%S")),
+                )
+            conn.commit()
+        return token, expires_at
+    except (MySQLError, sqlite3.Error) as exc:
+        print(f"[DB] Error rotating device token: {exc}")
+        return None
+
+def revoke_device_token(app: Flask, token: str) -> None:
+    backend = app.config.get("DB_BACKEND", "mysql")
+    now = datetime.now(timezone.utc)
+    try:
+        if backend == "sqlite":
+            with get_db_connection(app) as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "UPDATE device_tokens SET revoked_at = ? WHERE token_hash = ? AND revoked_at IS NULL",
+                    (now.isoformat(), _device_token_digest(token)),
+                )
+                conn.commit()
+            return
+        with get_db_connection(app) as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE device_tokens SET revoked_at = %s WHERE token_hash = %s AND revoked_at IS NULL",
+                    (now.strftime("%Y-%m-%d %H:%M:%S"), _device_token_digest(token)),
+                )
+    except (MySQLError, sqlite3.Error) as exc:
+        print(f"[DB] Error revoking device token: {exc}")
+
+def revoke_all_device_tokens(app: Flask, user_id: int) -> None:
+    """Sign every remembered device out, e.g. after a password reset."""
+    backend = app.config.get("DB_BACKEND", "mysql")
+    now = datetime.now(timezone.utc)
+    try:
+        if backend == "sqlite":
+            with get_db_connection(app) as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "UPDATE device_tokens SET revoked_at = ? WHERE user_id = ? AND revoked_at IS NULL",
+                    (now.isoformat(), user_id),
+                )
+                conn.commit()
+            return
+        with get_db_connection(app) as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE device_tokens SET revoked_at = %s WHERE user_id = %s AND revoked_at IS NULL",
+                    (now.strftime("%Y-%m-%d %H:%M:%S"), user_id),
+                )
+    except (MySQLError, sqlite3.Error) as exc:
+        print(f"[DB] Error revoking device tokens: {exc}")
+
+ARCHIVED_DELIVERY_COLUMNS = "id, user_id, address, latitude, longitude, status, tracking_number, amount_due, created_at, delivered_at, deleted_at"
+
+def purge_password_resets(app: Flask, batch_size: int = 500) -> int:
+    """Delete used or expired reset tokens in batches; returns the number removed."""
+    backend = app.config.get("DB_BACKEND", "mysql")
+    now = datetime.now(timezone.utc)
+    removed = 0
+    while True:
+        if backend == "sqlite":
+            with get_db_connection(app) as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "DELETE FROM password_resets WHERE id IN (SELECT id FROM password_resets WHERE used_at IS NOT NULL OR expires_at < ? LIMIT ?)",
+                    (now.isoformat(), batch_size),
+                )
+                count = cur.rowcount
+                conn.commit()
+        else:
+            with get_db_connection(app) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "DELETE FROM password_resets WHERE used_at IS NOT NULL OR expires_at < %s LIMIT %s",
+                        (now.strftime("%Y-%m-%d %H:%M:%S"), batch_size),
+                    )
+                    count = cur.rowcount
+        removed += count
+        if count < batch_size:
+            return removed
+
+def purge_device_tokens(app: Flask, batch_size: int = 500) -> int:
+    """Delete revoked or expired remember-me tokens in batches."""
+    backend = app.config.get("DB_BACKEND", "mysql")
+    now = datetime.now(timezone.utc)
+    removed = 0
+    while True:
+        if backend == "sqlite":
+            with get_db_connection(app) as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "DELETE FROM device_tokens WHERE id IN (SELECT id FROM device_tokens WHERE revoked_at IS NOT NULL OR expires_at < ? LIMIT ?)",
+                    (now.isoformat(), batch_size),
+                )
+                count = cur.rowcount
+                conn.commit()
+        else:
+            with get_db_connection(app) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "DELETE FROM device_tokens WHERE revoked_at IS NOT NULL OR expires_at < %s LIMIT %s",
+                        (now.strftime("%Y-%m-%d %H:%M:%S"), batch_size),
+                    )
+                    count = cur.rowcount
+        removed += count
+        if count < batch_size:
+            return removed
+
+def purge_failed_outbox(app: Flask, table: str, older_than: timedelta, batch_size: int = 500) -> int:
+    """Delete rows of ``table`` (email_outbox or webhook_outbox) that gave up longer ago than ``older_than``.
+
+    A row that gives up keeps its last ``next_attempt_at``, which is when the
+    final attempt failed (plus at most an hour of backoff).
+    """
+    if table not in ("email_outbox", "webhook_outbox"):
+        raise ValueError(f"Not an outbox table: {table}")
+    backend = app.config.get("DB_BACKEND", "mysql")
+    cutoff = time.time() - older_than.total_seconds()
+    removed = 0
+    while True:
+        if backend == "sqlite":
+            with get_db_connection(app) as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE status = 'failed' AND next_attempt_at < ? LIMIT ?)",
+                    (cutoff, batch_size),
+                )
+                count = cur.rowcount
+                conn.commit()
+        else:
+            with get_db_connection(app) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        f"DELETE FROM {table} WHERE status = 'failed' AND next_attempt_at < %s LIMIT %s",
+                        (cutoff, batch_size),
+                    )
+                    count = cur.rowcount
+        removed += count
+        if count < batch_size:
+            return removed
+
+def archive_deleted_deliveries(app: Flask, undo_window: timedelta, batch_size: int = 500) -> int:
+    """Move deliveries soft-deleted before the undo window into deliveries_archive.
+
+    Each batch is copied and removed in its own transaction, so locks stay
+    short and an interrupted run simply resumes on the next call.
+    """
+    backend = app.config.get("DB_BACKEND", "mysql")
+    moved = 0
+    while True:
+        if backend == "sqlite":
+            cutoff = (datetime.now(timezone.utc) - undo_window).isoformat()
+            with get_db_connection(app) as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "SELECT id FROM deliveries WHERE deleted_at IS NOT NULL AND deleted_at < ? ORDER BY deleted_at LIMIT ?",
+                    (cutoff, batch_size),
+                )
+                ids = [r[0] for r in cur.fetchall()]
+                if ids:
+                    placeholders = ", ".join("?" for _ in ids)
+                    cur.execute(
+                        f"INSERT OR REPLACE INTO deliveries_archive ({ARCHIVED_DELIVERY_COLUMNS}) SELECT {ARCHIVED_DELIVERY_COLUMNS} FROM deliveries WHERE id IN ({placeholders})",
+                        ids,
+                    )
+                    cur.execute(f"DELETE FROM deliveries WHERE id IN ({placeholders})", ids)
+                conn.commit()
+        else:
+            # soft_delete_delivery stores MySQL deleted_at in server-local time
+            cutoff = (datetime.now() - undo_window).strftime("%Y-%m-%d %H:%M:%S")
+            with get_db_connection(app) as conn:
+                conn.start_transaction()
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT id FROM deliveries WHERE deleted_at IS NOT NULL AND deleted_at < %s ORDER BY deleted_at LIMIT %s",
+                        (cutoff, batch_size),
+                    )
+                    ids = [r[0] for r in cur.fetchall()]
+                    if ids:
+                        placeholders = ", ".join("%s" for _ in ids)
+                        cur.execute(
+                            f"REPLACE INTO deliveries_archive ({ARCHIVED_DELIVERY_COLUMNS}) SELECT {ARCHIVED_DELIVERY_COLUMNS} FROM deliveries WHERE id IN ({placeholders})",
+                            ids,
+                        )
+                        cur.execute(f"DELETE FROM deliveries WHERE id IN ({placeholders})", ids)
+                conn.commit()
+        moved += len(ids)
+        if len(ids) < batch_size:
+            return moved
+
+def optimize_database(app: Flask, full_vacuum: bool = False) -> str:
+    """Reclaim free pages and refresh planner statistics for the configured backend."""
+    backend = app.config.get("DB_BACKEND", "mysql")
+    if backend == "sqlite":
+        with get_db_connection(app) as conn:
+            cur = conn.cursor()
+            if full_vacuum:
+                # auto_vacuum only changes on an empty database or via a full VACUUM
+                cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.commit()
+                cur.execute("VACUUM")
+            mode = cur.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if mode == 2:
+                cur.execute("PRAGMA incremental_vacuum(1000)")
+                cur.fetchall()
+            cur.execute("ANALYZE")
+            cur.execute("PRAGMA optimize")
+            conn.commit()
+        return "incremental_vacuum+analyze" if mode == 2 else "analyze (run with --full-vacuum to enable incremental vacuum)"
+    with get_db_connection(app) as conn:
+        with conn.cursor() as cur:
+            cur.execute("OPTIMIZE TABLE deliveries, deliveries_archive, password_resets, device_tokens")
+            cur.fetchall()
+    return "optimize"
+
+def run_maintenance(
+    app: Flask,
+    undo_window_hours: Optional[float] = None,
+    batch_size: Optional[int] = None,
+    optimize: bool = True,
+    full_vacuum: bool = False,
+) -> dict:
+    if undo_window_hours is None:
+        undo_window_hours = app.config.get("MAINTENANCE_UNDO_WINDOW_HOURS", 72)
+    batch_size = batch_size or app.config.get("MAINTENANCE_BATCH_SIZE", 500)
+    retention = timedelta(days=app.config.get("MAINTENANCE_FAILED_RETENTION_DAYS", 14))
+    result = {
+        "password_resets_purged": purge_password_resets(app, batch_size),
+        "device_tokens_purged": purge_device_tokens(app, batch_size),
+        "deliveries_archived": archive_deleted_deliveries(app, timedelta(hours=undo_window_hours), batch_size),
+        "failed_emails_purged": purge_failed_outbox(app, "email_outbox", retention, batch_size),
+        "failed_webhooks_purged": purge_failed_outbox(app, "webhook_outbox", retention, batch_size),
+        "failed_jobs_purged": get_job_queue(app).purge_failed(retention.total_seconds()),
+        "slow_query_log_rotated": app.extensions["slow_query_log"].rotate(int(app.config.get("SLOW_QUERY_LOG_MAX_MB", 10) * 1024 * 1024)),
+    }
+    limiter = app.extensions.get("rate_limiter")
+    if isinstance(limiter, SQLiteTokenBucketLimiter):
+        # In-memory buckets are bounded per shard; the shared table only grows until purged.
+        result["rate_buckets_purged"] = limiter.purge()
+    if optimize:
+        result["optimize"] = optimize_database(app, full_vacuum=full_vacuum)
+    return result
+
+def start_maintenance_scheduler(app: Flask) -> None:
+    """Run maintenance every MAINTENANCE_INTERVAL_MINUTES on the host, from a daemon thread per process.
+
+    Safe to call on every request; a thread is started once per process
+    (forked workers get their own). Every thread wakes once per interval, but
+    under an exclusive lock on ``instance/maintenance.lock`` it reads when the
+    last pass ran, so only the first worker to wake after the interval runs
+    one and the others skip.
+    """
+    state = app.extensions.setdefault("maintenance", {"pid": None, "lock": threading.Lock()})
+    if state["pid"] == os.getpid():
+        return
+    with state["lock"]:
+        if state["pid"] == os.getpid():
+            return
+        state["pid"] = os.getpid()
+    interval = app.config["MAINTENANCE_INTERVAL_MINUTES"] * 60
+    lock_path = os.path.join(app.instance_path, "maintenance.lock")
+
+    def loop() -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                # "a+" so opening does not wipe the last-run time another worker wrote.
+                with open(lock_path, "a+") as lock_file:
+                    if fcntl is not None:
+                        try:
+                            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        except OSError:
+                            continue  # another worker is running this pass
+                    lock_file.seek(0)
+                    try:
+                        last_run = float(lock_file.read().strip() or 0)
+                    except ValueError:
+                        last_run = 0.0
+                    # Slack for timer drift, so the worker that ran last time is not skipped by a hair.
+                    if time.time() - last_run < interval * 0.9:
+                        continue  # a sibling worker already ran this interval's pass
+                    result = run_maintenance(app)
+                    lock_file.seek(0)
+                    lock_file.truncate()
+                    lock_file.write(str(time.time()))
+                print(f"[MAINTENANCE] {result}")
+            except (MySQLError, sqlite3.Error, OSError) as exc:
+                print(f"[MAINTENANCE] Error during maintenance: {exc}")
+
+    threading.Thread(target=loop, name="maintenance", daemon=True).start()
+
+# Secondary indexes on deliveries as (name, columns, SQLite-only partial condition).
+# Listed once so the bulk loader can drop them for a load and rebuild them afterwards.
+DELIVERY_INDEXES = [
+    # fetch_deliveries_list: user_id = ? AND deleted_at IS NULL ORDER BY created_at, no sort step
+    ("idx_deliveries_user_active", "user_id, deleted_at, created_at", None),
+    # fetch_delivery_counts: answered from the index alone
+    ("idx_deliveries_user_status", "user_id, status, deleted_at", None),
+    # Only soft-deleted rows are indexed on SQLite, so the archive scan stays cheap
+    ("idx_deliveries_deleted_at", "deleted_at", "deleted_at IS NOT NULL"),
+]
+
+def create_delivery_indexes(cur, backend: str) -> None:
+    for name, columns, condition in DELIVERY_INDEXES:
+        if backend == "sqlite":
+            where = f" WHERE {condition}" if condition else ""
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON deliveries ({columns}){where}")
+            continue
+        try:
+            cur.execute(f"CREATE INDEX {name} ON deliveries ({columns})")
+        except MySQLError:
+            pass  # already exists
+
+def drop_delivery_indexes(cur, backend: str) -> None:
+    for name, _, _ in DELIVERY_INDEXES:
+        if backend == "sqlite":
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+            continue
+        try:
+            cur.execute(f"DROP INDEX {name} ON deliveries")
+        except MySQLError:
+            pass
+
+# Delivery hubs for synthetic data: (latitude, longitude, relative weight)
+SYNTHETIC_CLUSTERS = [
+    (9.9281, -84.0907, 45),  # San José
+    (10.0163, -84.2116, 15),  # Alajuela
+    (9.9980, -84.1170, 12),  # Heredia
+    (9.8644, -83.9194, 10),  # Cartago
+    (10.6346, -85.4407, 8),  # Liberia
+    (9.9763, -84.8384, 6),  # Puntarenas
+    (9.9907, -83.0360, 4),  # Limón
+]
+# Routes run 08:00-18:00 local time (UTC-6), busiest late morning; hours below are UTC.
+SYNTHETIC_HOURS = list(range(14, 24)) + [0]
+SYNTHETIC_HOUR_WEIGHTS = [4, 7, 9, 10, 8, 6, 7, 8, 7, 5, 3]
+SYNTHETIC_STREETS = ["Avenida Central", "Calle 1", "Paseo Colón", "Avenida Segunda", "Calle Blancos", "Ruta 27"]
+
+def seed_synthetic_data(
+    app: Flask,
+    users: int,
+    deliveries_per_user: int,
+    password: str,
+    email_domain: str = "synthetic.test",
+    deleted_fraction: float = 0.05,
+    days: int = 90,
+    batch_size: int = 10000,
+    defer_indexes: bool = True,
+    seed: Optional[int] = None,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Tuple[list[int], int]:
+    """Bulk-load synthetic users and deliveries; returns (new user ids, deliveries inserted).
+
+    Deliveries cluster around a few hubs, mix statuses and amounts the way
+    real routes do, spread over ``days`` (mostly during working hours) and a
+    ``deleted_fraction`` of them is soft-deleted. Rows go in with
+    ``executemany`` in ``batch_size`` transactions; with ``defer_indexes`` the
+    deliveries indexes are dropped first and rebuilt once at the end, which
+    is much faster than maintaining them row by row. All users share one
+    password hash, so seeding time does not depend on the hash cost.
+    """
+    rng = random.Random(seed)
+    backend = app.config.get("DB_BACKEND", "mysql")
+    sqlite = backend == "sqlite"
+    p = "?" if sqlite else "%s"
+    password_hash = get_password_hasher(app).hash(password)
+    now = datetime.now(timezone.utc)
+    hubs = [(lat, lng) for lat, lng, _ in SYNTHETIC_CLUSTERS]
+    hub_weights = [w for _, _, w in SYNTHETIC_CLUSTERS]
+
+    def stamp(moment: datetime) -> str:
+        if sqlite:
+            return moment.isoformat()
+        return moment.astimezone().strftime("%Y-%m-%d %H:%M:%S")  # MySQL columns hold server-local time
+
+    def delivery_row(user_id: int) -> tuple:
+        lat, lng = rng.choices(hubs, hub_weights)[0]
+        day = now - timedelta(days=rng.randrange(days))
+        created = day.replace(hour=rng.choices(SYNTHETIC_HOURS, SYNTHETIC_HOUR_WEIGHTS)[0], minute=rng.randrange(60), second=rng.randrange(60), microsecond=0)
+        if created > now:
+            created -= timedelta(days=1)
+        roll = rng.random()
+        status = "delivered" if roll < 0.65 else "pending" if roll < 0.90 else "not_located"
+        delivered_at = stamp(created + timedelta(hours=rng.uniform(1, 48))) if status == "delivered" else None
+        deleted_at = stamp(created + timedelta(days=rng.uniform(0, 3))) if rng.random() < deleted_fraction else None
+        # Most parcels are cash on delivery with a long tail of expensive ones; a fifth are prepaid.
+        amount = 0 if rng.random() < 0.2 else int(min(rng.lognormvariate(9.5, 0.8), 500000))
+        return (
+            user_id,
+            f"{rng.choice(SYNTHETIC_STREETS)} {rng.randint(1, 400)}",
+            round(rng.gauss(lat, 0.02), 6),
+            round(rng.gauss(lng, 0.02), 6),
+            status,
+            f"1Z{rng.getrandbits(64):016X}",
+            amount,
+            stamp(created),
+            delivered_at,
+            deleted_at,
+        )
+
+    insert_delivery = (
+        "INSERT INTO deliveries (user_id, address, latitude, longitude, status, tracking_number, amount_due, created_at, delivered_at, deleted_at) "
+        f"VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p}, {p}, {p}, {p})"
+    )
+    inserted = 0
+    with get_db_connection(app) as conn:
+        cur = conn.cursor()
+        if sqlite:
+            # Bulk-load durability: a crash mid-load only loses synthetic rows.
+            cur.execute("PRAGMA synchronous = OFF")
+        else:
+            cur.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM users")
+        first_new_id = cur.fetchone()[0]
+        cur.execute(f"SELECT COUNT(*) FROM users WHERE email LIKE {p}", (f"%@{email_domain}",))
+        offset = cur.fetchone()[0]
+        if not sqlite:
+            conn.start_transaction()
+        cur.executemany(
+            f"INSERT INTO users (email, full_name, password_hash) VALUES ({p}, {p}, {p})",
+            [(f"user{offset + n}@{email_domain}", f"Synthetic User {offset + n}", password_hash) for n in range(users)],
+        )
+        conn.commit()
+        cur.execute(f"SELECT id FROM users WHERE id > {p} ORDER BY id", (first_new_id,))
+        user_ids = [row[0] for row in cur.fetchall()]
+
+        if defer_indexes:
+            drop_delivery_indexes(cur, backend)
+        try:
+            batch: list[tuple] = []
+            for user_id in user_ids:
+                for _ in range(deliveries_per_user):
+                    batch.append(delivery_row(user_id))
+                    if len(batch) >= batch_size:
+                        if not sqlite:
+                            conn.start_transaction()
+                        cur.executemany(insert_delivery, batch)
+                        conn.commit()
+                        inserted += len(batch)
+                        batch = []
+                        if progress:
+                            progress(inserted)
+            if batch:
+                if not sqlite:
+                    conn.start_transaction()
+                cur.executemany(insert_delivery, batch)
+                conn.commit()
+                inserted += len(batch)
+                if progress:
+                    progress(inserted)
+        finally:
+            if defer_indexes:
+                create_delivery_indexes(cur, backend)
+            if sqlite:
+                cur.execute("ANALYZE deliveries")
+                cur.execute("PRAGMA synchronous = FULL")
+            else:
+                cur.execute("ANALYZE TABLE deliveries")
+                cur.fetchall()
+                cur.execute("SET SESSION unique_checks = 1, foreign_key_checks = 1")
+            conn.commit()
+            cur.close()
+    return user_ids, inserted
+
 def _parse_sqlite_timestamp(value: str) -> datetime:
     try:
         # isoformat stored
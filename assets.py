@@ -0,0 +1,90 @@
+"""Fingerprinted, precompressed copies of the static folder.
+
+``StaticAssets.build`` copies every static file to ``build_dir`` under a
+content-hashed name (``styles.css`` -> ``styles.3f2a9c0d1e7b.css``) and writes
+``.gz`` and, when the optional ``brotli`` package is installed, ``.br``
+variants of text assets next to it. A changed file gets a new name, so
+browsers may cache these forever. Builds are idempotent and files are
+written atomically, so several workers building at once is harmless.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _fingerprinted(name: str, digest: str) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    if os.path.exists(path):
+        return  # content-addressed: an existing file already holds these bytes
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+class StaticAssets:
+    def __init__(self, static_folder: str, build_dir: str, min_compress_size: int = 256):
+        self.static_folder = static_folder
+        self.build_dir = build_dir
+        self.min_compress_size = min_compress_size
+        self.names: dict[str, str] = {}  # logical name -> fingerprinted name
+        self.encodings: dict[str, tuple[str, ...]] = {}  # fingerprinted name -> available encodings
+        self.mimetypes: dict[str, str] = {}
+
+    def build(self) -> int:
+        """Fingerprint and compress every static file; returns how many files were processed."""
+        names: dict[str, str] = {}
+        encodings: dict[str, tuple[str, ...]] = {}
+        types: dict[str, str] = {}
+        for root, _, files in os.walk(self.static_folder):
+            for filename in files:
+                source = os.path.join(root, filename)
+                logical = os.path.relpath(source, self.static_folder).replace(os.sep, "/")
+                with open(source, "rb") as fh:
+                    data = fh.read()
+                hashed = _fingerprinted(logical, hashlib.sha256(data).hexdigest()[:12])
+                target = os.path.join(self.build_dir, *hashed.split("/"))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                _write_atomic(target, data)
+                mimetype = mimetypes.guess_type(logical)[0] or "application/octet-stream"
+                available = []
+                if mimetype.startswith(COMPRESSIBLE_TYPES) and len(data) >= self.min_compress_size:
+                    if brotli is not None:
+                        _write_atomic(target + ".br", brotli.compress(data, quality=11))
+                        available.append("br")
+                    _write_atomic(target + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+                    available.append("gzip")
+                names[logical] = hashed
+                encodings[hashed] = tuple(available)
+                types[hashed] = mimetype
+        self.names, self.encodings, self.mimetypes = names, encodings, types
+        return len(names)
+
+    def url_name(self, filename: str) -> Optional[str]:
+        return self.names.get(filename)
+
+    def variant(self, hashed: str, accepts) -> Optional[tuple[str, Optional[str]]]:
+        """(relative path, Content-Encoding) of the best variant ``accepts`` allows; None if unknown.
+
+        ``accepts(encoding)`` returns the client's quality value for it.
+        """
+        if hashed not in self.encodings:
+            return None
+        for encoding, suffix in ENCODINGS:
+            if encoding in self.encodings[hashed] and accepts(encoding) > 0:
+                return hashed + suffix, encoding
+        return hashed, None
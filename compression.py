@@ -0,0 +1,113 @@
+"""Gzip for dynamic responses.
+
+Buffered bodies are compressed in one go once they reach ``min_size``.
+Streamed bodies are compressed chunk by chunk, and each chunk is
+sync-flushed so the client still receives it straight away; nothing is held
+back to buffer the whole stream. Event streams, bodies that are already
+encoded and file responses are left alone: static files are precompressed
+(see assets.py) and SSE must never be delayed.
+"""
+import time
+import zlib
+from typing import Callable, Iterable, Iterator, Optional
+
+COMPRESSIBLE_MIMETYPES = frozenset({
+    "text/html",
+    "text/plain",
+    "text/css",
+    "text/csv",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+})
+
+# Called with (bytes before, bytes after, seconds spent compressing).
+CompressionHook = Callable[[int, int, float], None]
+
+
+def should_compress(response, min_size: int) -> bool:
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if response.direct_passthrough or "Content-Encoding" in response.headers:
+        return False
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:  # excludes text/event-stream
+        return False
+    if "no-transform" in (response.headers.get("Cache-Control") or ""):
+        return False
+    if response.is_streamed:
+        return True  # length unknown up front
+    return (response.content_length or 0) >= min_size
+
+
+def _compressor(level: int):
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+
+
+def gzip_body(data: bytes, level: int, on_done: CompressionHook) -> bytes:
+    started = time.perf_counter()
+    compressor = _compressor(level)
+    body = compressor.compress(data) + compressor.flush()
+    on_done(len(data), len(body), time.perf_counter() - started)
+    return body
+
+
+class GzipStream:
+    """Iterable that gzips ``chunks`` as they are pulled, sync-flushing after each one.
+
+    A plain generator's ``finally`` never runs when the server closes it
+    before the first ``next()`` (e.g. the client went away), which would
+    skip the wrapped iterable's cleanup. ``close()`` therefore lives on this
+    object and always closes ``chunks`` and reports ``on_done`` exactly once.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], level: int, on_done: CompressionHook):
+        self._chunks = chunks
+        self._iterator: Optional[Iterator[bytes]] = None
+        self._compressor = _compressor(level)
+        self._on_done = on_done
+        self._finished = False
+        self._closed = False
+        self.bytes_in = self.bytes_out = 0
+        self.seconds = 0.0
+
+    def __iter__(self) -> "GzipStream":
+        return self
+
+    def __next__(self) -> bytes:
+        if self._finished:
+            raise StopIteration
+        if self._iterator is None:
+            self._iterator = iter(self._chunks)
+        for chunk in self._iterator:
+            if not chunk:
+                continue
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            started = time.perf_counter()
+            out = self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.seconds += time.perf_counter() - started
+            self.bytes_in += len(chunk)
+            self.bytes_out += len(out)
+            return out
+        self._finished = True
+        tail = self._compressor.flush()
+        self.bytes_out += len(tail)
+        return tail
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._finished = True
+        try:
+            close = getattr(self._chunks, "close", None)
+            if close is not None:
+                close()  # the wrapped iterable's cleanup (e.g. stream_with_context) must still run
+        finally:
+            self._on_done(self.bytes_in, self.bytes_out, self.seconds)
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int, on_done: CompressionHook) -> GzipStream:
+    return GzipStream(chunks, level, on_done)
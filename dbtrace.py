@@ -0,0 +1,302 @@
+"""Connection and cursor proxies that report every statement the app runs.
+
+``get_db_connection`` wraps the raw sqlite3 / mysql-connector connection in a
+``TracedConnection``. Its cursors time each ``execute``/``executemany`` and
+hand a ``QueryRecord`` to ``on_query``; rows fetched afterwards are added to
+that record, so by the end of the request it holds the rows written or read.
+Everything else is passed straight through, so data helpers do not change.
+
+``SlowQueryLog`` appends statements above a threshold to a JSON-lines file,
+and ``query_budget`` declares how many statements a view may issue.
+``capture_statements`` collects statements together with their parameters,
+for tools that need to re-run them (tests/test_query_plans.py EXPLAINs them).
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Iterator, Optional
+
+_open_connections = 0
+_live_lock = threading.Lock()
+_captures: list[list[tuple]] = []
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def open_connection_count() -> int:
+    """Traced connections in this process that have been opened and not closed yet."""
+    with _live_lock:
+        return _open_connections
+
+
+@contextmanager
+def capture_statements() -> Iterator[list[tuple]]:
+    """Collect ``(sql, params)`` for every traced statement run inside the block, in any thread.
+
+    ``executemany`` contributes its first parameter set. Meant for tooling:
+    parameters stay in memory until the block exits.
+    """
+    captured: list[tuple] = []
+    with _live_lock:
+        _captures.append(captured)
+    try:
+        yield captured
+    finally:
+        with _live_lock:
+            _captures.remove(captured)
+
+
+def _capture(sql: str, params) -> None:
+    with _live_lock:
+        for captured in _captures:
+            captured.append((sql, params))
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse a statement to its shape so repeats group together (N+1 loops show up as one line).
+
+    Literals and placeholders become ``?`` (MySQL's ``%s`` included), ``IN``
+    lists of any length become ``(...)`` and whitespace is squeezed.
+    """
+    sql = _STRING_LITERAL.sub("?", sql.replace("%s", "?"))
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+class QueryRecord:
+    __slots__ = ("sql", "param_count", "seconds", "rows", "error")
+
+    def __init__(self, sql: str, param_count: int, seconds: float, rows: Optional[int], error: Optional[str]):
+        self.sql = sql
+        self.param_count = param_count
+        self.seconds = seconds
+        self.rows = rows
+        self.error = error
+
+    @property
+    def normalized(self) -> str:
+        return normalize_sql(self.sql)
+
+    def as_dict(self) -> dict:
+        return {
+            "sql": self.normalized,
+            "params": self.param_count,
+            "ms": round(self.seconds * 1000, 3),
+            "rows": self.rows,
+            "error": self.error,
+        }
+
+
+QueryHook = Callable[[QueryRecord], None]
+
+
+def _param_count(params) -> int:
+    if params is None:
+        return 0
+    try:
+        return len(params)
+    except TypeError:
+        return 0
+
+
+def _rowcount(cursor) -> Optional[int]:
+    rows = getattr(cursor, "rowcount", -1)
+    return rows if isinstance(rows, int) and rows >= 0 else None
+
+
+class TracedCursor:
+    def __init__(self, cursor, on_query: QueryHook):
+        self._cursor = cursor
+        self._on_query = on_query
+        self._record: Optional[QueryRecord] = None
+
+    def _report(self, sql: str, param_count: int, started: float, error: Optional[BaseException]) -> None:
+        # SELECTs usually have no rowcount yet; fetches below fill the record in.
+        record = QueryRecord(
+            sql,
+            param_count,
+            time.perf_counter() - started,
+            _rowcount(self._cursor),
+            repr(error) if error is not None else None,
+        )
+        self._record = record
+        self._on_query(record)
+
+    def _count_rows(self, n: int) -> None:
+        if self._record is not None:
+            self._record.rows = (self._record.rows or 0) + n
+
+    def execute(self, sql: str, params=None):
+        if _captures:
+            _capture(sql, params)
+        started = time.perf_counter()
+        error = None
+        try:
+            result = self._cursor.execute(sql) if params is None else self._cursor.execute(sql, params)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            self._report(sql, _param_count(params), started, error)
+        return self if result is self._cursor else result
+
+    def executemany(self, sql: str, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        if _captures and seq_of_params:
+            _capture(sql, seq_of_params[0])
+        started = time.perf_counter()
+        error = None
+        try:
+            result = self._cursor.executemany(sql, seq_of_params)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            self._report(sql, sum(_param_count(p) for p in seq_of_params), started, error)
+        return self if result is self._cursor else result
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count_rows(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._count_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._count_rows(len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._count_rows(1)
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        exit_ = getattr(self._cursor, "__exit__", None)
+        if exit_ is not None:
+            return exit_(*exc_info)
+        self._cursor.close()
+        return None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TracedConnection:
+    """Leaving the ``with`` block closes the connection, on either backend."""
+
+    def __init__(self, conn, on_query: QueryHook):
+        global _open_connections
+        self._conn = conn
+        self._on_query = on_query
+        self._closed = False
+        with _live_lock:
+            _open_connections += 1
+
+    def cursor(self, *args, **kwargs) -> TracedCursor:
+        return TracedCursor(self._conn.cursor(*args, **kwargs), self._on_query)
+
+    def execute(self, sql: str, params=None):
+        """sqlite3's connection-level shortcut, traced like a cursor call."""
+        return self.cursor().execute(sql, params)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            return self._conn.__exit__(*exc_info)  # sqlite3 commits or rolls back but stays open
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        global _open_connections
+        if self._closed:
+            return
+        self._closed = True
+        with _live_lock:
+            _open_connections -= 1
+        self._conn.close()
+
+    def __del__(self):
+        if not getattr(self, "_closed", True):
+            self.close()  # used without ``with``; the raw connection goes with this proxy anyway
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SlowQueryLog:
+    """Appends statements slower than ``threshold_ms`` to a JSON-lines file."""
+
+    def __init__(self, path: str, threshold_ms: float):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+
+    def is_slow(self, record: QueryRecord) -> bool:
+        return self.threshold_ms > 0 and record.seconds * 1000 >= self.threshold_ms
+
+    def write(self, record: QueryRecord, **context) -> None:
+        entry = {"at": datetime.now(timezone.utc).isoformat(), **context, **record.as_dict()}
+        line = json.dumps(entry) + "\n"
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(line)  # one short append per entry, so lines from other workers do not interleave
+        except OSError as exc:
+            print(f"[DB] Could not write slow query log: {exc}")
+
+    def rotate(self, max_bytes: int) -> bool:
+        """Move the log to ``<path>.1`` (replacing an older one) once it exceeds ``max_bytes``.
+
+        Writers reopen the file for every entry, so the next one simply starts a new log.
+        """
+        try:
+            if max_bytes <= 0 or os.path.getsize(self.path) <= max_bytes:
+                return False
+            os.replace(self.path, f"{self.path}.1")
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(max_queries: int):
+    """Declare the most statements a view may execute per request.
+
+    The app checks the declaration after each statement; see
+    ``QUERY_BUDGET_ENFORCE`` for whether going over fails the request.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def summarize(records: list[QueryRecord], limit: int = 10) -> str:
+    """Statement shapes by frequency, e.g. for a budget failure message."""
+    counts: dict[str, int] = {}
+    for record in records:
+        counts[record.normalized] = counts.get(record.normalized, 0) + 1
+    top = sorted(counts.items(), key=lambda item: -item[1])[:limit]
+    return "\n".join(f"  {n}x {sql}" for sql, n in top)
@@ -0,0 +1,151 @@
+"""Per-user pub/sub feeding the Server-Sent Events stream.
+
+``EventBroker`` fans events out to the subscriber queues of the current
+process. Gunicorn runs several processes, so with a ``db_path`` the broker
+also appends each event to a small shared SQLite log; one poller thread per
+process tails that log and delivers events published by other processes.
+Each open stream holds a server thread, so ``max_subscribers`` caps how many
+a process will serve at once.
+"""
+import json
+import os
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class EventBroker:
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        poll_interval: float = 0.5,
+        retention_seconds: float = 300.0,
+        max_queue: int = 100,
+        max_subscribers: int = 0,
+    ):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers  # 0: unlimited
+        self._subscribers: dict[int, set[queue.Queue]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = secrets.token_hex(8)
+        self._poller_pid: Optional[int] = None
+
+    def subscribe(self, user_id: int) -> Optional[queue.Queue]:
+        """A new event queue for ``user_id``, or None when this process is at ``max_subscribers``."""
+        self._ensure_poller()
+        q: queue.Queue = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            if self.max_subscribers and sum(len(s) for s in self._subscribers.values()) >= self.max_subscribers:
+                return None
+            self._subscribers.setdefault(user_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, user_id: int, q: queue.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def publish(self, user_id: int, event: dict) -> None:
+        self._deliver(user_id, event)
+        if self.db_path:
+            try:
+                self._connection().execute(
+                    "INSERT INTO events (origin, user_id, payload, created_at) VALUES (?, ?, ?, ?)",
+                    (self._origin, user_id, json.dumps(event), time.time()),
+                )
+            except sqlite3.Error as exc:
+                print(f"[EVENTS] Could not share event with other workers: {exc}")
+
+    def publish_many(self, events: list[tuple[int, dict]]) -> None:
+        """Publish ``(user_id, event)`` pairs, sharing them in one write instead of one per event."""
+        for user_id, event in events:
+            self._deliver(user_id, event)
+        if self.db_path and events:
+            now = time.time()
+            conn = self._connection()
+            try:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT INTO events (origin, user_id, payload, created_at) VALUES (?, ?, ?, ?)",
+                    [(self._origin, user_id, json.dumps(event), now) for user_id, event in events],
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error as exc:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                print(f"[EVENTS] Could not share events with other workers: {exc}")
+
+    def _deliver(self, user_id: int, event: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass  # a stalled client misses events; its page reloads on reconnect
+
+    def _connection(self) -> sqlite3.Connection:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, user_id INTEGER NOT NULL,"
+                " payload TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ensure_poller(self) -> None:
+        if not self.db_path or self._poller_pid == os.getpid():
+            return
+        with self._lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+            # Each forked worker needs its own origin so it sees its siblings' events.
+            self._origin = secrets.token_hex(8)
+        threading.Thread(target=self._poll_loop, name="event-poller", daemon=True).start()
+
+    def _poll_loop(self) -> None:
+        last_id: Optional[int] = None
+        last_purge = 0.0
+        while True:
+            try:
+                conn = self._connection()
+                if last_id is None:
+                    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+                rows = conn.execute(
+                    "SELECT id, origin, user_id, payload FROM events WHERE id > ? ORDER BY id",
+                    (last_id,),
+                ).fetchall()
+                for row_id, origin, user_id, payload in rows:
+                    last_id = row_id
+                    if origin != self._origin:
+                        with self._lock:
+                            interested = user_id in self._subscribers
+                        if interested:
+                            self._deliver(user_id, json.loads(payload))
+                if time.time() - last_purge > self.retention_seconds:
+                    conn.execute("DELETE FROM events WHERE created_at < ?", (time.time() - self.retention_seconds,))
+                    last_purge = time.time()
+            except sqlite3.Error as exc:
+                print(f"[EVENTS] Poller error: {exc}")
+            time.sleep(self.poll_interval)
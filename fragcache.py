@@ -0,0 +1,71 @@
+"""In-process cache of rendered template fragments.
+
+Templates wrap a piece of markup in ``{% call cached_fragment(name, ...) %}``.
+The key is the fragment name plus the values that markup is rendered from
+(a delivery row's own fields, a panel's counts), so a changed row simply
+misses and renders again: nothing has to be invalidated, and a change made
+through another worker is picked up the same way. Entries are evicted
+least-recently-used once ``max_entries`` is reached.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+
+def freeze(value) -> Hashable:
+    """Turn dicts and lists (e.g. a row dict) into something usable in a key."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class FragmentCache:
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: Hashable, value: str) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def render(self, key: Hashable, render: Callable[[], str]) -> tuple[str, bool]:
+        """Cached markup for ``key``, rendering and storing it on a miss; returns (markup, hit)."""
+        cached = self.get(key)
+        if cached is not None:
+            return cached, True
+        value = str(render())
+        self.set(key, value)
+        return value, False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
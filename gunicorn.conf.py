@@ -0,0 +1,32 @@
+"""Gunicorn settings, loaded automatically from the working directory.
+
+    gunicorn "app:create_app()"
+
+preload_app runs create_app() once in the master: driver imports, schema
+setup and hash calibration happen a single time and workers share the
+result copy-on-write, so they boot in milliseconds. Nothing that cannot
+cross a fork is created at that point (threads, the hashing pool and SQLite
+handles are built per pid), and post_worker_init starts them straight away
+in each worker via app.after_fork. Set GUNICORN_PRELOAD=0 to load the app in
+every worker instead, e.g. for --reload during development.
+"""
+import os
+import time
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+# Every open /deliveries/stream holds one of these threads for up to SSE_MAX_SECONDS;
+# keep SSE_MAX_STREAMS well below this so page requests still get a thread.
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes")
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    from app import after_fork
+
+    after_fork(worker.wsgi, getattr(worker, "forked_at", None))
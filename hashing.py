@@ -0,0 +1,199 @@
+"""Password hashing offloaded to a bounded process pool.
+
+Hashing at scrypt/pbkdf2 cost is pure CPU work. Running it in a small pool of
+helper processes keeps a burst of logins from pinning the web worker, and the
+queue limit makes excess attempts fail fast instead of piling up behind it.
+The hash method is configurable and can be calibrated to a target latency;
+stored hashes made under an older policy are flagged by ``needs_rehash``.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusyError(Exception):
+    """Raised when the hashing queue is full or a hash did not finish in time."""
+
+
+def _generate(password: str, method: str) -> str:
+    if method:
+        return generate_password_hash(password, method=method)
+    return generate_password_hash(password)
+
+
+def _check(password_hash: str, password: str) -> bool:
+    return check_password_hash(password_hash, password)
+
+
+def _noop() -> None:
+    return None
+
+
+def policy_prefix(method: str) -> str:
+    """The ``method$`` prefix of hashes made under ``method``, with werkzeug's defaults filled in.
+
+    Raises ValueError when werkzeug does not accept ``method``.
+    """
+    # Expands e.g. "scrypt" to "scrypt:32768:8:1"; costs one hash, so call it once.
+    return _generate("policy-probe", method).split("$", 1)[0]
+
+
+def _time_method(method: str, rounds: int = 3) -> float:
+    """Best-of-N wall time in milliseconds for one hash with ``method``."""
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        generate_password_hash("calibration-password", method=method)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def calibrate_hash_method(target_ms: float, algorithm: str = "pbkdf2:sha256") -> str:
+    """Pick hash parameters that take roughly ``target_ms`` on this machine.
+
+    pbkdf2 cost scales linearly with iterations, so one probe is enough.
+    scrypt's work factor must be a power of two; the closest one is chosen.
+    """
+    parts = algorithm.split(":")
+    if parts[0] == "scrypt":
+        r = int(parts[2]) if len(parts) > 2 else 8
+        p = int(parts[3]) if len(parts) > 3 else 1
+        n, previous = 2**12, None
+        elapsed = _time_method(f"scrypt:{n}:{r}:{p}")
+        # Cap at 2**17 to keep per-hash memory (128 * n * r bytes) bounded.
+        while elapsed < target_ms and n < 2**17:
+            previous = (n, elapsed)
+            n *= 2
+            elapsed = _time_method(f"scrypt:{n}:{r}:{p}")
+        if previous and abs(previous[1] - target_ms) < abs(elapsed - target_ms):
+            n = previous[0]
+        return f"scrypt:{n}:{r}:{p}"
+    if parts[0] == "pbkdf2":
+        digest = parts[1] if len(parts) > 1 else "sha256"
+        probe = 50_000
+        elapsed = _time_method(f"pbkdf2:{digest}:{probe}")
+        iterations = max(10_000, round(probe * target_ms / max(elapsed, 0.001), -3))
+        return f"pbkdf2:{digest}:{int(iterations)}"
+    raise ValueError(f"Cannot calibrate unknown hash algorithm {algorithm!r}")
+
+
+class PasswordHasher:
+    """Runs password hash/verify calls in a bounded process pool.
+
+    ``workers=0`` keeps hashing inline in the calling process (useful for
+    development and tests) while still recording metrics.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        queue_limit: int = 32,
+        timeout: float = 5.0,
+        method: str = "",
+        sample_size: int = 512,
+    ):
+        self.workers = max(0, workers)
+        self.queue_limit = max(0, queue_limit)
+        self.timeout = timeout
+        self.method = method
+        self._policy_prefix = policy_prefix(method)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._total_seconds = 0.0
+        self._max_seconds = 0.0
+        self._samples: deque = deque(maxlen=sample_size)
+
+    def hash(self, password: str) -> str:
+        return self._run(_generate, password, self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        return self._run(_check, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True when ``password_hash`` was made with parameters other than the current policy."""
+        return password_hash.split("$", 1)[0] != self._policy_prefix
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Pools do not survive fork; build a fresh one in each worker process.
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._executor_pid = pid
+            self._pending = 0
+        return self._executor
+
+    def _run(self, fn: Callable, *args):
+        with self._lock:
+            executor = self._get_executor() if self.workers else None
+            if executor is not None and self._pending >= self.workers + self.queue_limit:
+                self._rejected += 1
+                raise HashingBusyError("Password hashing queue is full")
+            self._pending += 1
+        started = time.perf_counter()
+        if executor is None:
+            try:
+                return fn(*args)
+            finally:
+                self._finish(started)
+        future = executor.submit(fn, *args)
+        future.add_done_callback(lambda _f: self._finish(started))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise HashingBusyError("Password hashing timed out") from None
+
+    def _finish(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._pending = max(0, self._pending - 1)
+            self._completed += 1
+            self._total_seconds += elapsed
+            self._max_seconds = max(self._max_seconds, elapsed)
+            self._samples.append(elapsed)
+
+    def warm(self) -> None:
+        """Start this process's pool now, so the first login does not wait for helper processes to spawn."""
+        if not self.workers:
+            return
+        with self._lock:
+            executor = self._get_executor()
+        # Pools spawn a process per submitted task until ``workers`` exist.
+        for future in [executor.submit(_noop) for _ in range(self.workers)]:
+            future.result(timeout=self.timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+            completed = self._completed
+            result = {
+                "workers": self.workers,
+                "method": self.method or "default",
+                "queue_limit": self.queue_limit,
+                "queue_depth": self._pending,
+                "completed": completed,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+                "latency_avg_ms": (self._total_seconds / completed * 1000) if completed else 0.0,
+                "latency_max_ms": self._max_seconds * 1000,
+            }
+        for label, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            result[f"latency_{label}_ms"] = samples[min(len(samples) - 1, int(q * len(samples)))] * 1000 if samples else 0.0
+        return result
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._executor_pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,202 @@
+"""Durable in-process background jobs.
+
+Jobs are rows in a small SQLite database, so they survive worker restarts:
+a job claimed by a worker that died is picked up again once its lease runs
+out. Each web process runs a few daemon threads that claim due jobs, call the
+registered handler and either delete the row or reschedule it with
+exponential backoff. Jobs that keep failing stay in the table with status
+``failed`` for inspection.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+JobHandler = Callable[[dict], None]
+
+
+class JobQueue:
+    """SQLite-backed job queue drained by daemon threads in each process.
+
+    ``workers=0`` runs every job inline in the caller instead (development,
+    tests), mirroring ``PasswordHasher``'s inline mode.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        workers: int = 2,
+        max_attempts: int = 5,
+        backoff_base: float = 2.0,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 300.0,
+    ):
+        self.db_path = db_path
+        self.workers = max(0, workers)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._handlers: dict[str, JobHandler] = {}
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._started_pid: Optional[int] = None
+        self._processed = 0
+        self._failures = 0
+        self._connection()  # create the schema eagerly
+
+    def _connection(self) -> sqlite3.Connection:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                  id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  name TEXT NOT NULL,
+                  payload TEXT NOT NULL,
+                  status TEXT NOT NULL DEFAULT 'queued',
+                  attempts INTEGER NOT NULL DEFAULT 0,
+                  run_at REAL NOT NULL,
+                  locked_until REAL NULL,
+                  last_error TEXT NULL,
+                  created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs (status, run_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def register(self, name: str, handler: JobHandler) -> None:
+        self._handlers[name] = handler
+
+    def enqueue(self, name: str, payload: dict, delay: float = 0.0) -> Optional[int]:
+        """Persist a job for the worker threads; with ``workers=0`` run it inline instead."""
+        if name not in self._handlers:
+            raise KeyError(f"No handler registered for job {name!r}")
+        if not self.workers:
+            self.run_inline(name, payload)
+            return None
+        now = time.time()
+        cur = self._connection().execute(
+            "INSERT INTO jobs (name, payload, run_at, created_at) VALUES (?, ?, ?, ?)",
+            (name, json.dumps(payload), now + delay, now),
+        )
+        self._wakeup.set()
+        return cur.lastrowid
+
+    def run_inline(self, name: str, payload: dict) -> None:
+        try:
+            self._handlers[name](payload)
+        except Exception as exc:
+            print(f"[JOBS] Inline job {name} failed: {exc!r}")
+
+    def start(self) -> None:
+        """Start worker threads once per process; cheap to call on every request."""
+        if not self.workers or self._started_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self._wakeup = threading.Event()
+            for i in range(self.workers):
+                threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True).start()
+
+    def _worker_loop(self) -> None:
+        while True:
+            try:
+                ran = self.run_next()
+            except sqlite3.Error as exc:
+                print(f"[JOBS] Queue error: {exc}")
+                ran = False
+            if not ran:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim(self) -> Optional[tuple]:
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, name, payload, attempts FROM jobs "
+                "WHERE (status = 'queued' AND run_at <= ?) OR (status = 'running' AND locked_until < ?) "
+                "ORDER BY run_at LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ? WHERE id = ?",
+                    (now + self.lease_seconds, row[0]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def run_next(self) -> bool:
+        """Claim and run one due job; returns False when nothing was due."""
+        row = self._claim()
+        if row is None:
+            return False
+        job_id, name, payload, attempts = row
+        attempts += 1
+        conn = self._connection()
+        try:
+            handler = self._handlers[name]
+            handler(json.loads(payload))
+        except Exception as exc:  # handlers may fail in arbitrary ways; record and retry
+            self._failures += 1
+            if attempts >= self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', locked_until = NULL, last_error = ? WHERE id = ?",
+                    (repr(exc)[:1000], job_id),
+                )
+                print(f"[JOBS] Job {name}#{job_id} failed permanently: {exc!r}")
+            else:
+                delay = self.backoff_base ** attempts + random.uniform(0, 1)
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', run_at = ?, locked_until = NULL, last_error = ? WHERE id = ?",
+                    (time.time() + delay, repr(exc)[:1000], job_id),
+                )
+            return True
+        conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        self._processed += 1
+        return True
+
+    def run_pending(self, limit: Optional[int] = None) -> int:
+        """Synchronously run due jobs (CLI and inline mode); returns how many ran."""
+        count = 0
+        while (limit is None or count < limit) and self.run_next():
+            count += 1
+        return count
+
+    def purge_failed(self, older_than: float) -> int:
+        """Delete jobs marked ``failed`` that were created more than ``older_than`` seconds ago."""
+        cur = self._connection().execute(
+            "DELETE FROM jobs WHERE status = 'failed' AND created_at < ?",
+            (time.time() - older_than,),
+        )
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: n for status, n in rows}
+        return {
+            "workers": self.workers,
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "failed": counts.get("failed", 0),
+            "processed": self._processed,
+            "failures": self._failures,
+        }
@@ -0,0 +1,204 @@
+"""Outbound email delivered from the outbox by a background sender.
+
+Requests only insert rows into ``email_outbox``; ``OutboxSender`` claims them
+in batches and hands them to a transport. ``SMTPTransport`` keeps one SMTP
+connection open across batches, so a burst of reset emails costs one TCP/TLS
+handshake instead of one per message. A connection in active use is trusted
+as is (a send that finds it dropped reconnects and retries); only one that
+sat idle for a while is probed with NOOP first. If the server cannot be
+reached at all, the rest of the batch fails at once and the outbox's retry
+backoff takes over. While the outbox is empty the sender polls less and less
+often and relies on ``wake()`` for new mail. Without SMTP settings,
+``ConsoleTransport`` prints messages, which is what development used before.
+"""
+import os
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from typing import Callable, Optional
+
+
+class ConsoleTransport:
+    def send_batch(self, messages: list[dict]) -> list[Optional[str]]:
+        for message in messages:
+            print(f"[MAIL] To: {message['recipient']} | {message['subject']}\n{message['body']}")
+        return [None] * len(messages)
+
+    def close(self) -> None:
+        pass
+
+
+class SMTPTransport:
+    def __init__(
+        self,
+        host: str,
+        port: int = 587,
+        username: str = "",
+        password: str = "",
+        use_tls: bool = True,
+        sender: str = "no-reply@localhost",
+        timeout: float = 10.0,
+        idle_timeout: float = 30.0,
+        probe_after: float = 5.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.sender = sender
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.probe_after = probe_after
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None:
+            idle = time.monotonic() - self._last_used
+            if idle > self.idle_timeout:
+                self.close()  # servers drop idle clients; reconnecting beats probing
+            elif idle > self.probe_after:
+                try:
+                    if self._smtp.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("stale connection")
+                except (smtplib.SMTPException, OSError):
+                    self.close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def _build(self, message: dict) -> EmailMessage:
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = message["recipient"]
+        email["Subject"] = message["subject"]
+        email.set_content(message["body"])
+        return email
+
+    def send_batch(self, messages: list[dict]) -> list[Optional[str]]:
+        """Send messages over one connection; returns an error string (or None) per message."""
+        results: list[Optional[str]] = []
+        for message in messages:
+            for attempt in range(2):
+                try:
+                    smtp = self._connection()
+                except (smtplib.SMTPException, OSError) as exc:
+                    # Every remaining message would wait out the same connect timeout.
+                    self.close()
+                    error = str(exc) or exc.__class__.__name__
+                    return results + [error] * (len(messages) - len(results))
+                try:
+                    smtp.send_message(self._build(message))
+                    self._last_used = time.monotonic()
+                    results.append(None)
+                    break
+                except smtplib.SMTPServerDisconnected as exc:
+                    self.close()
+                    if attempt:
+                        results.append(str(exc) or "server disconnected")
+                except (smtplib.SMTPException, OSError) as exc:
+                    if isinstance(exc, OSError):
+                        self.close()
+                    results.append(str(exc) or exc.__class__.__name__)
+                    break
+        return results
+
+    def close(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+
+class OutboxSender:
+    """Drains the outbox on a daemon thread using caller-supplied storage callbacks.
+
+    ``claim(batch_size)`` returns claimed rows (dicts with id, recipient,
+    subject, body, attempts), ``mark_sent(ids)`` records deliveries and
+    ``mark_failed(row, error)`` schedules a retry or gives up.
+    """
+
+    def __init__(
+        self,
+        transport,
+        claim: Callable[[int], list[dict]],
+        mark_sent: Callable[[list[int]], None],
+        mark_failed: Callable[[dict, str], None],
+        batch_size: int = 50,
+        poll_interval: float = 2.0,
+        max_poll_interval: float = 60.0,
+    ):
+        self.transport = transport
+        self.claim = claim
+        self.mark_sent = mark_sent
+        self.mark_failed = mark_failed
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max(poll_interval, max_poll_interval)
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._started_pid: Optional[int] = None
+        self.sent = 0
+        self.failed = 0
+        self.claimed = 0
+
+    def start(self) -> None:
+        if self._started_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self._wakeup = threading.Event()
+            threading.Thread(target=self._loop, name="outbox-sender", daemon=True).start()
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def drain(self) -> int:
+        """Send claimed batches until the outbox has nothing due; returns messages sent."""
+        sent = 0
+        while True:
+            rows = self.claim(self.batch_size)
+            if not rows:
+                return sent
+            self.claimed += len(rows)
+            results = self.transport.send_batch(rows)
+            delivered = [row["id"] for row, error in zip(rows, results) if error is None]
+            if delivered:
+                self.mark_sent(delivered)
+            for row, error in zip(rows, results):
+                if error is not None:
+                    self.failed += 1
+                    self.mark_failed(row, error)
+            sent += len(delivered)
+            self.sent += len(delivered)
+            if len(rows) < self.batch_size:
+                return sent
+
+    def _loop(self) -> None:
+        delay = self.poll_interval
+        while True:
+            claimed = self.claimed
+            try:
+                self.drain()
+            except Exception as exc:  # storage errors must not kill the sender thread
+                print(f"[MAIL] Outbox sender error: {exc!r}")
+            # Every poll is a write (the claim UPDATE), so back off while nothing is due.
+            # New mail calls wake(); polling only has to catch retries coming due.
+            delay = self.poll_interval if self.claimed != claimed else min(delay * 2, self.max_poll_interval)
+            if self._wakeup.wait(delay):
+                delay = self.poll_interval
+            self._wakeup.clear()
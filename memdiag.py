@@ -0,0 +1,104 @@
+"""Per-process memory diagnostics built on tracemalloc.
+
+Tracing is off until someone starts it, since it slows allocation-heavy code
+down noticeably. Once started, ``snapshot()`` stores a baseline and
+``report(diff=True)`` shows which allocation sites grew since then: the way
+to tell a real leak from a one-off cache warming up.
+"""
+import gc
+import os
+import threading
+import tracemalloc
+from typing import Optional
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size (Linux), falling back to the peak from getrusage."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryDiagnostics:
+    def __init__(self, frames: int = 10):
+        self.frames = frames
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._baseline = None
+        tracemalloc.stop()
+
+    def _take(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+    def snapshot(self) -> bool:
+        """Store a baseline for later diffs; False when tracing is not running."""
+        if not tracemalloc.is_tracing():
+            return False
+        snap = self._take()
+        with self._lock:
+            self._baseline = snap
+        return True
+
+    def status(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "pid": os.getpid(),
+            "rss_bytes": rss_bytes(),
+            "tracing": tracing,
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "has_baseline": self._baseline is not None,
+            "gc_counts": gc.get_count(),
+        }
+
+    def report(self, limit: int = 20, key_type: str = "lineno", diff: bool = False) -> list[dict]:
+        """Top allocation sites, or their growth since the baseline when ``diff``."""
+        if not tracemalloc.is_tracing():
+            return []
+        snap = self._take()
+        with self._lock:
+            baseline = self._baseline
+        if diff and baseline is not None:
+            stats = snap.compare_to(baseline, key_type)
+            return [
+                {
+                    "site": _site(stat.traceback),
+                    "size_bytes": stat.size,
+                    "size_diff_bytes": stat.size_diff,
+                    "count": stat.count,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:limit]
+            ]
+        return [
+            {"site": _site(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+            for stat in snap.statistics(key_type)[:limit]
+        ]
+
+
+def _site(traceback: tracemalloc.Traceback) -> list[str]:
+    return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
@@ -0,0 +1,244 @@
+"""Prometheus-style metrics shared across gunicorn workers.
+
+Each process keeps counters, histograms and gauges in memory and every few
+seconds writes them to ``<directory>/metrics-<pid>.json``, from a flusher
+thread so idle workers and background-only counters are exported too. ``render()``
+merges the snapshots of all live processes into the Prometheus text format,
+so whichever worker answers /metrics reports totals for the whole host.
+Snapshots of processes that have exited are removed (Prometheus treats the
+drop as a counter reset). Without a directory only the current process is
+reported.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra: Optional[tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsRegistry:
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = 5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._meta: dict[str, tuple[str, str, tuple]] = {}
+        self._collectors: list[Callable[["MetricsRegistry"], None]] = []
+        self._start_lock = threading.Lock()
+        self._started_pid: Optional[int] = None
+        self._reset()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._histograms: dict[tuple[str, Labels], list] = {}
+        self._gauges: dict[tuple[str, Labels], float] = {}
+        self._last_flush = 0.0
+
+    def _check_fork(self) -> None:
+        # A forked worker must not report its parent's numbers as its own.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self._meta[name] = (kind, help_text, tuple(buckets))
+
+    def add_collector(self, collector: Callable[["MetricsRegistry"], None]) -> None:
+        """Run ``collector(registry)`` before each flush; used to sample gauges cheaply."""
+        self._collectors.append(collector)
+
+    def start(self) -> None:
+        """Flush every ``flush_interval`` from a daemon thread, once per process; cheap to call per request."""
+        if not self.directory or self._started_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._check_fork()
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        buckets = self._meta.get(name, ("histogram", "", DEFAULT_BUCKETS))[2]
+        key = (name, _labels(labels))
+        with self._lock:
+            self._check_fork()
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def set_counter(self, name: str, value: float, **labels) -> None:
+        """Record a cumulative total kept elsewhere (e.g. a pool's own count), for collectors."""
+        with self._lock:
+            self._check_fork()
+            self._counters[(name, _labels(labels))] = value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._check_fork()
+            self._gauges[(name, _labels(labels))] = value
+
+    def _snapshot(self) -> dict:
+        for collector in self._collectors:
+            try:
+                collector(self)
+            except Exception as exc:  # a broken collector must not take metrics down
+                print(f"[METRICS] Collector failed: {exc!r}")
+        with self._lock:
+            self._check_fork()
+            return {
+                "pid": self._pid,
+                "counters": [[n, list(map(list, l)), v] for (n, l), v in self._counters.items()],
+                "histograms": [[n, list(map(list, l)), list(s[0]), s[1], s[2]] for (n, l), s in self._histograms.items()],
+                "gauges": [[n, list(map(list, l)), v] for (n, l), v in self._gauges.items()],
+            }
+
+    def flush(self, force: bool = False) -> None:
+        """Write this process's snapshot if ``flush_interval`` has passed.
+
+        The flusher thread and a /metrics scrape can flush at the same time, so
+        each writer gets its own temporary file; ``os.replace`` then publishes
+        one complete snapshot or the other, never a mix.
+        """
+        if not self.directory or (not force and time.monotonic() - self._last_flush < self.flush_interval):
+            return
+        self._last_flush = time.monotonic()
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(prefix=f"metrics-{os.getpid()}.", suffix=".tmp", dir=self.directory)
+            with open(fd, "w", encoding="utf-8") as fh:
+                json.dump(self._snapshot(), fh)
+            os.replace(tmp, path)
+        except OSError as exc:
+            print(f"[METRICS] Could not write snapshot: {exc}")
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+
+    def _snapshots(self) -> list[dict]:
+        if not self.directory:
+            return [self._snapshot()]
+        self.flush(force=True)
+        snapshots = []
+        for entry in os.listdir(self.directory):
+            if not (entry.startswith("metrics-") and entry.endswith(".json")):
+                continue
+            path = os.path.join(self.directory, entry)
+            try:
+                pid = int(entry[len("metrics-"):-len(".json")])
+            except ValueError:
+                continue
+            if not _pid_alive(pid):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path, encoding="utf-8") as fh:
+                    snapshots.append(json.load(fh))
+            except (OSError, ValueError):
+                continue  # being replaced right now; it will be there next scrape
+        return snapshots
+
+    def render(self) -> str:
+        counters: dict[tuple, float] = {}
+        gauges: dict[tuple, float] = {}
+        histograms: dict[tuple, list] = {}
+        for snap in self._snapshots():
+            for name, labels, value in snap["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0.0) + value
+            for name, labels, value in snap["gauges"]:
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0.0) + value
+            for name, labels, bucket_counts, total, count in snap["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.get(key)
+                if merged is None or len(merged[0]) != len(bucket_counts):
+                    histograms[key] = [list(bucket_counts), total, count]
+                else:
+                    merged[0] = [a + b for a, b in zip(merged[0], bucket_counts)]
+                    merged[1] += total
+                    merged[2] += count
+
+        lines: list[str] = []
+        families: dict[str, list[str]] = {}
+        kinds = {name: "histogram" for name, _ in histograms}
+        for (name, labels), value in sorted(counters.items()):
+            families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), value in sorted(gauges.items()):
+            families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+            buckets = self._meta.get(name, ("histogram", "", DEFAULT_BUCKETS))[2]
+            series = families.setdefault(name, [])
+            cumulative = 0
+            for bound, n in zip(buckets, bucket_counts):
+                cumulative += n
+                series.append(f"{name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {cumulative}")
+            series.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {count}")
+            series.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            series.append(f"{name}_count{_format_labels(labels)} {count}")
+        for name in sorted(families):
+            kind, help_text, _ = self._meta.get(name, (kinds.get(name, "untyped"), "", ()))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(families[name])
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,145 @@
+"""Opt-in per-request profiling.
+
+``RequestProfiler`` wraps one request in either cProfile (exact call counts,
+saved as ``.pstats`` for ``python -m pstats`` or snakeviz) or a stack
+sampler that reads the request thread's frames every few milliseconds from a
+helper thread (low overhead, saved as collapsed stacks for flamegraph.pl or
+speedscope). Profiles land in one directory and only the newest ``keep``
+files are retained.
+"""
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+MODES = ("cprofile", "sample")
+EXTENSIONS = {"cprofile": ".pstats", "sample": ".folded"}
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class _StackSampler:
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+
+class ActiveProfile:
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.profile: Optional[cProfile.Profile] = None
+        self.sampler: Optional[_StackSampler] = None
+
+
+class RequestProfiler:
+    def __init__(self, directory: str, sample_interval: float = 0.005, keep: int = 200):
+        self.directory = directory
+        self.sample_interval = sample_interval
+        self.keep = keep
+        # cProfile hooks the interpreter, so only one request is traced that way at a time.
+        self._cprofile_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self, mode: str) -> Optional[ActiveProfile]:
+        """Begin profiling the calling thread; None when cProfile is already busy."""
+        active = ActiveProfile(mode)
+        if mode == "cprofile":
+            if not self._cprofile_lock.acquire(blocking=False):
+                return None
+            active.profile = cProfile.Profile()
+            active.profile.enable()
+        else:
+            active.sampler = _StackSampler(threading.get_ident(), self.sample_interval)
+            active.sampler.start()
+        return active
+
+    def stop(self, active: ActiveProfile) -> float:
+        """Stop collecting; returns the profiled wall time in seconds."""
+        elapsed = time.perf_counter() - active.started
+        if active.profile is not None:
+            active.profile.disable()
+            self._cprofile_lock.release()
+        if active.sampler is not None:
+            active.sampler.stop()
+        return elapsed
+
+    def save(self, active: ActiveProfile, label: str, elapsed: float) -> Optional[str]:
+        """Write a stopped profile and prune old ones; returns the file name.
+
+        Requests shorter than one sampling interval leave nothing to save.
+        """
+        if active.sampler is not None and not active.sampler.counts:
+            return None
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        name = f"{stamp}-{os.getpid()}-{_UNSAFE.sub('_', label)}-{elapsed * 1000:.0f}ms{EXTENSIONS[active.mode]}"
+        path = os.path.join(self.directory, name)
+        try:
+            if active.profile is not None:
+                active.profile.dump_stats(path)
+            elif active.sampler is not None:
+                with open(path, "w", encoding="utf-8") as fh:
+                    for stack, count in sorted(active.sampler.counts.items()):
+                        fh.write(f"{stack} {count}\n")
+            self._prune()
+        except OSError as exc:
+            print(f"[PROFILE] Could not save profile: {exc}")
+            return None
+        return name
+
+    def _prune(self) -> None:
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(tuple(EXTENSIONS.values())))
+        for name in names[: max(0, len(names) - self.keep)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def list_profiles(self) -> list[dict]:
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            mode = next((m for m, ext in EXTENSIONS.items() if name.endswith(ext)), None)
+            if mode is None:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            stamp, pid, rest = name.split("-", 2)
+            label, _, duration = rest[: -len(EXTENSIONS[mode])].rpartition("-")
+            profiles.append({
+                "name": name,
+                "mode": mode,
+                "label": label,
+                "pid": int(pid) if pid.isdigit() else None,
+                "duration_ms": int(duration[:-2]) if duration.endswith("ms") and duration[:-2].isdigit() else None,
+                "created_at": datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+                "bytes": stat.st_size,
+            })
+        return profiles
@@ -0,0 +1,113 @@
+"""Token-bucket throttling for the authentication routes.
+
+Each key (e.g. ``login:ip:203.0.113.7``) owns a bucket that holds up to
+``limit`` tokens and refills at ``limit`` tokens per ``period`` seconds. The
+in-memory limiter shards its buckets across independent locks so concurrent
+threads rarely contend; the SQLite limiter keeps buckets in a small shared
+database so every gunicorn worker sees the same counts.
+"""
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+
+def _refill(tokens: float, updated_at: float, now: float, limit: int, period: float) -> float:
+    return min(float(limit), tokens + (now - updated_at) * limit / period)
+
+
+class TokenBucketLimiter:
+    """Per-process limiter with buckets spread over ``shards`` locks."""
+
+    def __init__(self, period: float = 60.0, shards: int = 16, max_keys_per_shard: int = 10_000):
+        self.period = period
+        self.max_keys_per_shard = max_keys_per_shard
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(max(1, shards))]
+
+    def _shard(self, key: str):
+        return self._shards[zlib.crc32(key.encode("utf-8")) % len(self._shards)]
+
+    def allow(self, key: str, limit: int) -> bool:
+        if limit <= 0:
+            return True
+        now = time.monotonic()
+        lock, buckets = self._shard(key)
+        with lock:
+            tokens, updated_at = buckets.get(key, (float(limit), now))
+            tokens = _refill(tokens, updated_at, now, limit, self.period)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            buckets[key] = (tokens, now)
+            buckets.move_to_end(key)
+            # Least recently touched keys are the oldest and (nearly) full again.
+            while len(buckets) > self.max_keys_per_shard:
+                buckets.popitem(last=False)
+        return allowed
+
+
+class SQLiteTokenBucketLimiter:
+    """Limiter whose buckets live in a SQLite file shared by all workers.
+
+    Errors fail open: throttling is a capacity guard, not an auth check, so a
+    locked or missing database must not lock users out.
+    """
+
+    def __init__(self, db_path: str, period: float = 60.0):
+        self.db_path = db_path
+        self.period = period
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets ("
+                " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def allow(self, key: str, limit: int) -> bool:
+        if limit <= 0:
+            return True
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+                tokens = _refill(row[0], row[1], now, limit, self.period) if row else float(limit)
+                allowed = tokens >= 1.0
+                if allowed:
+                    tokens -= 1.0
+                conn.execute(
+                    "INSERT INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                    (key, tokens, now),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return allowed
+        except sqlite3.Error as exc:
+            print(f"[RATELIMIT] Shared limiter unavailable, allowing request: {exc}")
+            return True
+
+    def purge(self, older_than: float = 3600.0) -> int:
+        """Drop buckets untouched for ``older_than`` seconds (they would be full anyway)."""
+        try:
+            cur = self._connection().execute("DELETE FROM rate_buckets WHERE updated_at < ?", (time.time() - older_than,))
+            return cur.rowcount
+        except sqlite3.Error as exc:
+            print(f"[RATELIMIT] Could not purge buckets: {exc}")
+            return 0
@@ -0,0 +1,42 @@
+"""Startup phase timings.
+
+``create_app`` marks the end of each phase (imports, config, database setup,
+hash calibration, ...) on a ``StartupTimer``; the result is logged once and
+served by ``/internal/startup``. Under gunicorn with ``preload_app`` those
+phases run once in the master and every worker then adds only its own
+``worker_boot`` phase.
+"""
+import os
+import time
+from typing import Optional
+
+
+class StartupTimer:
+    def __init__(self, started: Optional[float] = None):
+        self.pid = os.getpid()
+        self.phases: dict[str, float] = {}
+        self._last = started if started is not None else time.perf_counter()
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def mark(self, phase: str) -> None:
+        """Charge the time since the previous mark to ``phase``."""
+        now = time.perf_counter()
+        self.add(phase, now - self._last)
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    def summary(self) -> str:
+        parts = [f"{phase}={seconds * 1000:.0f}ms" for phase, seconds in self.phases.items()]
+        return " ".join(parts + [f"total={self.total * 1000:.0f}ms"])
+
+    def as_dict(self) -> dict:
+        return {
+            "pid": self.pid,
+            "phases_ms": {phase: round(seconds * 1000, 1) for phase, seconds in self.phases.items()},
+            "total_ms": round(self.total * 1000, 1),
+        }
@@ -0,0 +1,77 @@
+"""Shared fixtures: create_app() on throwaway SQLite files, with query budgets enforced.
+
+``QUERY_BUDGET_ENFORCE`` is on for every app built here, so a view that runs
+more statements than its ``@query_budget`` raises ``QueryBudgetExceeded``
+from the offending execute() and the test fails with the statement summary.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+import fixtures  # noqa: E402
+
+PASSWORD = "Secret-pass-1"
+
+
+def isolated_env(directory) -> dict:
+    """Environment for a fast app whose databases and output files all live in ``directory``."""
+    return {
+        **fixtures.isolated_env(directory),
+        "SECRET_KEY": "test-secret",
+        "HASH_METHOD": "pbkdf2:sha256:1000",
+        "HASH_POOL_WORKERS": "0",
+        "JOB_WORKERS": "0",
+        "MAINTENANCE_INTERVAL_MINUTES": "0",
+        "RATE_LIMIT_BACKEND": "off",
+        "SMTP_HOST": "",
+        "PUBLIC_BASE_URL": "http://testserver",
+        "QUERY_BUDGET_ENFORCE": "true",
+    }
+
+
+@pytest.fixture
+def app_env(tmp_path, monkeypatch):
+    """The environment ``app`` is built from; tests may override entries before using ``app``."""
+    env = isolated_env(str(tmp_path))
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return env
+
+
+@pytest.fixture
+def app(app_env):
+    from app import create_app
+
+    app = create_app()
+    app.config["TESTING"] = True  # let QueryBudgetExceeded propagate instead of becoming a 500
+    assert app.config["QUERY_BUDGET_ENFORCE"]
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    """A registered user with the demo deliveries, as ``fetch_user_by_email`` returns it."""
+    from app import create_user, ensure_demo_deliveries_for_user, fetch_user_by_email
+
+    ok, error = create_user(app, "Test Driver", "driver@example.com", PASSWORD)
+    assert ok, error
+    user = fetch_user_by_email(app, "driver@example.com")
+    ensure_demo_deliveries_for_user(app, user["id"])
+    return user
+
+
+@pytest.fixture
+def logged_in(client, user):
+    response = client.post("/login", data={"email": user["email"], "password": PASSWORD})
+    assert response.status_code == 302
+    return client
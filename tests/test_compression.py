@@ -0,0 +1,78 @@
+"""Gzip of streamed responses: chunks arrive intact and the wrapped body is always closed."""
+import gzip
+
+import pytest
+from flask import Response
+from werkzeug.test import EnvironBuilder
+
+from compression import gzip_stream
+
+GZIP = {"Accept-Encoding": "gzip"}
+CHUNKS = ["first line\n", "", "second line\n", "third line\n"]
+
+
+@pytest.fixture
+def stream_events(app):
+    """Registers /stream, a streamed text/plain view; returns what its body went through."""
+    events = []
+
+    class Body:
+        # An iterable with close(), like a cursor-backed body; an unstarted generator's
+        # finally would not run on close() at all, wrapped or not.
+        def __iter__(self):
+            for chunk in CHUNKS:
+                events.append("yield")
+                yield chunk
+
+        def close(self):
+            events.append("closed")
+
+    app.add_url_rule("/stream", "stream", lambda: Response(Body(), mimetype="text/plain"))
+    return events
+
+
+def compressed_responses(app) -> list[str]:
+    from app import get_metrics
+
+    return [line for line in get_metrics(app).render().splitlines()
+            if line.startswith("app_compressed_responses_total") and 'endpoint="stream"' in line]
+
+
+def test_streamed_body_is_gzipped_chunk_by_chunk(app, client, stream_events):
+    response = client.get("/stream", headers=GZIP)
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert gzip.decompress(response.get_data()).decode() == "".join(CHUNKS)
+    response.close()
+    assert stream_events == ["yield"] * len(CHUNKS) + ["closed"]
+    assert compressed_responses(app)
+
+
+def test_stream_closed_before_first_chunk_still_cleans_up(app, stream_events):
+    # Called as a server would: the test client always pulls one chunk before returning.
+    started = []
+    environ = EnvironBuilder(path="/stream", headers=GZIP).get_environ()
+    body = app(environ, lambda status, headers, exc_info=None: started.append(dict(headers)))
+    assert started[0]["Content-Encoding"] == "gzip"
+    body.close()  # the client went away before the server sent anything
+    assert stream_events == ["closed"]
+    assert compressed_responses(app)
+
+
+def test_close_reports_once_without_iterating():
+    closed, reports = [], []
+
+    class Body:
+        def __iter__(self):
+            raise AssertionError("never iterated")
+
+        def close(self):
+            closed.append(True)
+
+    stream = gzip_stream(Body(), 6, lambda *counts: reports.append(counts))
+    stream.close()
+    stream.close()
+    assert closed == [True]
+    assert reports == [(0, 0, 0.0)]
+    assert list(stream) == []
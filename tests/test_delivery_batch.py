@@ -0,0 +1,91 @@
+"""POST /deliveries/batch: one transaction, per-operation errors, nothing applied on failure."""
+import pytest
+
+from conftest import PASSWORD
+from test_query_budgets import delivery_ids
+
+
+@pytest.fixture
+def foreign_id(app):
+    """A delivery that belongs to another user."""
+    from app import create_user, ensure_demo_deliveries_for_user, fetch_user_by_email
+
+    ok, error = create_user(app, "Other Driver", "other@example.com", PASSWORD)
+    assert ok, error
+    other = fetch_user_by_email(app, "other@example.com")
+    ensure_demo_deliveries_for_user(app, other["id"])
+    client = app.test_client()
+    client.post("/login", data={"email": "other@example.com", "password": PASSWORD})
+    return delivery_ids(client)[0]
+
+
+def batch(client, *operations):
+    return client.post("/deliveries/batch", json={"operations": list(operations)})
+
+
+def statuses(client) -> dict[int, str]:
+    from app import fetch_delivery
+
+    app = client.application
+    with client.session_transaction() as session:
+        user_id = session["user_id"]
+    return {i: fetch_delivery(app, user_id, i)["status"] for i in delivery_ids(client)}
+
+
+def test_missing_and_foreign_ids_fail_the_whole_batch(logged_in, foreign_id):
+    own = delivery_ids(logged_in)
+    before = statuses(logged_in)
+    response = batch(
+        logged_in,
+        {"op": "add", "tracking_number": "NEW-1", "amount_due": 100},
+        {"op": "status", "id": own[0], "status": "not_located"},
+        {"op": "status", "id": foreign_id, "status": "delivered"},
+        {"op": "delete", "id": 99999},
+        {"op": "undo", "id": foreign_id},
+    )
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body["ok"] is False
+    assert [(r["index"], r["ok"]) for r in body["results"]] == [(2, False), (3, False), (4, False)]
+    assert all(r["error"] == "Delivery not found." for r in body["results"])
+    assert statuses(logged_in) == before  # the add and the valid status change were rolled back
+
+
+def test_batch_applies_in_order_and_reports_changes(logged_in):
+    own = delivery_ids(logged_in)
+    response = batch(
+        logged_in,
+        {"op": "add", "ref": "local-1", "tracking_number": "NEW-1", "amount_due": 2500},
+        {"op": "status", "ref": "local-1", "status": "delivered"},
+        {"op": "status", "ref": "local-1", "status": "delivered"},
+        {"op": "delete", "id": own[0]},
+        {"op": "undo", "id": own[0]},
+        {"op": "undo", "id": own[0]},
+    )
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    added = results[0]["id"]
+    assert [r["id"] for r in results] == [added, added, added, own[0], own[0], own[0]]
+    assert [r["changed"] for r in results] == [True, True, False, True, True, False]
+    assert results[1]["ref"] == "local-1"
+    assert statuses(logged_in)[added] == "delivered"
+    assert own[0] in delivery_ids(logged_in)
+
+
+def test_invalid_operation_applies_nothing(logged_in):
+    before = statuses(logged_in)
+    response = batch(
+        logged_in,
+        {"op": "add", "tracking_number": "NEW-1", "amount_due": 100},
+        {"op": "status", "ref": "unknown", "status": "delivered"},
+        {"op": "status", "id": delivery_ids(logged_in)[0], "status": "lost"},
+    )
+    assert response.status_code == 400
+    assert [r["index"] for r in response.get_json()["results"]] == [1, 2]
+    assert statuses(logged_in) == before
+
+
+def test_batch_size_is_capped(app, logged_in):
+    app.config["BATCH_MAX_OPERATIONS"] = 2
+    operations = [{"op": "delete", "id": 1}] * 3
+    assert batch(logged_in, *operations).status_code == 413
@@ -0,0 +1,66 @@
+"""Remember-me device tokens: rotation on use, the grace window, revocation."""
+import pytest
+
+from conftest import PASSWORD
+
+COOKIE = "remember_token"
+
+
+@pytest.fixture
+def remembered(client, user) -> str:
+    """The device token a "Keep me signed in" login sets."""
+    response = client.post("/login", data={"email": user["email"], "password": PASSWORD, "remember": "1"})
+    assert response.status_code == 302
+    return client.get_cookie(COOKIE).value
+
+
+def returning_device(app, token: str):
+    """A browser whose session cookie expired but that still holds ``token``."""
+    client = app.test_client()
+    client.set_cookie(COOKIE, token)
+    return client
+
+
+def test_token_logs_in_and_rotates(app, remembered):
+    client = returning_device(app, remembered)
+    assert client.get("/dashboard").status_code == 200
+    rotated = client.get_cookie(COOKIE).value
+    assert rotated != remembered
+    assert returning_device(app, rotated).get("/dashboard").status_code == 200
+
+
+def test_replaced_token_works_once_more_within_grace_without_rotating(app, remembered):
+    returning_device(app, remembered).get("/dashboard")
+    racing_tab = returning_device(app, remembered)
+    assert racing_tab.get("/dashboard").status_code == 200
+    assert racing_tab.get_cookie(COOKIE).value == remembered  # only the first use rotates
+
+
+def test_replaced_token_stops_working_after_grace(app, remembered):
+    app.config["REMEMBER_ROTATION_GRACE_SECONDS"] = 0
+    returning_device(app, remembered).get("/dashboard")
+    late = returning_device(app, remembered)
+    response = late.get("/dashboard")
+    assert response.status_code == 302 and "/login" in response.headers["Location"]
+    assert late.get_cookie(COOKIE) is None  # the dead cookie is cleared
+
+
+def test_unknown_token_is_cleared(app, user):
+    client = returning_device(app, "not-a-real-token")
+    assert client.get("/dashboard").status_code == 302
+    assert client.get_cookie(COOKIE) is None
+
+
+def test_logout_revokes_the_device(app, client, remembered):
+    client.get("/logout")
+    assert client.get_cookie(COOKIE) is None
+    assert returning_device(app, remembered).get("/dashboard").status_code == 302
+
+
+def test_expired_token_is_rejected(app, remembered):
+    from app import get_db_connection
+
+    with get_db_connection(app) as conn:
+        conn.execute("UPDATE device_tokens SET expires_at = '2000-01-01T00:00:00+00:00'")
+        conn.commit()
+    assert returning_device(app, remembered).get("/dashboard").status_code == 302
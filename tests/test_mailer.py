@@ -0,0 +1,49 @@
+"""SMTPTransport gives up on a batch after one failed connection."""
+import smtplib
+
+from mailer import SMTPTransport
+
+
+def message(i: int) -> dict:
+    return {"recipient": f"user{i}@example.com", "subject": "Reset", "body": "link"}
+
+
+def test_unreachable_server_fails_the_batch_after_one_attempt(monkeypatch):
+    transport = SMTPTransport("mail.invalid")
+    attempts = []
+
+    def refuse():
+        attempts.append(1)
+        raise ConnectionRefusedError(111, "Connection refused")
+
+    monkeypatch.setattr(transport, "_connect", refuse)
+    results = transport.send_batch([message(i) for i in range(50)])
+    assert len(attempts) == 1
+    assert results == ["[Errno 111] Connection refused"] * 50
+
+
+def test_connect_failure_after_a_drop_keeps_earlier_results(monkeypatch):
+    transport = SMTPTransport("mail.invalid")
+    sent = []
+
+    class Connection:
+        def send_message(self, email):
+            if len(sent) == 2:
+                raise smtplib.SMTPServerDisconnected("gone")
+            sent.append(email["To"])
+
+        def quit(self):
+            pass
+
+    connections = [Connection()]
+
+    def connect():
+        if not connections:
+            raise smtplib.SMTPConnectError(421, "try later")
+        return connections.pop()
+
+    monkeypatch.setattr(transport, "_connect", connect)
+    results = transport.send_batch([message(i) for i in range(5)])
+    assert sent == ["user0@example.com", "user1@example.com"]
+    assert results[:2] == [None, None]
+    assert len(results) == 5 and all(results[2:]) and len(set(results[2:])) == 1
@@ -0,0 +1,31 @@
+"""Snapshots written by concurrent flushes stay readable."""
+import json
+import os
+import threading
+
+from metrics import MetricsRegistry
+
+
+def test_concurrent_flushes_publish_whole_snapshots(tmp_path):
+    registry = MetricsRegistry(str(tmp_path))
+    for i in range(200):
+        registry.inc("app_test_total", route=f"/r{i}")
+    errors = []
+
+    def flush_and_read():
+        for _ in range(50):
+            registry.flush(force=True)
+            try:
+                with open(tmp_path / f"metrics-{os.getpid()}.json", encoding="utf-8") as fh:
+                    assert len(json.load(fh)["counters"]) == 200
+            except (ValueError, AssertionError) as exc:
+                errors.append(exc)
+
+    threads = [threading.Thread(target=flush_and_read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.listdir(tmp_path) == [f"metrics-{os.getpid()}.json"]  # no temporary files left behind
+    assert 'app_test_total{route="/r7"} 1' in registry.render()
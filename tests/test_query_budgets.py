@@ -0,0 +1,77 @@
+"""Drive every view that declares a @query_budget with enforcement on (see conftest.py)."""
+import re
+
+import pytest
+
+from conftest import PASSWORD
+from dbtrace import QueryBudgetExceeded
+
+JSON = {"Accept": "application/json"}
+
+
+def delivery_ids(client) -> list[int]:
+    page = client.get("/deliveries")
+    assert page.status_code == 200
+    return [int(i) for i in re.findall(r'data-delivery-id="(\d+)"', page.get_data(as_text=True))]
+
+
+def test_going_over_budget_fails(app, logged_in, monkeypatch):
+    monkeypatch.setattr(app.view_functions["deliveries_page"], "query_budget", 0)
+    with pytest.raises(QueryBudgetExceeded):
+        logged_in.get("/deliveries")
+
+
+def test_register_and_login_stay_within_budget(client):
+    response = client.post("/register", data={
+        "full_name": "New Driver",
+        "email": "new@example.com",
+        "password": PASSWORD,
+        "confirm_password": PASSWORD,
+    })
+    assert response.status_code == 302
+    response = client.post("/login", data={"email": "new@example.com", "password": PASSWORD, "remember": "1"})
+    assert response.status_code == 302
+
+
+def test_pages_stay_within_budget(logged_in):
+    assert logged_in.get("/dashboard").status_code == 200
+    assert len(delivery_ids(logged_in)) == 3
+
+
+def test_delivery_mutations_stay_within_budget(logged_in):
+    response = logged_in.post("/deliveries/add", data={"tracking_number": "1Z999", "amount_due": "1250"})
+    assert response.status_code == 302
+    ids = delivery_ids(logged_in)
+    assert len(ids) == 4
+    target = ids[0]
+
+    response = logged_in.post("/deliveries/status", data={"delivery_id": target, "status": "delivered"}, headers=JSON)
+    assert response.status_code == 200
+    assert response.get_json()["delivery"] == {"id": target, "status": "delivered", "deleted": False}
+    response = logged_in.post("/deliveries/delete", data={"delivery_id": target}, headers=JSON)
+    assert response.get_json()["delivery"]["deleted"] is True
+    response = logged_in.post("/deliveries/undo-delete", data={"delivery_id": target}, headers=JSON)
+    assert response.get_json()["delivery"]["deleted"] is False
+    # The redirect flow runs the same helpers without the read-back.
+    assert logged_in.post("/deliveries/status", data={"delivery_id": target, "status": "pending"}).status_code == 302
+
+
+def test_unknown_delivery_is_not_found(logged_in):
+    for path in ("/deliveries/status", "/deliveries/delete", "/deliveries/undo-delete"):
+        response = logged_in.post(path, data={"delivery_id": 10_000, "status": "delivered"}, headers=JSON)
+        assert response.status_code == 404, path
+
+
+def test_remembered_session_stays_within_budget(app, client, user):
+    client.post("/login", data={"email": user["email"], "password": PASSWORD, "remember": "1"})
+    remember = client.get_cookie(app.config["REMEMBER_COOKIE_NAME"])
+    assert remember is not None
+    fresh = app.test_client()  # no session cookie: the dashboard restores it from the token
+    fresh.set_cookie(remember.key, remember.value)
+    assert fresh.get("/dashboard").status_code == 200
+
+
+def test_logout_and_forgot_stay_within_budget(logged_in, user):
+    assert logged_in.get("/logout").status_code == 302
+    assert logged_in.get("/forgot").status_code == 200
+    assert logged_in.post("/forgot", data={"email": user["email"]}).status_code == 302
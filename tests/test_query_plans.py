@@ -0,0 +1,363 @@
+"""Query-plan regression check for the SQL the app actually runs.
+
+Seeds a throwaway database with synthetic data (and fresh ANALYZE
+statistics), drives one session through the app with the test client -
+register, login, dashboard, deliveries, add/status/delete/undo, batch sync,
+forgot and reset password, logout - plus the background jobs, outbox,
+webhooks and maintenance, and captures every statement: dbtrace's
+capture_statements for the app database, sqlite3 trace callbacks for the job
+queue and rate-limit stores. Each distinct statement is then EXPLAINed
+(EXPLAIN QUERY PLAN on SQLite, EXPLAIN on MySQL) with the parameters it ran
+with.
+
+    python -m pytest -q tests/test_query_plans.py
+    QUERY_PLANS_BACKEND=mysql python -m pytest -q tests/test_query_plans.py
+
+The tests fail when a statement cannot be EXPLAINed, scans a whole large
+table, or is a hot path in HOT_PATHS that does not use one of its expected
+indexes or needs a temporary B-tree / filesort to order or group its rows.
+The MySQL run uses MYSQL_HOST/PORT/USER/PASSWORD and drops and recreates
+QUERY_PLANS_MYSQL_DATABASE (default ``delivery_plancheck``), so point it at
+a database used for nothing else.
+"""
+import contextlib
+import io
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import NamedTuple, Optional
+
+import pytest
+
+from conftest import isolated_env
+
+BACKEND = os.getenv("QUERY_PLANS_BACKEND", "sqlite").lower()
+USERS = 50
+DELIVERIES_PER_USER = 1000
+PASSWORD = "plan-check-pass"
+EMAIL_DOMAIN = "plans.test"
+
+# Tables that grow with usage: a full scan of one of these is a failure...
+LARGE_TABLES = (
+    "deliveries", "users", "device_tokens", "password_resets",
+    "email_outbox", "webhook_outbox", "jobs", "rate_buckets",
+)
+# ...except in these statements. They run in the background and delete what
+# they match, so the rows they scan past are only the ones still live (the
+# webhook outbox only holds events not delivered yet).
+ALLOWED_SCANS = (
+    r"^DELETE FROM password_resets WHERE id IN \(SELECT id FROM password_resets WHERE used_at IS NOT NULL OR expires_at < \?",
+    r"^DELETE FROM device_tokens WHERE id IN \(SELECT id FROM device_tokens WHERE revoked_at IS NOT NULL OR expires_at < \?",
+    r"^DELETE FROM webhook_outbox WHERE id IN \(SELECT id FROM webhook_outbox WHERE status = \? AND next_attempt_at < \?",
+    r"^DELETE FROM rate_buckets WHERE updated_at < \?",
+)
+
+
+class HotPath(NamedTuple):
+    name: str
+    pattern: str  # regex searched in the normalized statement
+    indexes: tuple[str, ...]  # any of these satisfies the check
+    ordered: bool = True  # must not need a temp B-tree / filesort
+
+
+HOT_PATHS = [
+    HotPath(
+        "fetch_deliveries_list",
+        r"FROM deliveries WHERE user_id = \? AND deleted_at IS NULL ORDER BY created_at",
+        ("idx_deliveries_user_active",),
+    ),
+    HotPath(
+        "fetch_delivery_counts",
+        r"SELECT COUNT\(\*\) FROM deliveries WHERE user_id = \? AND status = \?",
+        ("idx_deliveries_user_status",),
+    ),
+    HotPath(
+        "fetch_deliveries_for_map",
+        r"FROM deliveries WHERE user_id = \? AND latitude IS NOT NULL",
+        ("idx_deliveries_user_active", "idx_deliveries_user_status"),
+    ),
+    HotPath("fetch_user_by_email", r"FROM users WHERE email = \?", ("sqlite_autoindex_users_1", "email")),
+    HotPath(
+        "fetch_password_reset_by_token",
+        r"FROM password_resets WHERE token = \?",
+        ("sqlite_autoindex_password_resets_1", "token"),
+    ),
+    # The claims sort only the due rows their two index searches return.
+    HotPath(
+        "claim_outbox_batch",
+        r"SELECT id FROM email_outbox WHERE \(status = \?",
+        ("idx_email_outbox_due",),
+        ordered=False,
+    ),
+    HotPath(
+        "claim_webhook_batch",
+        r"SELECT id FROM webhook_outbox WHERE \(endpoint = \?",
+        ("idx_webhook_outbox_due",),
+        ordered=False,
+    ),
+    HotPath("JobQueue claim", r"FROM jobs WHERE \(status = \? AND run_at <= \?\)", ("idx_jobs_status_run_at",), ordered=False),
+    HotPath("rate_bucket_lookup", r"FROM rate_buckets WHERE key = \?", ("PRIMARY KEY", "sqlite_autoindex_rate_buckets_1")),
+]
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?")
+_TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN|UPDATE)\s+(\w+)(?:\s+(?:AS\s+)?(?!WHERE|SET|JOIN|ON|ORDER|GROUP|LIMIT|LEFT|INNER)(\w+))?", re.IGNORECASE)
+_SQLITE_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\w+)|USING (?:INTEGER )?PRIMARY KEY")
+_EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "WITH", "INSERT INTO")
+
+
+class Plan(NamedTuple):
+    store: str  # "app", or the SQLite side store the statement ran against
+    sql: str
+    lines: list[str]
+    failures: list[str]
+    hot_path: Optional[str]
+
+
+def _explainable(sql: str) -> bool:
+    head = sql.lstrip().upper()
+    if head.startswith("INSERT INTO"):
+        return " SELECT " in head  # plain VALUES inserts have no access path to check
+    return head.startswith(_EXPLAINABLE)
+
+
+def _tables(sql: str) -> dict[str, str]:
+    """Map every table name and alias in ``sql`` to the table it refers to."""
+    tables = {}
+    for table, alias in _TABLE_ALIAS.findall(sql):
+        tables[table] = table
+        if alias:
+            tables[alias] = table
+    return tables
+
+
+def _hot_path(normalized: str) -> Optional[HotPath]:
+    return next((hot for hot in HOT_PATHS if re.search(hot.pattern, normalized)), None)
+
+
+def explain_sqlite(conn, sql: str, params, hot: Optional[HotPath], scans_allowed: bool) -> tuple[list[str], list[str]]:
+    cur = conn.cursor()
+    cur.execute(f"EXPLAIN QUERY PLAN {sql}", params or ())
+    details = [row[3] for row in cur.fetchall()]
+    cur.close()
+    tables = _tables(sql)
+    failures = []
+    for detail in details:
+        scan = _SQLITE_SCAN.match(detail)
+        table = tables.get(scan.group(1), scan.group(1)) if scan else None
+        if table in LARGE_TABLES and not scans_allowed:
+            failures.append(f"full scan of {table}: {detail}")
+    if hot is not None:
+        used = {m.group(1) or "PRIMARY KEY" for d in details for m in _SQLITE_INDEX.finditer(d)}
+        if not used & set(hot.indexes):
+            failures.append(f"{hot.name} should use {' or '.join(hot.indexes)}, uses {', '.join(sorted(used)) or 'no index'}")
+        if hot.ordered and any("TEMP B-TREE" in d for d in details):
+            failures.append(f"{hot.name} sorts in a temp B-tree")
+    return details, failures
+
+
+def explain_mysql(conn, sql: str, params, hot: Optional[HotPath], scans_allowed: bool) -> tuple[list[str], list[str]]:
+    cur = conn.cursor(dictionary=True)
+    cur.execute(f"EXPLAIN {sql}", params)
+    rows = cur.fetchall()
+    cur.close()
+    details = [
+        f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} extra={row.get('Extra') or ''}"
+        for row in rows
+    ]
+    tables = _tables(sql)
+    failures = []
+    for row in rows:
+        table = tables.get(row["table"], row["table"])
+        if table in LARGE_TABLES and row["type"] in ("ALL", "index") and not scans_allowed:
+            failures.append(f"full scan of {table} (type={row['type']})")
+    if hot is not None:
+        keys = {row["key"] for row in rows if row["key"]}
+        if not keys & set(hot.indexes):
+            failures.append(f"{hot.name} should use {' or '.join(hot.indexes)}, uses {', '.join(sorted(keys)) or 'no index'}")
+        extra = " ".join(row.get("Extra") or "" for row in rows)
+        if hot.ordered and ("filesort" in extra or "temporary" in extra):
+            failures.append(f"{hot.name} needs {extra.strip()}")
+    return details, failures
+
+
+class _WebhookReceiver(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@contextlib.contextmanager
+def webhook_endpoints():
+    """(accepting, refusing) endpoint URLs, so both mark_delivered and mark_failed run."""
+    server = HTTPServer(("127.0.0.1", 0), _WebhookReceiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    refusing = HTTPServer(("127.0.0.1", 0), _WebhookReceiver)
+    refused_port = refusing.server_address[1]
+    refusing.server_close()  # nothing listens there any more
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/hook", f"http://127.0.0.1:{refused_port}/hook"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run_session(app, email: str) -> None:
+    """Exercise every route and background path that talks to a database once."""
+    import app as app_module
+
+    client = app.test_client()
+    client.post("/register", data={
+        "full_name": "Plan Check",
+        "email": "plan-check@example.com",
+        "password": PASSWORD,
+        "confirm_password": PASSWORD,
+    })
+    client.post("/login", data={"email": email, "password": PASSWORD, "remember": "1"})
+    client.get("/dashboard")
+    client.get("/deliveries")
+    client.get("/routes")
+    client.get("/settings")
+    json_headers = {"Accept": "application/json"}
+    delivery_id = app_module.fetch_deliveries_list(app, app_module.fetch_user_by_email(app, email)["id"])[0]["id"]
+    client.post("/deliveries/add", data={"tracking_number": "1ZPLAN", "amount_due": "1500"})
+    client.post("/deliveries/status", data={"delivery_id": delivery_id, "status": "delivered"}, headers=json_headers)
+    client.post("/deliveries/delete", data={"delivery_id": delivery_id}, headers=json_headers)
+    client.post("/deliveries/undo-delete", data={"delivery_id": delivery_id}, headers=json_headers)
+    client.post("/deliveries/batch", json={"operations": [
+        {"op": "add", "ref": "a", "tracking_number": "1ZPLANB", "amount_due": 0},
+        {"op": "status", "ref": "a", "status": "not_located"},
+        {"op": "delete", "id": delivery_id},
+    ]})
+    # A fresh client exercises the remember-me cookie path.
+    remembered = app.test_client()
+    token = client.get_cookie(app.config["REMEMBER_COOKIE_NAME"])
+    if token is not None:
+        remembered.set_cookie(token.key, token.value)
+        remembered.get("/dashboard")
+    client.get("/logout")
+    client.post("/forgot", data={"email": email})
+
+    app_module.get_job_queue(app).run_pending()  # sends the reset mail queued by /forgot
+    app_module.get_outbox_sender(app).drain()
+    dispatcher = app_module.get_webhook_dispatcher(app)
+    for endpoint in app.config["WEBHOOK_URLS"]:
+        dispatcher.deliver(endpoint)
+
+    user_id = app_module.fetch_user_by_email(app, email)["id"]
+    reset_token, _ = app_module.create_password_reset_token(app, user_id)
+    client.get(f"/reset/{reset_token}")
+    client.post(f"/reset/{reset_token}", data={"password": PASSWORD, "confirm_password": PASSWORD})
+
+    # optimize=False: re-ANALYZE on these nearly empty side tables would make scans look cheapest.
+    app_module.run_maintenance(app, undo_window_hours=0, optimize=False)
+
+
+def _mysql_env(database: str) -> dict:
+    import mysql.connector
+
+    try:
+        conn = mysql.connector.connect(
+            host=os.getenv("MYSQL_HOST", "127.0.0.1"),
+            port=int(os.getenv("MYSQL_PORT", "3306")),
+            user=os.getenv("MYSQL_USER", "root"),
+            password=os.getenv("MYSQL_PASSWORD", ""),
+            connection_timeout=3,
+        )
+    except mysql.connector.Error as exc:
+        pytest.skip(f"MySQL is not available ({exc})")
+    with conn.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    conn.close()
+    return {"DB_BACKEND": "mysql", "MYSQL_DATABASE": database}
+
+
+@pytest.fixture(scope="module")
+def plans(tmp_path_factory) -> list[Plan]:
+    directory = str(tmp_path_factory.mktemp("query-plans"))
+    with pytest.MonkeyPatch.context() as mp, webhook_endpoints() as (accepting, refusing):
+        env = {
+            **isolated_env(directory),
+            "QUERY_BUDGET_ENFORCE": "false",  # budgets are test_query_budgets.py's job
+            "RATE_LIMIT_BACKEND": "sqlite",
+            "WEBHOOK_URLS": f"{accepting},{refusing}",
+        }
+        if BACKEND == "mysql":
+            env.update(_mysql_env(os.getenv("QUERY_PLANS_MYSQL_DATABASE", "delivery_plancheck")))
+        for name, value in env.items():
+            mp.setenv(name, value)
+        import app as app_module
+        from dbtrace import capture_statements, normalize_sql
+
+        app = app_module.create_app()
+        app_module.seed_synthetic_data(app, USERS, DELIVERIES_PER_USER, password=PASSWORD, email_domain=EMAIL_DOMAIN, seed=42)
+
+        # The job queue and rate limiter keep their own SQLite files; trace their connections too.
+        side_stores = {
+            "jobs": app_module.get_job_queue(app)._connection(),
+            "rate_limit": app.extensions["rate_limiter"]._connection(),
+        }
+        traced: list[tuple[str, str, object]] = []
+        for store, conn in side_stores.items():
+            conn.set_trace_callback(lambda sql, store=store: traced.append((store, sql, None)))  # sql has its values inlined
+        try:
+            with capture_statements() as captured, contextlib.redirect_stdout(io.StringIO()):
+                run_session(app, f"user0@{EMAIL_DOMAIN}")
+        finally:
+            for conn in side_stores.values():
+                conn.set_trace_callback(None)
+
+        statements: dict[tuple[str, str], tuple[str, object]] = {}
+        for store, sql, params in [("app", sql, params) for sql, params in captured] + traced:
+            if _explainable(sql):
+                statements.setdefault((store, normalize_sql(sql)), (sql, params))
+
+        results = []
+        with app_module.get_db_connection(app) as conn:
+            for (store, normalized), (sql, params) in statements.items():
+                hot = _hot_path(normalized)
+                scans_allowed = any(re.search(pattern, normalized) for pattern in ALLOWED_SCANS)
+                if store == "app":
+                    explain, target = (explain_sqlite if BACKEND == "sqlite" else explain_mysql), conn
+                else:
+                    explain, target = explain_sqlite, side_stores[store]
+                try:
+                    lines, failures = explain(target, sql, params, hot, scans_allowed)
+                except Exception as exc:
+                    lines, failures = [], [f"EXPLAIN failed: {exc}"]
+                results.append(Plan(store, normalized, lines, failures, hot.name if hot else None))
+    return results
+
+
+def _report(plans: list[Plan]) -> str:
+    out = []
+    for plan in plans:
+        label = f"[{plan.hot_path}] " if plan.hot_path else ""
+        out.append(f"{plan.store}: {label}{plan.sql}")
+        out.extend(f"    {line}" for line in plan.lines)
+        out.extend(f"  ! {failure}" for failure in plan.failures)
+    return "\n".join(out)
+
+
+def test_every_statement_can_be_explained(plans):
+    broken = [plan for plan in plans if any(f.startswith("EXPLAIN failed") for f in plan.failures)]
+    assert not broken, "\n" + _report(broken)
+
+
+def test_no_full_scans_or_unindexed_hot_paths(plans):
+    bad = [plan for plan in plans if plan.failures and not any(f.startswith("EXPLAIN failed") for f in plan.failures)]
+    assert not bad, f"{len(bad)} of {len(plans)} statements on {BACKEND} have bad plans:\n" + _report(bad)
+
+
+def test_every_hot_path_is_exercised(plans):
+    missing = [hot.name for hot in HOT_PATHS if not any(plan.hot_path == hot.name for plan in plans)]
+    assert not missing, f"not exercised, update HOT_PATHS or run_session: {', '.join(missing)}"
+
+
+@pytest.mark.parametrize("table", ["password_resets", "jobs", "webhook_outbox", "email_outbox", "rate_buckets"])
+def test_session_reaches_side_tables(plans, table):
+    assert any(table in _tables(plan.sql).values() for plan in plans), f"run_session issued no statement on {table}"
@@ -0,0 +1,38 @@
+"""Per-IP login throttling and which X-Forwarded-For hops it trusts."""
+import pytest
+
+
+@pytest.fixture
+def throttled_env(app_env, monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "memory")
+    monkeypatch.setenv("RATE_LIMIT_PER_IP", "2")
+    monkeypatch.delenv("TRUSTED_PROXY_HOPS", raising=False)
+    return app_env
+
+
+def login_statuses(client, forwarded_for: list[str]) -> list[int]:
+    # A different email each time, so only the per-IP bucket can run out.
+    return [
+        client.post(
+            "/login",
+            data={"email": f"guess{i}@example.com", "password": "wrong-password"},
+            headers={"X-Forwarded-For": ip},
+        ).status_code
+        for i, ip in enumerate(forwarded_for)
+    ]
+
+
+def test_spoofed_forwarded_for_does_not_reset_the_bucket(throttled_env, app, client):
+    assert app.config["TRUSTED_PROXY_HOPS"] == 0
+    statuses = login_statuses(client, ["203.0.113.1", "203.0.113.2", "203.0.113.3", "203.0.113.4"])
+    assert 429 not in statuses[:2]
+    assert statuses[2:] == [429, 429]
+
+
+def test_trusted_proxy_hop_separates_clients(throttled_env, monkeypatch):
+    monkeypatch.setenv("TRUSTED_PROXY_HOPS", "1")
+    from app import create_app
+
+    client = create_app().test_client()
+    assert 429 not in login_statuses(client, ["203.0.113.1", "203.0.113.2", "203.0.113.3"])
+    assert login_statuses(client, ["203.0.113.1", "203.0.113.1"])[-1] == 429
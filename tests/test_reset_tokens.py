@@ -0,0 +1,85 @@
+"""Signed password-reset links: one use, one hour, bound to the password hash and SECRET_KEY."""
+import time
+
+import pytest
+from itsdangerous import TimestampSigner
+
+from conftest import PASSWORD
+
+NEW_PASSWORD = "Another-pass-2"
+
+
+@pytest.fixture
+def signed_token(app, user) -> str:
+    from app import create_signed_reset_token
+
+    app.config["RESET_TOKEN_MODE"] = "signed"
+    token, _ = create_signed_reset_token(app, user)
+    return token
+
+
+def reset(client, token: str, password: str = NEW_PASSWORD):
+    return client.post(f"/reset/{token}", data={"password": password, "confirm_password": password})
+
+
+def rejected(response) -> bool:
+    return response.status_code == 302 and response.headers["Location"].endswith("/forgot")
+
+
+def can_log_in(client, email: str, password: str) -> bool:
+    response = client.post("/login", data={"email": email, "password": password})
+    client.get("/logout")
+    return response.status_code == 302 and response.headers["Location"].endswith("/dashboard")
+
+
+def test_signed_link_resets_the_password_once(client, user, signed_token):
+    assert client.get(f"/reset/{signed_token}").status_code == 200
+    response = reset(client, signed_token)
+    assert response.status_code == 302 and response.headers["Location"].endswith("/login")
+    assert can_log_in(client, user["email"], NEW_PASSWORD)
+    assert not can_log_in(client, user["email"], PASSWORD)
+    # The new password hash no longer matches the one the link was bound to.
+    assert rejected(client.get(f"/reset/{signed_token}"))
+    assert rejected(reset(client, signed_token, "Third-pass-3"))
+    assert can_log_in(client, user["email"], NEW_PASSWORD)
+
+
+def test_signed_link_expires_after_an_hour(app, client, user, monkeypatch):
+    from app import create_signed_reset_token
+
+    issued = int(time.time()) - 3601
+    with monkeypatch.context() as patch:
+        patch.setattr(TimestampSigner, "get_timestamp", lambda self: issued)
+        token, _ = create_signed_reset_token(app, user)
+    assert rejected(client.get(f"/reset/{token}"))
+    assert rejected(reset(client, token))
+    assert can_log_in(client, user["email"], PASSWORD)
+
+
+def test_tampered_or_foreign_links_are_rejected(app, client, user, signed_token):
+    from app import create_signed_reset_token
+
+    payload, timestamp, signature = signed_token.split(".")
+    assert rejected(client.get(f"/reset/{payload}.{timestamp}.{signature[::-1]}"))
+    app.secret_key = "some-other-deployment"
+    foreign, _ = create_signed_reset_token(app, user)
+    app.secret_key = "test-secret"
+    assert rejected(client.get(f"/reset/{foreign}"))
+
+
+def test_reset_revokes_remembered_devices(app, client, user, signed_token):
+    client.post("/login", data={"email": user["email"], "password": PASSWORD, "remember": "1"})
+    remembered = client.get_cookie("remember_token").value
+    reset(app.test_client(), signed_token)
+    device = app.test_client()
+    device.set_cookie("remember_token", remembered)
+    assert device.get("/dashboard").status_code == 302
+
+
+def test_database_link_cannot_be_reused(app, client, user):
+    from app import create_password_reset_token
+
+    app.config["RESET_TOKEN_MODE"] = "db"
+    token, _ = create_password_reset_token(app, user["id"])
+    assert reset(client, token).status_code == 302
+    assert rejected(client.get(f"/reset/{token}"))
@@ -0,0 +1,144 @@
+"""Webhook events: written with the status change, signed, retried with backoff."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from test_query_budgets import JSON, delivery_ids
+from webhooks import WebhookDispatcher, sign_payload, verify_signature
+
+SECRET = "webhook-secret"
+
+
+class Receiver(HTTPServer):
+    """Records each POST (headers and body) and answers with ``status``."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.status = 204
+        self.requests: list[tuple[dict, bytes]] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/hook"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.requests.append((dict(self.headers), body))
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def receiver():
+    server = Receiver()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def dispatcher(app, receiver):
+    """Delivers on demand: the endpoint is set after create_app, so the app starts no sender threads."""
+    from app import claim_webhook_batch, mark_webhooks_delivered, mark_webhooks_failed
+
+    app.config["WEBHOOK_URLS"] = [receiver.url]
+    return WebhookDispatcher(
+        [receiver.url],
+        SECRET,
+        claim=lambda endpoint, batch_size: claim_webhook_batch(app, endpoint, batch_size),
+        mark_delivered=lambda ids: mark_webhooks_delivered(app, ids),
+        mark_failed=lambda rows, error: mark_webhooks_failed(app, rows, error),
+    )
+
+
+def outbox(app) -> list[dict]:
+    from app import get_db_connection
+
+    with get_db_connection(app) as conn:
+        return [dict(row) for row in conn.execute("SELECT status, attempts, next_attempt_at, last_error FROM webhook_outbox")]
+
+
+def set_status(client, delivery_id: int, status: str) -> None:
+    response = client.post("/deliveries/status", data={"delivery_id": delivery_id, "status": status}, headers=JSON)
+    assert response.status_code == 200
+
+
+def pending_delivery(client) -> int:
+    delivery_id = delivery_ids(client)[0]
+    set_status(client, delivery_id, "pending")  # pending raises no event
+    return delivery_id
+
+
+def test_status_change_is_delivered_signed(app, logged_in, user, receiver, dispatcher):
+    delivery_id = pending_delivery(logged_in)
+    set_status(logged_in, delivery_id, "delivered")
+    set_status(logged_in, delivery_id, "delivered")  # no change, no second event
+    set_status(logged_in, delivery_id, "pending")  # not a webhook event
+    assert len(outbox(app)) == 1
+
+    assert dispatcher.deliver(receiver.url) == 1
+    (headers, body), = receiver.requests
+    events = json.loads(body)
+    assert [(e["type"], e["data"]) for e in events] == [
+        ("delivery.delivered", {"delivery_id": delivery_id, "user_id": user["id"], "status": "delivered"}),
+    ]
+    signature = headers["X-Webhook-Signature"]
+    assert verify_signature(SECRET, signature, body)
+    assert not verify_signature("wrong-secret", signature, body)
+    assert not verify_signature(SECRET, signature, body.replace(b"delivered", b"cancelled"))
+    assert outbox(app) == []
+
+
+def test_stale_or_malformed_signatures_are_rejected():
+    body = b'[{"type": "delivery.delivered"}]'
+    assert verify_signature(SECRET, sign_payload(SECRET, int(time.time()), body), body)
+    assert not verify_signature(SECRET, sign_payload(SECRET, int(time.time()) - 301, body), body)
+    assert not verify_signature(SECRET, "v1=deadbeef", body)
+    assert not verify_signature(SECRET, "", body)
+
+
+def test_failed_batch_backs_off_then_is_retried(app, logged_in, receiver, dispatcher):
+    from app import get_db_connection
+
+    set_status(logged_in, pending_delivery(logged_in), "not_located")
+    receiver.status = 500
+    assert dispatcher.deliver(receiver.url) == 0
+    (row,) = outbox(app)
+    assert (row["status"], row["attempts"], row["last_error"]) == ("pending", 1, "HTTP 500")
+    assert 3 < row["next_attempt_at"] - time.time() <= 5
+    assert dispatcher.deliver(receiver.url) == 0 and len(receiver.requests) == 1  # not due yet
+
+    with get_db_connection(app) as conn:
+        conn.execute("UPDATE webhook_outbox SET next_attempt_at = 0")
+        conn.commit()
+    receiver.status = 200
+    assert dispatcher.deliver(receiver.url) == 1
+    assert len(receiver.requests) == 2
+    assert receiver.requests[0][1] == receiver.requests[1][1]  # the same event, re-signed
+    assert outbox(app) == []
+
+
+def test_gives_up_after_max_attempts(app, logged_in, receiver, dispatcher):
+    from app import get_db_connection
+
+    app.config["WEBHOOK_MAX_ATTEMPTS"] = 2
+    set_status(logged_in, pending_delivery(logged_in), "delivered")
+    receiver.status = 503
+    for _ in range(2):
+        with get_db_connection(app) as conn:
+            conn.execute("UPDATE webhook_outbox SET next_attempt_at = 0")
+            conn.commit()
+        dispatcher.deliver(receiver.url)
+    (row,) = outbox(app)
+    assert (row["status"], row["attempts"]) == ("failed", 2)
+    assert dispatcher.deliver(receiver.url) == 0 and len(receiver.requests) == 2
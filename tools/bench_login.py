@@ -0,0 +1,121 @@
+"""Login throughput versus password-hash pool size.
+
+Boots create_app() with all its files in a temporary directory, registers a user and
+fires concurrent login POSTs through the Flask test client while a second set
+of threads keeps requesting /dashboard. For each HASH_POOL_WORKERS value it
+prints logins/sec and the dashboard p95, showing whether logins still starve
+the rest of the app.
+
+    python tools/bench_login.py --workers 0 1 2 4 --logins 200 --concurrency 16
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS))
+sys.path.insert(0, TOOLS)
+
+import fixtures  # noqa: E402
+
+EMAIL = "bench@example.com"
+PASSWORD = "bench-password"
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_once(pool_workers: int, logins: int, concurrency: int, dashboard_threads: int) -> dict:
+    from app import create_app, create_user, get_password_hasher
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            **fixtures.isolated_env(tmp),  # job queue, metrics and logs too, not just the database
+            "HASH_POOL_WORKERS": str(pool_workers),
+            "HASH_POOL_QUEUE_LIMIT": str(max(logins, 1)),
+            "HASH_POOL_TIMEOUT": "60",
+            "RATE_LIMIT_BACKEND": "off",
+        })
+        app = create_app()
+        create_user(app, "Bench", EMAIL, PASSWORD)
+
+        viewer = app.test_client()
+        viewer.post("/login", data={"email": EMAIL, "password": PASSWORD})
+
+        remaining = [logins]
+        lock = threading.Lock()
+        stop = threading.Event()
+        dashboard_latencies: list[float] = []
+
+        def login_worker() -> None:
+            client = app.test_client()
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                client.post("/login", data={"email": EMAIL, "password": PASSWORD})
+
+        def dashboard_worker() -> None:
+            with app.test_client() as client:
+                with client.session_transaction() as sess:
+                    with viewer.session_transaction() as src:
+                        sess.update(src)
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    client.get("/dashboard")
+                    dashboard_latencies.append(time.perf_counter() - started)
+
+        readers = [threading.Thread(target=dashboard_worker) for _ in range(dashboard_threads)]
+        writers = [threading.Thread(target=login_worker) for _ in range(concurrency)]
+        for t in readers:
+            t.start()
+        started = time.perf_counter()
+        for t in writers:
+            t.start()
+        for t in writers:
+            t.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for t in readers:
+            t.join()
+        stats = get_password_hasher(app).stats()
+        get_password_hasher(app).shutdown()
+    return {
+        "pool_workers": pool_workers,
+        "logins": logins,
+        "seconds": round(elapsed, 3),
+        "logins_per_sec": round(logins / elapsed, 1) if elapsed else 0.0,
+        "hash_p95_ms": round(stats["latency_p95_ms"], 1),
+        "dashboard_requests": len(dashboard_latencies),
+        "dashboard_p95_ms": round(_percentile(dashboard_latencies, 0.95) * 1000, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--dashboard-threads", type=int, default=2)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    results = [run_once(w, args.logins, args.concurrency, args.dashboard_threads) for w in args.workers]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'pool':>5} {'logins/s':>9} {'hash p95':>9} {'dash reqs':>10} {'dash p95':>9}")
+    for r in results:
+        print(f"{r['pool_workers']:>5} {r['logins_per_sec']:>9} {r['hash_p95_ms']:>8}ms {r['dashboard_requests']:>10} {r['dashboard_p95_ms']:>8}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""First-request latency in a fresh process, with and without template caching.
+
+Each scenario starts a new Python process that imports the app, runs
+create_app() and after_fork() the way a gunicorn worker does, and then times
+the first and second GET of /login, /dashboard and /deliveries through the
+test client (logged in, against a seeded database). The gap between first
+and second request is what a new worker makes its first visitors pay.
+``templates_ms`` is the precompile phase of create_app().
+
+    python tools/first_request.py
+    python tools/first_request.py --rounds 7 --deliveries 500
+
+Scenarios:
+  no-cache     TEMPLATE_BYTECODE_CACHE=0 TEMPLATE_PRECOMPILE=0 (templates compiled on first use)
+  bytecode     bytecode cache already populated, no precompile (templates loaded on first use)
+  precompiled  bytecode cache plus precompile in create_app (the default)
+  no-fragments precompiled, with FRAGMENT_CACHE_SIZE=0: shows what the cold
+               fragment cache costs the first /deliveries
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TOOLS)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, TOOLS)
+
+import fixtures  # noqa: E402
+
+ROUTES = ("/login", "/dashboard", "/deliveries")
+SCENARIOS = {
+    "no-cache": {"TEMPLATE_BYTECODE_CACHE": "0", "TEMPLATE_PRECOMPILE": "0"},
+    "bytecode": {"TEMPLATE_BYTECODE_CACHE": "1", "TEMPLATE_PRECOMPILE": "0"},
+    "precompiled": {"TEMPLATE_BYTECODE_CACHE": "1", "TEMPLATE_PRECOMPILE": "1"},
+    "no-fragments": {"TEMPLATE_BYTECODE_CACHE": "1", "TEMPLATE_PRECOMPILE": "1", "FRAGMENT_CACHE_SIZE": "0"},
+}
+
+
+def child() -> None:
+    """Runs in the fresh process: time create_app and two passes over ROUTES, print JSON."""
+    started = time.perf_counter()
+    from app import after_fork, create_app
+
+    app = create_app()
+    result = {
+        "create_app_ms": (time.perf_counter() - started) * 1000,
+        "templates_ms": app.extensions["startup"].phases.get("templates", 0.0) * 1000,
+    }
+    after_fork(app)  # threads and the hashing pool start here under gunicorn, not on the first request
+    client = app.test_client()
+    for attempt in ("first", "second"):
+        for route in ROUTES:
+            if route == "/dashboard" and attempt == "first":
+                client.post("/login", data={"email": fixtures.user_email(0), "password": fixtures.PASSWORD})
+            t = time.perf_counter()
+            response = client.get(route)
+            result[f"{attempt} {route}"] = (time.perf_counter() - t) * 1000
+            if response.status_code != 200:
+                raise SystemExit(f"GET {route} returned {response.status_code}")
+    print(json.dumps(result))
+
+
+def run_scenario(env: dict, rounds: int) -> dict:
+    samples: dict[str, list[float]] = {}
+    for _ in range(rounds):
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child"],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=False,
+        )
+        if proc.returncode != 0:
+            raise SystemExit(proc.stderr or proc.stdout)
+        for key, value in json.loads(proc.stdout.strip().splitlines()[-1]).items():
+            samples.setdefault(key, []).append(value)
+    return {key: round(statistics.median(values), 2) for key, values in samples.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--rounds", type=int, default=5, help="fresh processes per scenario (median is reported)")
+    parser.add_argument("--deliveries", type=int, default=200, help="deliveries owned by the logged-in user")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    with tempfile.TemporaryDirectory(prefix="first-request-") as tmp:
+        env = {
+            **os.environ,
+            **fixtures.isolated_env(tmp),
+            "SECRET_KEY": "first-request",
+            "HASH_METHOD": "pbkdf2:sha256:100000",  # pinned: calibration would blur create_app_ms
+            "HASH_POOL_WORKERS": "0",
+            "JOB_WORKERS": "0",
+            "MAINTENANCE_INTERVAL_MINUTES": "0",
+            "TEMPLATE_CACHE_DIR": os.path.join(tmp, "jinja_cache"),
+        }
+        os.environ.update(env)
+        from app import create_app
+
+        fixtures.seed(create_app(), 1, args.deliveries)  # also fills the bytecode cache
+
+        results = {name: run_scenario({**env, **overrides}, args.rounds) for name, overrides in SCENARIOS.items()}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    keys = ["create_app_ms", "templates_ms"] + [f"{attempt} {route}" for attempt in ("first", "second") for route in ROUTES]
+    print(f"{'ms (median of ' + str(args.rounds) + ')':<24}" + "".join(f"{name:>14}" for name in results))
+    for key in keys:
+        print(f"{key:<24}" + "".join(f"{results[name][key]:>14.2f}" for name in results))
+
+
+if __name__ == "__main__":
+    main()
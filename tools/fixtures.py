@@ -0,0 +1,48 @@
+"""Synthetic users and deliveries for the benchmark tools.
+
+A thin wrapper around ``app.seed_synthetic_data`` (also behind ``flask
+seed-synthetic``) that pins the e-mail domain and password so the load test
+can log in as any generated user. ``isolated_env`` keeps a tool's (and the
+test suite's) databases out of the repository's ``instance/`` folder.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = "load-test-password"
+EMAIL_DOMAIN = "load.test"
+
+
+def isolated_env(directory: str) -> dict:
+    """Environment that puts every database and output file create_app() writes under ``directory``."""
+    return {
+        "DB_BACKEND": "sqlite",
+        "SQLITE_PATH": os.path.join(directory, "app.db"),
+        "JOB_QUEUE_PATH": os.path.join(directory, "jobs.db"),
+        "EVENT_BUS_PATH": os.path.join(directory, "events.db"),
+        "RATE_LIMIT_PATH": os.path.join(directory, "rate.db"),
+        "METRICS_DIR": os.path.join(directory, "metrics"),
+        "PROFILE_DIR": os.path.join(directory, "profiles"),
+        "SLOW_QUERY_LOG": os.path.join(directory, "slow_queries.log"),
+    }
+
+
+def user_email(n: int) -> str:
+    return f"user{n}@{EMAIL_DOMAIN}"
+
+
+def seed(app, users: int, deliveries_per_user: int, batch_size: int = 10000, seed_value: int = 42) -> list[int]:
+    """Insert ``users`` users with ``deliveries_per_user`` deliveries each; returns the user ids."""
+    from app import seed_synthetic_data
+
+    user_ids, _ = seed_synthetic_data(
+        app,
+        users,
+        deliveries_per_user,
+        password=PASSWORD,
+        email_domain=EMAIL_DOMAIN,
+        batch_size=batch_size,
+        seed=seed_value,
+    )
+    return user_ids
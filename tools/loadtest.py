@@ -0,0 +1,331 @@
+"""End-to-end load test against create_app() running under gunicorn.
+
+Seeds a throwaway database with --users users and --deliveries deliveries
+each, boots gunicorn (gthread workers) for every --workers value, logs in one
+virtual user per client thread and then drives a weighted mix of login,
+dashboard, deliveries, add and status requests for --duration seconds.
+Prints a JSON report with throughput and p50/p95/p99 per route, tagged with
+the current git commit so runs can be compared across commits.
+
+    python tools/loadtest.py --workers 1 2 4 --users 50 --deliveries 200 --duration 30
+    python tools/loadtest.py --backend mysql   # uses MYSQL_HOST/PORT/USER/PASSWORD
+
+The MySQL run drops and recreates --mysql-database, so point it at a
+database used for nothing else. The client is a Python process too; with
+many workers check that it is not the bottleneck (its CPU use is reported).
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fixtures  # noqa: E402
+
+DEFAULT_MIX = "login=1,dashboard=4,deliveries=4,add=1,status=3"
+ROUTES = ("login", "dashboard", "deliveries", "add", "status")
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _parse_mix(spec: str) -> dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ROUTES:
+            raise SystemExit(f"Unknown route {name!r} in --mix; choose from {', '.join(ROUTES)}")
+        mix[name.strip()] = int(weight or 1)
+    return mix
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Client:
+    """One virtual user: a keep-alive connection plus its cookies."""
+
+    def __init__(self, port: int, timeout: float = 30.0):
+        self.port = port
+        self.timeout = timeout
+        self.cookies: dict[str, str] = {}
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+
+    def request(self, method: str, path: str, form: dict | None = None, headers: dict | None = None) -> int:
+        body = urlencode(form) if form is not None else None
+        headers = dict(headers or {})
+        if body is not None:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        for attempt in range(2):
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=self.timeout)
+                if attempt:
+                    raise
+        for header in response.headers.get_all("Set-Cookie") or []:
+            name, _, value = header.split(";", 1)[0].partition("=")
+            if value:
+                self.cookies[name] = value
+            else:
+                self.cookies.pop(name, None)
+        return response.status
+
+
+def _seed(args, env: dict) -> dict[int, list[int]]:
+    """Build the database once; returns delivery ids per user id for status updates."""
+    os.environ.update(env)
+    previous = os.environ.get("HASH_POOL_WORKERS")
+    os.environ["HASH_POOL_WORKERS"] = "0"  # hash the shared password inline; the servers keep their pool
+    from app import create_app, get_db_connection
+
+    app = create_app()
+    if previous is None:
+        del os.environ["HASH_POOL_WORKERS"]
+    else:
+        os.environ["HASH_POOL_WORKERS"] = previous
+    started = time.perf_counter()
+    user_ids = fixtures.seed(app, args.users, args.deliveries)
+    print(f"Seeded {len(user_ids)} users x {args.deliveries} deliveries in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    owned: dict[int, list[int]] = {user_id: [] for user_id in user_ids}
+    with get_db_connection(app) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT user_id, id FROM deliveries")
+        for user_id, delivery_id in cur.fetchall():
+            if user_id in owned and len(owned[user_id]) < 100:
+                owned[user_id].append(delivery_id)
+        cur.close()
+    return owned
+
+
+def _wait_ready(port: int, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"gunicorn exited with status {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/login")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit("gunicorn did not become ready in time")
+
+
+def run_once(args, workers: int, env: dict, owned: dict[int, list[int]], mix: dict[str, int]) -> dict:
+    user_ids = sorted(owned)
+    port = args.port
+    command = [
+        sys.executable, "-m", "gunicorn",
+        "--workers", str(workers),
+        "--worker-class", "gthread",
+        "--threads", str(args.threads),
+        "--bind", f"127.0.0.1:{port}",
+        "--log-level", "warning",
+        "app:create_app()",
+    ]
+    proc = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env}, stdout=subprocess.DEVNULL)
+    try:
+        _wait_ready(port, proc)
+        latencies: dict[str, list[float]] = {route: [] for route in ROUTES}
+        errors: dict[str, int] = {route: 0 for route in ROUTES}
+        lock = threading.Lock()
+        start_gate = threading.Barrier(args.concurrency + 1)
+        stop = threading.Event()
+        routes = [route for route, weight in mix.items() for _ in range(weight)]
+
+        def virtual_user(index: int) -> None:
+            n = index % len(user_ids)
+            user_id = user_ids[n]
+            rng = random.Random(index)
+            client = Client(port)
+            credentials = {"email": fixtures.user_email(n), "password": fixtures.PASSWORD}
+            client.request("POST", "/login", credentials)
+            start_gate.wait()
+            while not stop.is_set():
+                route = rng.choice(routes)
+                started = time.perf_counter()
+                try:
+                    if route == "login":
+                        status = client.request("POST", "/login", credentials)
+                    elif route == "dashboard":
+                        status = client.request("GET", "/dashboard")
+                    elif route == "deliveries":
+                        status = client.request("GET", "/deliveries")
+                    elif route == "add":
+                        form = {"tracking_number": f"LT{rng.getrandbits(40):010X}", "amount_due": rng.randint(0, 5000)}
+                        status = client.request("POST", "/deliveries/add", form)
+                    else:
+                        form = {
+                            "delivery_id": rng.choice(owned[user_id] or [0]),
+                            "status": rng.choice(("pending", "delivered", "not_located")),
+                        }
+                        status = client.request("POST", "/deliveries/status", form, {"Accept": "application/json"})
+                    failed = status >= 400
+                except (http.client.HTTPException, OSError):
+                    failed = True
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies[route].append(elapsed)
+                    if failed:
+                        errors[route] += 1
+
+        threads = [threading.Thread(target=virtual_user, args=(i,), daemon=True) for i in range(args.concurrency)]
+        for t in threads:
+            t.start()
+        start_gate.wait()
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        client_cpu = time.process_time() - cpu_started
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    report_routes = {}
+    for route in ROUTES:
+        samples = latencies[route]
+        if not samples:
+            continue
+        report_routes[route] = {
+            "requests": len(samples),
+            "errors": errors[route],
+            "rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(_percentile(samples, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(samples, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(samples, 0.99) * 1000, 2),
+            "max_ms": round(max(samples) * 1000, 2),
+        }
+    everything = [s for samples in latencies.values() for s in samples]
+    return {
+        "workers": workers,
+        "threads": args.threads,
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "rps": round(len(everything) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(everything, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(everything, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(everything, 0.99) * 1000, 2),
+        "client_cpu_pct": round(client_cpu / elapsed * 100, 1) if elapsed else 0.0,
+        "routes": report_routes,
+    }
+
+
+def _mysql_env(args) -> dict:
+    import mysql.connector
+
+    env = {"DB_BACKEND": "mysql", "MYSQL_DATABASE": args.mysql_database}
+    try:
+        conn = mysql.connector.connect(
+            host=os.getenv("MYSQL_HOST", "127.0.0.1"),
+            port=int(os.getenv("MYSQL_PORT", "3306")),
+            user=os.getenv("MYSQL_USER", "root"),
+            password=os.getenv("MYSQL_PASSWORD", ""),
+            connection_timeout=3,
+        )
+    except mysql.connector.Error as exc:
+        raise SystemExit(f"MySQL is not available ({exc}); run with --backend sqlite")
+    with conn.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS `{args.mysql_database}`")
+    conn.close()
+    return env
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2])
+    parser.add_argument("--threads", type=int, default=4, help="gthread threads per worker")
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads (virtual users)")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of measured traffic per run")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--deliveries", type=int, default=100, help="deliveries per user")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"route weights (default {DEFAULT_MIX})")
+    parser.add_argument("--backend", choices=("sqlite", "mysql"), default="sqlite")
+    parser.add_argument("--mysql-database", default="delivery_loadtest")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    mix = _parse_mix(args.mix)
+
+    tmp = tempfile.mkdtemp(prefix="loadtest-")
+    try:
+        env = {
+            **fixtures.isolated_env(tmp),
+            "SECRET_KEY": "loadtest",  # every worker must accept every other worker's session cookie
+            "RATE_LIMIT_BACKEND": "off",
+            "MAINTENANCE_INTERVAL_MINUTES": "0",
+        }
+        seeded_db = os.path.join(tmp, "seed.db")
+        if args.backend == "mysql":
+            env.update(_mysql_env(args))
+        else:
+            env["SQLITE_PATH"] = seeded_db
+        owned = _seed(args, env)
+
+        runs = []
+        for workers in args.workers:
+            if args.backend == "sqlite":
+                # Every run starts from the same data, unaffected by earlier runs' writes.
+                run_db = os.path.join(tmp, f"run-{workers}.db")
+                shutil.copyfile(seeded_db, run_db)
+                env["SQLITE_PATH"] = run_db
+            print(f"Running {workers} worker(s) for {args.duration:.0f}s...", file=sys.stderr)
+            runs.append(run_once(args, workers, env, owned, mix))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        "commit": _git_commit(),
+        "backend": args.backend,
+        "users": args.users,
+        "deliveries_per_user": args.deliveries,
+        "mix": mix,
+        "runs": runs,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
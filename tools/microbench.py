@@ -0,0 +1,203 @@
+"""Microbenchmarks for the data layer and hot helpers, with a regression baseline.
+
+Builds SQLite databases with one user owning --small and --large deliveries
+(default 1k and 100k), then times each case timeit-style: warm up, pick a
+loop count that makes one round take at least --min-round seconds, run
+--repeat rounds with the garbage collector off and keep the fastest and the
+median per-call time. The fastest round is the stable number, so it is what
+gets compared with the baseline. The fragment cache is off, so the render
+case times the row template itself rather than cache hits.
+
+    python tools/microbench.py                       # run and compare with tools/bench_baseline.json
+    python tools/microbench.py --save-baseline       # record this machine's numbers as the baseline
+    python tools/microbench.py -k deliveries --threshold 0.15
+
+Exits with status 1 when a case is slower than the baseline by more than
+--threshold (a fraction). Baselines are machine-specific: record them on the
+hardware that runs the comparison.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS))
+sys.path.insert(0, TOOLS)
+
+import fixtures  # noqa: E402
+
+BASELINE_PATH = os.path.join(TOOLS, "bench_baseline.json")
+
+
+def measure(func: Callable[[], object], repeat: int, min_round: float) -> dict:
+    for _ in range(3):
+        func()  # warm caches, compile templates, open files
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - started >= min_round or number >= 1 << 20:
+            break
+        number *= 2
+    rounds = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            rounds.append((time.perf_counter() - started) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        "min_us": round(min(rounds) * 1e6, 3),
+        "median_us": round(statistics.median(rounds) * 1e6, 3),
+        "loops": number,
+    }
+
+
+class Database:
+    """A seeded SQLite database plus an app bound to it (create_app reads SQLITE_PATH once)."""
+
+    def __init__(self, tmp: str, name: str, deliveries: int):
+        self.name = name
+        self.path = os.path.join(tmp, f"{name}.db")
+        os.environ["SQLITE_PATH"] = self.path
+        from app import create_app
+
+        self.app = create_app()
+        started = time.perf_counter()
+        self.user_id = fixtures.seed(self.app, 1, deliveries)[0]
+        print(f"Built {name} database ({deliveries} deliveries) in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+def _label(rows: int) -> str:
+    return f"{rows // 1000}k" if rows >= 1000 and rows % 1000 == 0 else str(rows)
+
+
+def build_cases(small: Database, large: Database) -> list[tuple[str, Callable[[], object]]]:
+    from flask import render_template, session
+
+    import app as app_module
+
+    email = fixtures.user_email(0)
+    rows_small = app_module.fetch_deliveries_list(small.app, small.user_id)
+
+    def render_deliveries() -> str:
+        with small.app.test_request_context("/deliveries"):
+            session["user_id"] = small.user_id  # base.html only renders the layout and rows when logged in
+            return render_template("deliveries.html", deliveries=rows_small)
+
+    rendered = render_deliveries().count("<tr data-delivery-id=")
+    if rendered != len(rows_small):
+        raise SystemExit(f"deliveries.html rendered {rendered} rows, expected {len(rows_small)}")
+
+    iso_value = "2026-01-15T10:30:00.123456+00:00"
+    sqlite_value = "2026-01-15 10:30:00"
+    return [
+        ("fetch_user_by_email", lambda: app_module.fetch_user_by_email(small.app, email)),
+        (f"fetch_deliveries_list[{small.name}]", lambda: app_module.fetch_deliveries_list(small.app, small.user_id)),
+        (f"fetch_deliveries_list[{large.name}]", lambda: app_module.fetch_deliveries_list(large.app, large.user_id)),
+        (f"fetch_delivery_counts[{small.name}]", lambda: app_module.fetch_delivery_counts(small.app, small.user_id)),
+        (f"fetch_delivery_counts[{large.name}]", lambda: app_module.fetch_delivery_counts(large.app, large.user_id)),
+        ("_parse_sqlite_timestamp[iso]", lambda: app_module._parse_sqlite_timestamp(iso_value)),
+        ("_parse_sqlite_timestamp[sqlite]", lambda: app_module._parse_sqlite_timestamp(sqlite_value)),
+        (
+            "validate_registration_input",
+            lambda: app_module.validate_registration_input("Bench User", "bench@example.com", "s3cret-pass", "s3cret-pass"),
+        ),
+        (f"render deliveries.html[{small.name}]", render_deliveries),
+        # Last: it grows the small database.
+        ("add_delivery", lambda: app_module.add_delivery(small.app, small.user_id, "1ZBENCH", 100)),
+    ]
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_us: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        change = result["min_us"] / base["min_us"] - 1 if base["min_us"] else 0.0
+        result["vs_baseline"] = f"{change:+.1%}"
+        # Sub-microsecond cases jitter by more than any sane threshold; ignore tiny absolute changes.
+        if change > threshold and result["min_us"] - base["min_us"] > min_delta_us:
+            regressions.append(f"{name}: {base['min_us']:.1f}us -> {result['min_us']:.1f}us ({change:+.1%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--small", type=int, default=1_000, help="deliveries in the small database")
+    parser.add_argument("--large", type=int, default=100_000, help="deliveries in the large database")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-round", type=float, default=0.2, help="seconds per timing round")
+    parser.add_argument("-k", dest="pattern", help="only run cases whose name contains this text")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--min-delta-us", type=float, default=0.5, help="ignore slowdowns smaller than this many microseconds")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="microbench-") as tmp:
+        os.environ.update({
+            **fixtures.isolated_env(tmp),
+            "HASH_POOL_WORKERS": "0",
+            "JOB_WORKERS": "0",
+            "MAINTENANCE_INTERVAL_MINUTES": "0",
+            # Warm fragment hits would hide a slower row template from the render case.
+            "FRAGMENT_CACHE_SIZE": "0",
+        })
+        small = Database(tmp, _label(args.small), args.small)
+        large = Database(tmp, _label(args.large), args.large)
+
+        results = {}
+        for name, func in build_cases(small, large):
+            if args.pattern and args.pattern not in name:
+                continue
+            results[name] = measure(func, args.repeat, args.min_round)
+            if not args.json:
+                r = results[name]
+                print(f"{name:<42} {r['min_us']:>12.1f}us min {r['median_us']:>12.1f}us median", file=sys.stderr)
+
+    if args.save_baseline:
+        baseline = {
+            "machine": {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.processor()},
+            "small": args.small,
+            "large": args.large,
+            "results": results,
+        }
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(baseline, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+        regressions = []
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as fh:
+            regressions = compare(results, json.load(fh), args.threshold, args.min_delta_us)
+    else:
+        regressions = []
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    if regressions:
+        print(f"Slower than baseline by more than {args.threshold:.0%}:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
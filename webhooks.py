@@ -0,0 +1,155 @@
+"""Outbound webhooks for delivery events.
+
+Events are fanned out into ``webhook_outbox`` (one row per endpoint) inside
+the transaction that changed the delivery. ``WebhookDispatcher`` runs one
+thread per endpoint; each keeps a persistent HTTP connection to its
+endpoint, POSTs due events in batches as a JSON array and backs off
+exponentially when the receiver fails, without holding up other endpoints.
+
+Every request is signed: ``X-Webhook-Signature: t=<unix time>,v1=<hex>``
+where ``v1`` is HMAC-SHA256 of ``"<t>.<body>"`` keyed with the shared secret.
+"""
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+
+def sign_payload(secret: str, timestamp: int, body: bytes) -> str:
+    digest = hmac.new(secret.encode("utf-8"), f"{timestamp}.".encode("utf-8") + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_signature(secret: str, header: str, body: bytes, tolerance: float = 300.0) -> bool:
+    """Receiver-side check, handy for tests and for consumers written in Python."""
+    try:
+        parts = dict(item.split("=", 1) for item in header.split(","))
+        timestamp = int(parts["t"])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(sign_payload(secret, timestamp, body), header)
+
+
+class WebhookDispatcher:
+    """Delivers outbox rows through caller-supplied storage callbacks.
+
+    ``claim(endpoint, batch_size)`` returns leased rows (dicts with id,
+    payload and attempts), ``mark_delivered(ids)`` removes them and
+    ``mark_failed(rows, error)`` reschedules them with backoff.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[str],
+        secret: str,
+        claim: Callable[[str, int], list[dict]],
+        mark_delivered: Callable[[list[int]], None],
+        mark_failed: Callable[[list[dict], str], None],
+        batch_size: int = 100,
+        timeout: float = 5.0,
+        poll_interval: float = 2.0,
+    ):
+        self.endpoints = endpoints
+        self.secret = secret
+        self.claim = claim
+        self.mark_delivered = mark_delivered
+        self.mark_failed = mark_failed
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._connections: dict[str, http.client.HTTPConnection] = {}
+        self._wakeups: dict[str, threading.Event] = {}
+        self._start_lock = threading.Lock()
+        self._started_pid: Optional[int] = None
+        self.delivered = 0
+        self.failed_batches = 0
+
+    def start(self) -> None:
+        if not self.endpoints or self._started_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self._connections = {}
+            self._wakeups = {endpoint: threading.Event() for endpoint in self.endpoints}
+            for i, endpoint in enumerate(self.endpoints):
+                threading.Thread(target=self._loop, args=(endpoint,), name=f"webhook-{i}", daemon=True).start()
+
+    def wake(self) -> None:
+        for event in self._wakeups.values():
+            event.set()
+
+    def _connection(self, endpoint: str) -> http.client.HTTPConnection:
+        conn = self._connections.get(endpoint)
+        if conn is None:
+            url = urlsplit(endpoint)
+            conn_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+            conn = conn_class(url.hostname, url.port, timeout=self.timeout)
+            self._connections[endpoint] = conn
+        return conn
+
+    def _post(self, endpoint: str, body: bytes) -> Optional[str]:
+        """POST one batch; returns None on a 2xx response, otherwise an error description."""
+        url = urlsplit(endpoint)
+        path = (url.path or "/") + (f"?{url.query}" if url.query else "")
+        headers = {
+            "Content-Type": "application/json",
+            "X-Webhook-Signature": sign_payload(self.secret, int(time.time()), body),
+        }
+        for attempt in range(2):
+            conn = self._connection(endpoint)
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.will_close:
+                    self._drop_connection(endpoint)
+                return None if 200 <= response.status < 300 else f"HTTP {response.status}"
+            except (http.client.HTTPException, OSError) as exc:
+                self._drop_connection(endpoint)
+                # A kept-alive connection may have been closed by the server; retry once on a fresh one.
+                if attempt:
+                    return str(exc) or exc.__class__.__name__
+        return "unreachable"
+
+    def _drop_connection(self, endpoint: str) -> None:
+        conn = self._connections.pop(endpoint, None)
+        if conn is not None:
+            conn.close()
+
+    def deliver(self, endpoint: str) -> int:
+        """Send due events for one endpoint until none are left; returns events delivered."""
+        delivered = 0
+        while True:
+            rows = self.claim(endpoint, self.batch_size)
+            if not rows:
+                return delivered
+            body = json.dumps([json.loads(row["payload"]) for row in rows]).encode("utf-8")
+            error = self._post(endpoint, body)
+            if error is not None:
+                self.failed_batches += 1
+                self.mark_failed(rows, error)
+                return delivered
+            self.mark_delivered([row["id"] for row in rows])
+            delivered += len(rows)
+            self.delivered += len(rows)
+            if len(rows) < self.batch_size:
+                return delivered
+
+    def _loop(self, endpoint: str) -> None:
+        wakeup = self._wakeups[endpoint]
+        while True:
+            try:
+                self.deliver(endpoint)
+            except Exception as exc:  # storage errors must not kill the endpoint thread
+                print(f"[WEBHOOK] Dispatcher error for {endpoint}: {exc!r}")
+            wakeup.wait(self.poll_interval)
+            wakeup.clear()